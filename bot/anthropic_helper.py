@@ -12,7 +12,7 @@ import os
 import json
 import base64
 import logging
-from typing import Dict, List, Optional, Union, Any, Literal, TypeVar, Generic
+from typing import Dict, List, Optional, Union, Any, Literal, TypeVar, Generic, AsyncIterator
 from enum import Enum
 import asyncio
 from io import BytesIO
@@ -23,11 +23,7 @@ from anthropic import AsyncAnthropic
 from anthropic.types import MessageParam, ContentBlockParam, ImageBlockParam
 from dotenv import load_dotenv
 
-# Configurazione logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Logger del modulo: la configurazione è lasciata all'applicazione
 logger = logging.getLogger(__name__)
 
 # Caricamento variabili d'ambiente
@@ -189,7 +185,7 @@ class AnthropicHelper:
     
     async def process_message(
         self,
-        messages: List[Message],
+        messages: List[Union[Message, Dict[str, Any]]],
         system: Optional[str] = None,
         tools: Optional[List[Tool]] = None,
         tool_outputs: Optional[List[ToolOutput]] = None,
@@ -201,7 +197,8 @@ class AnthropicHelper:
         Elabora un messaggio e ottiene una risposta da Claude.
         
         Args:
-            messages: Lista di messaggi per la conversazione
+            messages: Lista di messaggi per la conversazione (Message o dizionari già
+                nel formato dell'API, inviati così come sono)
             system: Messaggio di sistema opzionale
             tools: Lista di strumenti disponibili per Claude
             tool_outputs: Output degli strumenti da precedenti chiamate
@@ -217,6 +214,10 @@ class AnthropicHelper:
         # Conversione dei messaggi nel formato richiesto da Anthropic
         anthropic_messages = []
         for msg in messages:
+            if isinstance(msg, dict):
+                anthropic_messages.append(msg)
+                continue
+            
             content_blocks = []
             for block in msg.content:
                 if isinstance(block, TextBlock):
@@ -292,24 +293,51 @@ class AnthropicHelper:
             logger.error(f"Errore durante l'elaborazione della richiesta a Claude: {str(e)}")
             raise ClaudeException(f"Errore durante l'elaborazione della richiesta a Claude: {str(e)}")
     
-    async def simple_query(self, text: str, system: Optional[str] = None, model: Optional[str] = None) -> str:
+    @staticmethod
+    def _build_text_messages(
+        text: str,
+        conversation_history: Optional[List[Dict[str, str]]] = None
+    ) -> List[Dict[str, str]]:
+        """
+        Prepara i messaggi di una query di solo testo nel formato dell'API.
+        
+        Args:
+            text: Testo della query
+            conversation_history: Messaggi precedenti ({"role", "content"}) da includere
+            
+        Returns:
+            List[Dict[str, str]]: Messaggi da inviare, terminati dalla query
+        """
+        messages = list(conversation_history or [])
+        # La conversazione inviata a Claude deve iniziare con un messaggio dell'utente
+        while messages and messages[0].get("role") != Role.USER.value:
+            messages.pop(0)
+        messages.append({"role": Role.USER.value, "content": text})
+        return messages
+    
+    async def simple_query(
+        self,
+        text: str,
+        system: Optional[str] = None,
+        model: Optional[str] = None,
+        conversation_history: Optional[List[Dict[str, str]]] = None
+    ) -> str:
         """
         Metodo semplificato per inviare una query di solo testo a Claude.
         
+        I messaggi sono dizionari semplici (il contenuto testuale è accettato
+        direttamente dall'API), senza costruire e convalidare Message e TextBlock.
+        
         Args:
             text: Testo della query
             system: Messaggio di sistema opzionale
             model: Override del modello predefinito
+            conversation_history: Messaggi precedenti ({"role", "content"}) da includere
             
         Returns:
             str: Testo della risposta di Claude
         """
-        messages = [
-            Message(
-                role=Role.USER,
-                content=[TextBlock(text=text)]
-            )
-        ]
+        messages = self._build_text_messages(text, conversation_history)
         
         response = await self.process_message(
             messages=messages,
@@ -325,24 +353,70 @@ class AnthropicHelper:
         
         return text_content
     
+    async def stream_query(
+        self,
+        text: str,
+        system: Optional[str] = None,
+        model: Optional[str] = None,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        max_tokens: int = MAX_TOKENS,
+        temperature: float = 0.7
+    ) -> AsyncIterator[str]:
+        """
+        Invia una query di solo testo a Claude restituendo la risposta in streaming.
+        
+        Args:
+            text: Testo della query
+            system: Messaggio di sistema opzionale
+            model: Override del modello predefinito
+            conversation_history: Messaggi precedenti ({"role", "content"}) da includere
+            max_tokens: Numero massimo di token nella risposta
+            temperature: Temperatura per la generazione (randomicità)
+            
+        Yields:
+            str: Frammenti di testo man mano che vengono generati
+            
+        Raises:
+            ClaudeException: In caso di errore durante la richiesta
+        """
+        messages = self._build_text_messages(text, conversation_history)
+        
+        request = {
+            "model": model or self.model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature
+        }
+        if system:
+            request["system"] = system
+        
+        try:
+            async with self.client.messages.stream(**request) as stream:
+                async for delta in stream.text_stream:
+                    yield delta
+        except Exception as e:
+            logger.error(f"Errore durante lo streaming della risposta di Claude: {str(e)}")
+            raise ClaudeException(f"Errore durante lo streaming della risposta di Claude: {str(e)}")
+    
     @staticmethod
-    def encode_image(image_data: Union[bytes, BytesIO], format: str = "jpeg") -> Dict[str, Any]:
+    def encode_image(image_data: Union[bytes, bytearray, BytesIO], format: str = "jpeg") -> Dict[str, Any]:
         """
         Codifica un'immagine in Base64 per l'invio a Claude Vision.
         
         Args:
-            image_data: Dati dell'immagine come bytes o BytesIO
+            image_data: Dati dell'immagine come bytes, bytearray o BytesIO
             format: Formato dell'immagine (jpeg, png, webp, gif)
             
         Returns:
             Dict: Dizionario con i dati dell'immagine codificati
         """
         if isinstance(image_data, BytesIO):
-            image_bytes = image_data.getvalue()
+            # getbuffer() espone il buffer interno senza copiarlo
+            image_bytes = image_data.getbuffer()
         else:
             image_bytes = image_data
             
-        base64_data = base64.b64encode(image_bytes).decode('utf-8')
+        base64_data = base64.b64encode(image_bytes).decode('ascii')
         
         return {
             "type": "base64",
@@ -351,7 +425,7 @@ class AnthropicHelper:
     
     async def analyze_image(
         self,
-        image_data: Union[bytes, BytesIO],
+        image_data: Union[bytes, bytearray, BytesIO],
         query: str,
         image_format: str = "jpeg",
         system: Optional[str] = None,
@@ -361,7 +435,7 @@ class AnthropicHelper:
         Analizza un'immagine usando Claude Vision.
         
         Args:
-            image_data: Dati dell'immagine come bytes o BytesIO
+            image_data: Dati dell'immagine come bytes, bytearray o BytesIO
             query: Domanda o istruzione relativa all'immagine
             image_format: Formato dell'immagine (jpeg, png, webp, gif)
             system: Messaggio di sistema opzionale
@@ -477,6 +551,12 @@ async def get_available_models(api_key: Optional[str] = None) -> List[str]:
 
 if __name__ == "__main__":
     """Test di base del modulo."""
+    # Configurazione logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
     async def run_test():
         try:
             print("Testando la connessione all'API di Anthropic...")
@@ -9,21 +9,19 @@ strutturata per l'accesso ai dati persistenti dell'applicazione.
 """
 
 import os
+import re
 import sqlite3
 import json
 import logging
 import asyncio
+import time
 import datetime
-import shutil
+import threading
 from typing import Dict, List, Optional, Union, Any, Tuple
 from pathlib import Path
 from contextlib import contextmanager
 
-# Configurazione logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Logger del modulo: la configurazione è lasciata all'applicazione
 logger = logging.getLogger(__name__)
 
 # Costanti
@@ -34,6 +32,89 @@ BACKUP_DIR = "data/backups"
 SCHEMA_FILE = "data/schema.sql"
 BACKUP_RETENTION_DAYS = 7
 BACKUP_INTERVAL_HOURS = 24
+DB_BUSY_TIMEOUT_SECONDS = 30
+BACKUP_PAGES_PER_STEP = 512
+BACKUP_STEP_SLEEP_SECONDS = 0.001
+_MB = 1 << 20
+VACUUM_MIN_RECLAIMABLE_BYTES = 10 * _MB
+INVENTORY_CACHE_TTL_SECONDS = 10
+HEALTH_PROFILE_CACHE_TTL_SECONDS = 300
+READ_CACHE_MAX_ENTRIES = 10000
+
+# Colonne modificabili tramite update_food_item / update_shopping_item
+_FOOD_ITEM_UPDATE_FIELDS = frozenset({"name", "category", "quantity", "unit", "expiry_date", "notes"})
+_SHOPPING_ITEM_UPDATE_FIELDS = frozenset({"name", "quantity", "unit", "category", "completed", "notes"})
+
+# Query "SELECT COUNT(*) FROM <tabella>" servibili dalla cache dei conteggi
+_COUNT_RE = re.compile(
+    r"^\s*SELECT\s+(COUNT\(\*\))\s+FROM\s+([A-Za-z_][A-Za-z0-9_]*)\s*;?\s*$",
+    re.IGNORECASE
+)
+
+# Statement SQL precompilati: stringhe identiche riutilizzano la cache dei
+# prepared statement di sqlite3
+SQLITE_CACHED_STATEMENTS = 256
+_SQL_INSERT_FOOD_ITEM = (
+    "INSERT INTO food_inventory (user_id, name, category, quantity, unit, expiry_date, notes, created_at, updated_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+)
+_SQL_INSERT_MEAL_PLAN = (
+    "INSERT INTO meal_plans (user_id, name, start_date, end_date, notes, created_at, updated_at) "
+    "VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+)
+_SQL_INSERT_MEAL = (
+    "INSERT INTO meals (plan_id, date, meal_type, description, recipe, nutrition_info, created_at, updated_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+)
+_SQL_INSERT_SHOPPING_LIST = (
+    "INSERT INTO shopping_lists (user_id, name, notes, created_at, updated_at) "
+    "VALUES (?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+)
+_SQL_INSERT_SHOPPING_ITEM = (
+    "INSERT INTO shopping_items (list_id, name, quantity, unit, category, completed, notes, created_at, updated_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+)
+_SQL_INSERT_HEALTH_CONDITION = (
+    "INSERT INTO health_conditions (user_id, name, description, notes, severity, diagnosed_date, created_at, updated_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+)
+_SQL_INSERT_RESTRICTION = (
+    "INSERT INTO dietary_restrictions (user_id, name, food_type, reason, severity, notes, created_at, updated_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+)
+_SQL_INSERT_SUPPLEMENT = (
+    "INSERT INTO supplements (user_id, name, dosage, frequency, purpose, start_date, end_date, notes, created_at, updated_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+)
+_SQL_INSERT_HEALTH_REPORT = (
+    "INSERT INTO health_reports (user_id, report_type, date, summary, details, file_path, created_at, updated_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+)
+_SQL_INSERT_USER_PREFERENCE = (
+    "INSERT INTO user_preferences (user_id, key, value, created_at, updated_at) "
+    "VALUES (?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+)
+
+
+def _quote_identifier(name: str) -> str:
+    """Quota un identificatore SQLite tra doppi apici, con escape dei doppi apici interni."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _build_count_sql(tables) -> str:
+    """
+    Costruisce una singola query UNION ALL che conta le righe di ogni tabella.
+    
+    Args:
+        tables: Nomi delle tabelle da conteggiare
+        
+    Returns:
+        str: Query SQL con colonne name e count
+    """
+    return " UNION ALL ".join(
+        "SELECT '" + table.replace("'", "''") + "' AS name, COUNT(*) AS count FROM " + _quote_identifier(table)
+        for table in tables
+    )
 
 
 class DatabaseException(Exception):
@@ -47,13 +128,16 @@ class DataManager:
     Fornisce metodi per l'accesso ai dati persistenti dell'applicazione.
     """
     
-    def __init__(self, db_path: Optional[str] = None, data_dir: Optional[str] = None):
+    def __init__(self, db_path: Optional[str] = None, data_dir: Optional[str] = None,
+                 use_counts_table: bool = False):
         """
         Inizializza il gestore del database.
         
         Args:
             db_path: Percorso del file database (se None, usa il percorso predefinito)
             data_dir: Directory principale per i dati (se None, usa la directory predefinita)
+            use_counts_table: Se True, mantiene i conteggi delle righe nella tabella _counts
+                              tramite trigger, evitando i COUNT(*) nelle statistiche
         """
         self.data_dir = Path(data_dir or DEFAULT_DATA_DIR)
         self.migrations_dir = Path(MIGRATIONS_DIR)
@@ -68,6 +152,34 @@ class DataManager:
         # Variabile per tenere traccia degli eventi di backup pianificati
         self._scheduled_backup_task = None
         
+        # Conteggi delle righe mantenuti dai trigger sulla tabella _counts
+        self.use_counts_table = use_counts_table
+        
+        # Cache dei conteggi per tabella, invalidata a ogni scrittura
+        self._count_cache: Dict[str, int] = {}
+        
+        # Cache delle letture dell'inventario per (utente, filtri), anch'essa invalidata
+        # a ogni scrittura; la generazione evita di salvare risultati letti prima di una modifica
+        self._inventory_cache: Dict[Tuple, Tuple[float, Tuple[Dict[str, Any], ...]]] = {}
+        self._cache_generation = 0
+        
+        # Rende atomici il controllo della generazione e il salvataggio rispetto
+        # all'invalidazione: letture e scritture arrivano da thread diversi
+        self._read_cache_lock = threading.Lock()
+        
+        # Profilo sanitario per (utente, integratori inclusi): cambia raramente ed è letto a ogni domanda a Claude
+        self._health_profile_cache: Dict[Tuple[int, bool], Tuple[float, Dict[str, List[Dict[str, Any]]]]] = {}
+        
+        # Elenco delle tabelle e query di conteggio, ricalcolati solo dopo modifiche allo schema
+        self._table_names: Optional[Tuple[str, ...]] = None
+        self._stats_sql: Optional[str] = None
+        
+        # Connessioni riutilizzate: una per thread, così la cache dei prepared
+        # statement di sqlite3 sopravvive tra una chiamata e l'altra
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        
         logger.info(f"DataManager inizializzato con database: {self.db_path}")
     
     def _ensure_directories(self):
@@ -75,28 +187,138 @@ class DataManager:
         for directory in [self.data_dir, self.migrations_dir, self.backup_dir]:
             directory.mkdir(parents=True, exist_ok=True)
     
+    def _invalidate_schema_cache(self):
+        """Invalida l'elenco delle tabelle e la query di statistiche dopo una modifica allo schema."""
+        self._table_names = None
+        self._stats_sql = None
+    
+    def _invalidate_read_caches(self):
+        """Invalida i conteggi e le letture in cache dopo una modifica ai dati."""
+        with self._read_cache_lock:
+            self._cache_generation += 1
+            self._count_cache.clear()
+            self._inventory_cache.clear()
+            self._health_profile_cache.clear()
+    
+    def _store_cached_read(self, cache: Dict, key: Tuple, value: Any, generation: int):
+        """
+        Salva in cache il risultato di una lettura, se nel frattempo non ci sono state scritture.
+        
+        Args:
+            cache: Cache in cui salvare il risultato
+            key: Chiave della lettura
+            value: Risultato della lettura
+            generation: Generazione delle cache all'inizio della lettura
+        """
+        with self._read_cache_lock:
+            if generation != self._cache_generation:
+                return
+            # Limite di sicurezza: le cache si svuotano comunque a ogni scrittura
+            if len(cache) >= READ_CACHE_MAX_ENTRIES:
+                cache.clear()
+            cache[key] = (time.monotonic(), value)
+    
+    def _store_counts(self, counts: Dict[str, int], generation: int):
+        """
+        Salva in cache i conteggi delle tabelle, se nel frattempo non ci sono state scritture.
+        
+        Args:
+            counts: Conteggi per nome di tabella
+            generation: Generazione delle cache prima della lettura dei conteggi
+        """
+        with self._read_cache_lock:
+            if generation == self._cache_generation:
+                self._count_cache.update(counts)
+    
+    def _load_schema_cache(self, conn: sqlite3.Connection):
+        """
+        Carica l'elenco delle tabelle e compila la query di conteggio, se non già presenti.
+        
+        Args:
+            conn: Connessione al database
+        """
+        if self._table_names is None:
+            cursor = conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+            )
+            self._table_names = tuple(sorted(row['name'] for row in cursor.fetchall()))
+            self._stats_sql = _build_count_sql(self._table_names) if self._table_names else None
+    
+    def _open_connection(self) -> sqlite3.Connection:
+        """
+        Apre e configura una nuova connessione al database.
+        
+        Returns:
+            sqlite3.Connection: Connessione configurata
+        """
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=DB_BUSY_TIMEOUT_SECONDS,
+            cached_statements=SQLITE_CACHED_STATEMENTS,
+            check_same_thread=False
+        )
+        # Abilita il supporto per chiavi esterne
+        conn.execute("PRAGMA foreign_keys = ON")
+        # WAL: le letture non bloccano le scritture e i commit sono più rapidi
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        # Configura per restituire righe come dizionari
+        conn.row_factory = sqlite3.Row
+        
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+    
     @contextmanager
     def get_connection(self):
         """
         Context manager per ottenere una connessione al database.
         
+        Ogni thread riutilizza la propria connessione. Le chiamate annidate
+        condividono la stessa connessione; all'uscita dal blocco più esterno
+        eventuali transazioni non confermate vengono annullate.
+        
         Yields:
             sqlite3.Connection: Connessione al database
         """
+        local = self._local
+        depth = getattr(local, "depth", 0)
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
-            # Abilita il supporto per chiavi esterne
-            conn.execute("PRAGMA foreign_keys = ON")
-            # Configura per restituire righe come dizionari
-            conn.row_factory = sqlite3.Row
+            conn = getattr(local, "conn", None)
+            if conn is None:
+                conn = local.conn = self._open_connection()
+            if depth == 0:
+                changes_before = conn.total_changes
+            local.depth = depth + 1
             yield conn
         except sqlite3.Error as e:
             logger.error(f"Errore durante la connessione al database: {str(e)}")
             raise DatabaseException(f"Errore del database: {str(e)}")
         finally:
-            if conn:
+            if conn is not None:
+                local.depth = depth
+                if depth == 0:
+                    # Non lasciare transazioni aperte sulla connessione riutilizzata
+                    if conn.in_transaction:
+                        conn.rollback()
+                    # Qualsiasi modifica rende obsoleti i dati in cache
+                    if conn.total_changes != changes_before:
+                        self._invalidate_read_caches()
+    
+    def close(self):
+        """Chiude tutte le connessioni aperte dal gestore."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        
+        for conn in connections:
+            try:
                 conn.close()
+            except sqlite3.Error as e:
+                logger.error(f"Errore durante la chiusura della connessione: {str(e)}")
+        
+        # Le connessioni per thread andranno riaperte al prossimo utilizzo
+        self._local = threading.local()
     
     def initialize_database(self) -> bool:
         """
@@ -107,7 +329,10 @@ class DataManager:
         """
         if self.db_path.exists():
             logger.info("Il database esiste già, verifica aggiornamenti...")
-            return self.apply_migrations()
+            success = self.apply_migrations()
+            if success and self.use_counts_table:
+                success = self._setup_counts_table()
+            return success
         
         try:
             # Controlla se esiste lo schema SQL
@@ -124,6 +349,10 @@ class DataManager:
             with self.get_connection() as conn:
                 conn.executescript(schema_sql)
                 conn.commit()
+            self._invalidate_schema_cache()
+            
+            if self.use_counts_table and not self._setup_counts_table():
+                return False
             
             logger.info("Database inizializzato con successo")
             return True
@@ -132,6 +361,57 @@ class DataManager:
             logger.error(f"Errore durante l'inizializzazione del database: {str(e)}")
             return False
     
+    def _setup_counts_table(self) -> bool:
+        """
+        Crea la tabella _counts e i trigger che ne mantengono aggiornati i valori
+        per ogni tabella del database. L'operazione è idempotente: i conteggi
+        già presenti non vengono ricalcolati.
+        
+        Returns:
+            bool: True se la configurazione è riuscita, False altrimenti
+        """
+        try:
+            with self.get_connection() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS _counts (name TEXT PRIMARY KEY, n INTEGER NOT NULL)"
+                )
+                
+                cursor = conn.execute(
+                    "SELECT name FROM sqlite_master "
+                    "WHERE type='table' AND name NOT LIKE 'sqlite_%' AND name != '_counts'"
+                )
+                tables = [row['name'] for row in cursor.fetchall()]
+                
+                for table in tables:
+                    quoted_table = _quote_identifier(table)
+                    quoted_name = "'" + table.replace("'", "''") + "'"
+                    
+                    # Conteggio iniziale, solo se la tabella non è ancora tracciata
+                    conn.execute(
+                        f"INSERT OR IGNORE INTO _counts (name, n) SELECT ?, COUNT(*) FROM {quoted_table}",
+                        (table,)
+                    )
+                    conn.execute(
+                        f"CREATE TRIGGER IF NOT EXISTS {_quote_identifier('_counts_' + table + '_insert')} "
+                        f"AFTER INSERT ON {quoted_table} FOR EACH ROW BEGIN "
+                        f"UPDATE _counts SET n = n + 1 WHERE name = {quoted_name}; END"
+                    )
+                    conn.execute(
+                        f"CREATE TRIGGER IF NOT EXISTS {_quote_identifier('_counts_' + table + '_delete')} "
+                        f"AFTER DELETE ON {quoted_table} FOR EACH ROW BEGIN "
+                        f"UPDATE _counts SET n = n - 1 WHERE name = {quoted_name}; END"
+                    )
+                
+                conn.commit()
+            self._invalidate_schema_cache()
+            
+            logger.info(f"Tabella _counts configurata per {len(tables)} tabelle")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Errore durante la configurazione della tabella _counts: {str(e)}")
+            return False
+    
     def apply_migrations(self) -> bool:
         """
         Applica le migrazioni disponibili in ordine di versione.
@@ -226,12 +506,13 @@ class DataManager:
                     
                     # Commit della transazione
                     conn.commit()
+                    self._invalidate_schema_cache()
                     logger.info(f"Migrazione {version} applicata con successo")
                     return True
                     
                 except Exception as e:
                     # Rollback in caso di errore
-                    conn.execute("ROLLBACK")
+                    conn.rollback()
                     logger.error(f"Errore durante l'applicazione della migrazione {version}: {str(e)}")
                     return False
                 
@@ -283,12 +564,18 @@ class DataManager:
             
             backup_path = self.backup_dir / backup_filename
             
-            # Assicura che il database sia in uno stato coerente
+            # Copia il database con la Online Backup API di SQLite: le pagine
+            # vengono trasferite a blocchi, senza checkpoint WAL né lock prolungati
             with self.get_connection() as conn:
-                conn.execute("PRAGMA wal_checkpoint(FULL)")
-            
-            # Copia il file di database
-            shutil.copy2(self.db_path, backup_path)
+                backup_conn = sqlite3.connect(backup_path)
+                try:
+                    conn.backup(
+                        backup_conn,
+                        pages=BACKUP_PAGES_PER_STEP,
+                        sleep=BACKUP_STEP_SLEEP_SECONDS
+                    )
+                finally:
+                    backup_conn.close()
             
             logger.info(f"Backup creato con successo: {backup_path}")
             return str(backup_path)
@@ -315,12 +602,17 @@ class DataManager:
             # Crea un backup prima del ripristino per sicurezza
             self.create_backup(custom_name="pre_restore")
             
-            # Chiudi tutte le connessioni aperte prima del ripristino
-            # In questo contesto non è possibile farlo direttamente
-            # Si assume che nessuna connessione sia attiva in questo momento
+            # Copia il backup nel database attivo con la Online Backup API:
+            # sovrascrivere il file mentre è in modalità WAL lo corromperebbe
+            with self.get_connection() as conn:
+                source_conn = sqlite3.connect(backup_path)
+                try:
+                    source_conn.backup(conn)
+                finally:
+                    source_conn.close()
             
-            # Sostituisci il database con il backup
-            shutil.copy2(backup_path, self.db_path)
+            self._invalidate_read_caches()
+            self._invalidate_schema_cache()
             
             logger.info(f"Database ripristinato con successo dal backup: {backup_path}")
             return True
@@ -371,16 +663,20 @@ class DataManager:
         try:
             backups = []
             
-            for backup_file in sorted(self.backup_dir.glob("*.db"), key=os.path.getmtime, reverse=True):
-                mod_time = datetime.datetime.fromtimestamp(os.path.getmtime(backup_file))
-                size_bytes = os.path.getsize(backup_file)
+            # Un solo stat() per file, riusato per ordinamento, data e dimensione
+            backup_stats = [(backup_file, os.stat(backup_file)) for backup_file in self.backup_dir.glob("*.db")]
+            backup_stats.sort(key=lambda entry: entry[1].st_mtime, reverse=True)
+            
+            for backup_file, st in backup_stats:
+                mod_time = datetime.datetime.fromtimestamp(st.st_mtime)
+                size_bytes = st.st_size
                 
                 backups.append({
                     "filename": backup_file.name,
                     "path": str(backup_file),
                     "date": mod_time.strftime("%Y-%m-%d %H:%M:%S"),
                     "size_bytes": size_bytes,
-                    "size_mb": round(size_bytes / (1024 * 1024), 2)
+                    "size_mb": round(size_bytes / _MB, 2)
                 })
             
             return backups
@@ -414,12 +710,7 @@ class DataManager:
         try:
             with self.get_connection() as conn:
                 cursor = conn.execute(
-                    """
-                    INSERT INTO food_inventory (
-                        user_id, name, category, quantity, unit, expiry_date, notes, 
-                        created_at, updated_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                    """,
+                    _SQL_INSERT_FOOD_ITEM,
                     (user_id, name, category, quantity, unit, expiry_date, notes)
                 )
                 conn.commit()
@@ -448,11 +739,11 @@ class DataManager:
             set_clauses = []
             params = []
             
-            for key, value in kwargs.items():
-                # Verifica che la chiave sia un campo valido
-                if key in ["name", "category", "quantity", "unit", "expiry_date", "notes"]:
-                    set_clauses.append(f"{key} = ?")
-                    params.append(value)
+            # Solo i campi validi, in ordine fisso: gli stessi campi producono sempre
+            # lo stesso testo SQL e riusano il prepared statement in cache
+            for key in sorted(kwargs.keys() & _FOOD_ITEM_UPDATE_FIELDS):
+                set_clauses.append(f"{key} = ?")
+                params.append(kwargs[key])
             
             if not set_clauses:
                 return True  # Nessun campo valido da aggiornare
@@ -504,6 +795,10 @@ class DataManager:
         """
         Ottiene l'inventario alimentare di un utente con possibilità di filtrare.
         
+        I risultati restano in cache per INVENTORY_CACHE_TTL_SECONDS, così le schermate
+        aperte in rapida successione non ripetono la stessa query; ogni scrittura
+        sul database svuota la cache.
+        
         Args:
             user_id: ID dell'utente
             category: Filtra per categoria (opzionale)
@@ -513,6 +808,11 @@ class DataManager:
         Returns:
             List[Dict[str, Any]]: Lista di elementi dell'inventario
         """
+        cache_key = (user_id, category, days_threshold if expiring_soon else None)
+        cached = self._inventory_cache.get(cache_key)
+        if cached is not None and time.monotonic() - cached[0] < INVENTORY_CACHE_TTL_SECONDS:
+            return list(cached[1])
+        
         try:
             query = "SELECT * FROM food_inventory WHERE user_id = ?"
             params = [user_id]
@@ -530,9 +830,13 @@ class DataManager:
             
             query += " ORDER BY expiry_date ASC NULLS LAST, name ASC"
             
+            generation = self._cache_generation
             with self.get_connection() as conn:
                 cursor = conn.execute(query, params)
-                return [dict(row) for row in cursor.fetchall()]
+                items = tuple(dict(row) for row in cursor.fetchall())
+            
+            self._store_cached_read(self._inventory_cache, cache_key, items, generation)
+            return list(items)
                 
         except sqlite3.Error as e:
             logger.error(f"Errore durante il recupero dell'inventario: {str(e)}")
@@ -580,12 +884,7 @@ class DataManager:
         try:
             with self.get_connection() as conn:
                 cursor = conn.execute(
-                    """
-                    INSERT INTO meal_plans (
-                        user_id, name, start_date, end_date, notes, 
-                        created_at, updated_at
-                    ) VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                    """,
+                    _SQL_INSERT_MEAL_PLAN,
                     (user_id, name, start_date, end_date, notes)
                 )
                 conn.commit()
@@ -615,12 +914,7 @@ class DataManager:
         try:
             with self.get_connection() as conn:
                 cursor = conn.execute(
-                    """
-                    INSERT INTO meals (
-                        plan_id, date, meal_type, description, recipe, nutrition_info, 
-                        created_at, updated_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                    """,
+                    _SQL_INSERT_MEAL,
                     (plan_id, date, meal_type, description, recipe, nutrition_info)
                 )
                 conn.commit()
@@ -713,11 +1007,7 @@ class DataManager:
         try:
             with self.get_connection() as conn:
                 cursor = conn.execute(
-                    """
-                    INSERT INTO shopping_lists (
-                        user_id, name, notes, created_at, updated_at
-                    ) VALUES (?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                    """,
+                    _SQL_INSERT_SHOPPING_LIST,
                     (user_id, name, notes)
                 )
                 conn.commit()
@@ -748,12 +1038,7 @@ class DataManager:
         try:
             with self.get_connection() as conn:
                 cursor = conn.execute(
-                    """
-                    INSERT INTO shopping_items (
-                        list_id, name, quantity, unit, category, completed, notes, 
-                        created_at, updated_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                    """,
+                    _SQL_INSERT_SHOPPING_ITEM,
                     (list_id, name, quantity, unit, category, completed, notes)
                 )
                 conn.commit()
@@ -763,6 +1048,44 @@ class DataManager:
             logger.error(f"Errore durante l'aggiunta dell'articolo alla lista della spesa: {str(e)}")
             return None
     
+    def add_shopping_items_bulk(self, list_id: int, items: List[Dict[str, Any]]) -> bool:
+        """
+        Aggiunge più elementi alla lista della spesa con un'unica transazione.
+        
+        Args:
+            list_id: ID della lista della spesa
+            items: Elementi da aggiungere, con le stesse chiavi dei parametri di add_shopping_item
+            
+        Returns:
+            bool: True se l'inserimento è riuscito, False altrimenti
+        """
+        if not items:
+            return True
+        
+        try:
+            with self.get_connection() as conn:
+                conn.executemany(
+                    _SQL_INSERT_SHOPPING_ITEM,
+                    [
+                        (
+                            list_id,
+                            item["name"],
+                            item.get("quantity"),
+                            item.get("unit"),
+                            item.get("category"),
+                            item.get("completed", False),
+                            item.get("notes")
+                        )
+                        for item in items
+                    ]
+                )
+                conn.commit()
+                return True
+                
+        except sqlite3.Error as e:
+            logger.error(f"Errore durante l'aggiunta degli articoli alla lista della spesa: {str(e)}")
+            return False
+    
     def update_shopping_item(self, item_id: int, **kwargs) -> bool:
         """
         Aggiorna un elemento della lista della spesa.
@@ -782,11 +1105,11 @@ class DataManager:
             set_clauses = []
             params = []
             
-            for key, value in kwargs.items():
-                # Verifica che la chiave sia un campo valido
-                if key in ["name", "quantity", "unit", "category", "completed", "notes"]:
-                    set_clauses.append(f"{key} = ?")
-                    params.append(value)
+            # Solo i campi validi, in ordine fisso: gli stessi campi producono sempre
+            # lo stesso testo SQL e riusano il prepared statement in cache
+            for key in sorted(kwargs.keys() & _SHOPPING_ITEM_UPDATE_FIELDS):
+                set_clauses.append(f"{key} = ?")
+                params.append(kwargs[key])
             
             if not set_clauses:
                 return True  # Nessun campo valido da aggiornare
@@ -826,6 +1149,34 @@ class DataManager:
         """
         return self.update_shopping_item(item_id, completed=completed)
     
+    def mark_all_shopping_items_as_completed(self, list_id: int, completed: bool = True) -> bool:
+        """
+        Marca con un'unica query tutti gli elementi di una lista della spesa come completati
+        o non completati.
+        
+        Args:
+            list_id: ID della lista della spesa
+            completed: Nuovo stato di completamento
+            
+        Returns:
+            bool: True se l'aggiornamento è riuscito, False altrimenti
+        """
+        try:
+            with self.get_connection() as conn:
+                conn.execute(
+                    """
+                    UPDATE shopping_items SET completed = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE list_id = ? AND completed != ?
+                    """,
+                    (completed, list_id, completed)
+                )
+                conn.commit()
+                return True
+                
+        except sqlite3.Error as e:
+            logger.error(f"Errore durante l'aggiornamento degli articoli della lista: {str(e)}")
+            return False
+    
     def get_shopping_lists(self, user_id: int) -> List[Dict[str, Any]]:
         """
         Ottiene tutte le liste della spesa di un utente.
@@ -880,6 +1231,39 @@ class DataManager:
             logger.error(f"Errore durante il recupero degli elementi della lista della spesa: {str(e)}")
             return []
     
+    def get_shopping_list_counts(self, list_ids: List[int]) -> Dict[int, Tuple[int, int]]:
+        """
+        Ottiene con un'unica query aggregata il numero di elementi totali e completati
+        per ciascuna delle liste indicate.
+        
+        Args:
+            list_ids: ID delle liste della spesa
+            
+        Returns:
+            Dict[int, Tuple[int, int]]: Dizionario {id lista: (totale, completati)};
+                                        le liste senza elementi non sono presenti
+        """
+        list_ids = list(list_ids)
+        if not list_ids:
+            return {}
+        
+        try:
+            placeholders = ", ".join("?" * len(list_ids))
+            query = f"""
+                SELECT list_id, COUNT(*) AS total, SUM(completed) AS done
+                FROM shopping_items
+                WHERE list_id IN ({placeholders})
+                GROUP BY list_id
+            """
+            
+            with self.get_connection() as conn:
+                cursor = conn.execute(query, list_ids)
+                return {row['list_id']: (row['total'], row['done'] or 0) for row in cursor.fetchall()}
+                
+        except sqlite3.Error as e:
+            logger.error(f"Errore durante il conteggio degli elementi delle liste della spesa: {str(e)}")
+            return {}
+    
     def generate_shopping_list_from_inventory(self, user_id: int, threshold: float = 0.2) -> Optional[int]:
         """
         Genera una lista della spesa basata sull'inventario alimentare.
@@ -916,16 +1300,17 @@ class DataManager:
                 )
                 
                 low_items = cursor.fetchall()
-                
-                # Aggiungi ogni elemento alla lista della spesa
-                for item in low_items:
-                    self.add_shopping_item(
-                        list_id=list_id,
-                        name=item['name'],
-                        category=item['category'],
-                        unit=item['unit'],
-                        notes=f"Inventario in esaurimento ({item['quantity']} {item['unit']})"
-                    )
+            
+            # Aggiungi tutti gli elementi alla lista della spesa in un'unica operazione
+            self.add_shopping_items_bulk(list_id, [
+                {
+                    "name": item['name'],
+                    "category": item['category'],
+                    "unit": item['unit'],
+                    "notes": f"Inventario in esaurimento ({item['quantity']} {item['unit']})"
+                }
+                for item in low_items
+            ])
             
             return list_id
             
@@ -957,12 +1342,7 @@ class DataManager:
         try:
             with self.get_connection() as conn:
                 cursor = conn.execute(
-                    """
-                    INSERT INTO health_conditions (
-                        user_id, name, description, notes, severity, diagnosed_date, 
-                        created_at, updated_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                    """,
+                    _SQL_INSERT_HEALTH_CONDITION,
                     (user_id, name, description, notes, severity, diagnosed_date)
                 )
                 conn.commit()
@@ -992,12 +1372,7 @@ class DataManager:
         try:
             with self.get_connection() as conn:
                 cursor = conn.execute(
-                    """
-                    INSERT INTO dietary_restrictions (
-                        user_id, name, food_type, reason, severity, notes, 
-                        created_at, updated_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                    """,
+                    _SQL_INSERT_RESTRICTION,
                     (user_id, name, food_type, reason, severity, notes)
                 )
                 conn.commit()
@@ -1030,12 +1405,7 @@ class DataManager:
         try:
             with self.get_connection() as conn:
                 cursor = conn.execute(
-                    """
-                    INSERT INTO supplements (
-                        user_id, name, dosage, frequency, purpose, 
-                        start_date, end_date, notes, created_at, updated_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                    """,
+                    _SQL_INSERT_SUPPLEMENT,
                     (user_id, name, dosage, frequency, purpose, start_date, end_date, notes)
                 )
                 conn.commit()
@@ -1065,12 +1435,7 @@ class DataManager:
         try:
             with self.get_connection() as conn:
                 cursor = conn.execute(
-                    """
-                    INSERT INTO health_reports (
-                        user_id, report_type, date, summary, details, file_path, 
-                        created_at, updated_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                    """,
+                    _SQL_INSERT_HEALTH_REPORT,
                     (user_id, report_type, date, summary, details, file_path)
                 )
                 conn.commit()
@@ -1162,6 +1527,39 @@ class DataManager:
             logger.error(f"Errore durante il recupero degli integratori: {str(e)}")
             return []
     
+    def get_health_profile(self, user_id: int, include_supplements: bool = True) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Ottiene insieme condizioni mediche, restrizioni alimentari e integratori attivi di un utente.
+        
+        Le letture condividono un'unica connessione, così chi chiama può ottenerle
+        con un solo passaggio a un thread invece di tre. Il profilo resta in cache per
+        HEALTH_PROFILE_CACHE_TTL_SECONDS e viene invalidato da qualsiasi scrittura.
+        
+        Args:
+            user_id: ID dell'utente
+            include_supplements: Se True, include anche gli integratori attivi
+            
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: Liste "conditions", "restrictions" e,
+                                             se richiesto, "supplements"
+        """
+        cache_key = (user_id, include_supplements)
+        cached = self._health_profile_cache.get(cache_key)
+        if cached is not None and time.monotonic() - cached[0] < HEALTH_PROFILE_CACHE_TTL_SECONDS:
+            return {name: list(items) for name, items in cached[1].items()}
+        
+        generation = self._cache_generation
+        with self.get_connection():
+            profile = {
+                "conditions": self.get_health_conditions(user_id),
+                "restrictions": self.get_dietary_restrictions(user_id)
+            }
+            if include_supplements:
+                profile["supplements"] = self.get_supplements(user_id)
+        
+        self._store_cached_read(self._health_profile_cache, cache_key, profile, generation)
+        return {name: list(items) for name, items in profile.items()}
+    
     def get_health_reports(self, user_id: int, report_type: Optional[str] = None,
                          start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[Dict[str, Any]]:
         """
@@ -1240,11 +1638,7 @@ class DataManager:
                 else:
                     # Inserisci una nuova preferenza
                     conn.execute(
-                        """
-                        INSERT INTO user_preferences (
-                            user_id, key, value, created_at, updated_at
-                        ) VALUES (?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                        """,
+                        _SQL_INSERT_USER_PREFERENCE,
                         (user_id, key, value)
                     )
                 
@@ -1472,11 +1866,14 @@ class DataManager:
                             self.set_user_preference(user_id, key, value)
                     
                     # Importa dati sanitari se presenti
-                    if "health" in data and isinstance(data["health"], dict):
+                    health = data.get("health")
+                    if isinstance(health, dict):
                         # Importa condizioni mediche
-                        if "conditions" in data["health"] and isinstance(data["health"]["conditions"], list):
-                            for condition in data["health"]["conditions"]:
-                                self.add_health_condition(
+                        conditions = health.get("conditions")
+                        if isinstance(conditions, list):
+                            add_condition = self.add_health_condition
+                            for condition in conditions:
+                                add_condition(
                                     user_id=user_id,
                                     name=condition.get("name", ""),
                                     description=condition.get("description"),
@@ -1486,9 +1883,11 @@ class DataManager:
                                 )
                         
                         # Importa restrizioni alimentari
-                        if "dietary_restrictions" in data["health"] and isinstance(data["health"]["dietary_restrictions"], list):
-                            for restriction in data["health"]["dietary_restrictions"]:
-                                self.add_dietary_restriction(
+                        restrictions = health.get("dietary_restrictions")
+                        if isinstance(restrictions, list):
+                            add_restriction = self.add_dietary_restriction
+                            for restriction in restrictions:
+                                add_restriction(
                                     user_id=user_id,
                                     name=restriction.get("name", ""),
                                     food_type=restriction.get("food_type", ""),
@@ -1498,9 +1897,11 @@ class DataManager:
                                 )
                         
                         # Importa integratori
-                        if "supplements" in data["health"] and isinstance(data["health"]["supplements"], list):
-                            for supplement in data["health"]["supplements"]:
-                                self.add_supplement(
+                        supplements = health.get("supplements")
+                        if isinstance(supplements, list):
+                            add_supplement = self.add_supplement
+                            for supplement in supplements:
+                                add_supplement(
                                     user_id=user_id,
                                     name=supplement.get("name", ""),
                                     dosage=supplement.get("dosage", ""),
@@ -1512,9 +1913,11 @@ class DataManager:
                                 )
                         
                         # Importa referti medici
-                        if "reports" in data["health"] and isinstance(data["health"]["reports"], list):
-                            for report in data["health"]["reports"]:
-                                self.add_health_report(
+                        reports = health.get("reports")
+                        if isinstance(reports, list):
+                            add_report = self.add_health_report
+                            for report in reports:
+                                add_report(
                                     user_id=user_id,
                                     report_type=report.get("report_type", ""),
                                     date=report.get("date", ""),
@@ -1530,7 +1933,7 @@ class DataManager:
                     
                 except Exception as e:
                     # Rollback in caso di errore
-                    conn.execute("ROLLBACK")
+                    conn.rollback()
                     logger.error(f"Errore durante l'importazione dei dati utente: {str(e)}")
                     return False
             
@@ -1551,43 +1954,56 @@ class DataManager:
         """
         try:
             stats = {
-                "db_size_bytes": os.path.getsize(self.db_path),
+                "db_size_bytes": 0,
                 "tables": {},
                 "last_backup": None,
                 "total_backups": 0
             }
             
-            # Converti dimensione in MB
-            stats["db_size_mb"] = round(stats["db_size_bytes"] / (1024 * 1024), 2)
-            
             # Ottieni statistiche per ogni tabella
+            generation = self._cache_generation
             with self.get_connection() as conn:
-                # Ottieni l'elenco delle tabelle
-                cursor = conn.execute(
-                    "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
-                )
-                tables = [row['name'] for row in cursor.fetchall()]
+                # Dimensione logica del database: in modalità WAL le pagine confermate
+                # restano nel file -wal fino al checkpoint, quindi la dimensione del file
+                # principale sottostimerebbe i dati
+                page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+                page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+                stats["db_size_bytes"] = page_count * page_size
                 
-                # Per ogni tabella, ottieni il conteggio delle righe
-                for table in tables:
-                    cursor = conn.execute(f"SELECT COUNT(*) as count FROM {table}")
-                    row = cursor.fetchone()
-                    stats["tables"][table] = row['count']
+                if self.use_counts_table:
+                    # Conteggi mantenuti dai trigger: una sola lettura, nessuna scansione
+                    cursor = conn.execute("SELECT name, n FROM _counts ORDER BY name")
+                    stats["tables"] = {row['name']: row['n'] for row in cursor.fetchall()}
+                    self._store_counts(stats["tables"], generation)
+                else:
+                    # Elenco delle tabelle e query di conteggio compilati una sola volta
+                    self._load_schema_cache(conn)
+                    
+                    # Conteggio delle righe di tutte le tabelle in un'unica query
+                    if self._stats_sql:
+                        cursor = conn.execute(self._stats_sql)
+                        stats["tables"] = {row['name']: row['count'] for row in cursor.fetchall()}
+                    
+                    self._store_counts(stats["tables"], generation)
             
-            # Ottieni informazioni sui backup
-            backup_files = list(self.backup_dir.glob("*.db"))
-            stats["total_backups"] = len(backup_files)
+            # Converti dimensione in MB
+            stats["db_size_mb"] = round(stats["db_size_bytes"] / _MB, 2)
+            
+            # Ottieni informazioni sui backup (un solo stat() per file)
+            backup_stats = [(backup_file, os.stat(backup_file)) for backup_file in self.backup_dir.glob("*.db")]
+            stats["total_backups"] = len(backup_stats)
             
-            if backup_files:
+            if backup_stats:
                 # Trova il backup più recente
-                latest_backup = max(backup_files, key=os.path.getmtime)
-                mod_time = datetime.datetime.fromtimestamp(os.path.getmtime(latest_backup))
+                latest_backup, st = max(backup_stats, key=lambda entry: entry[1].st_mtime)
+                mod_time = datetime.datetime.fromtimestamp(st.st_mtime)
+                size_bytes = st.st_size
                 
                 stats["last_backup"] = {
                     "filename": latest_backup.name,
                     "date": mod_time.strftime("%Y-%m-%d %H:%M:%S"),
-                    "size_bytes": os.path.getsize(latest_backup),
-                    "size_mb": round(os.path.getsize(latest_backup) / (1024 * 1024), 2)
+                    "size_bytes": size_bytes,
+                    "size_mb": round(size_bytes / _MB, 2)
                 }
             
             return stats
@@ -1613,14 +2029,36 @@ class DataManager:
         try:
             params = params or ()
             
+            # Fast path: conteggio semplice già presente in cache
+            count_match = None if params else _COUNT_RE.match(query)
+            if count_match:
+                count_column, table = count_match.groups()
+                cached_count = self._count_cache.get(table)
+                if cached_count is not None:
+                    return [{count_column: cached_count}]
+            
+            generation = self._cache_generation
             with self.get_connection() as conn:
-                cursor = conn.execute(query, params)
+                # Tuple semplici al posto di sqlite3.Row: i nomi delle colonne
+                # vengono letti una sola volta da cursor.description
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                cursor.execute(query, params)
+                
+                if cursor.description is None:
+                    return []
+                columns = tuple(column[0] for column in cursor.description)
+                
+                if count_match:
+                    row = cursor.fetchone()
+                    self._store_counts({table: row[0]}, generation)
+                    return [dict(zip(columns, row))]
                 
                 if fetch_all:
-                    return [dict(row) for row in cursor.fetchall()]
+                    return [dict(zip(columns, row)) for row in cursor]
                 else:
                     row = cursor.fetchone()
-                    return [dict(row)] if row else []
+                    return [dict(zip(columns, row))] if row else []
                 
         except sqlite3.Error as e:
             logger.error(f"Errore durante l'esecuzione della query personalizzata: {str(e)}")
@@ -1630,10 +2068,26 @@ class DataManager:
         """
         Esegue una pulizia e ottimizzazione del database (VACUUM).
         
+        Nota: è un'operazione bloccante; da un contesto asincrono usare
+        vacuum_database_async per non bloccare l'event loop.
+        
         Returns:
             bool: True se l'operazione è riuscita, False altrimenti
         """
         try:
+            # Stima lo spazio recuperabile: se è poco, backup e VACUUM non valgono il costo
+            with self.get_connection() as conn:
+                freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            
+            reclaimable_bytes = freelist_count * page_size
+            if reclaimable_bytes < VACUUM_MIN_RECLAIMABLE_BYTES:
+                logger.info(
+                    f"VACUUM saltato: solo {round(reclaimable_bytes / _MB, 2)} MB recuperabili "
+                    f"(soglia {VACUUM_MIN_RECLAIMABLE_BYTES // _MB} MB)"
+                )
+                return True
+            
             # Prima crea un backup
             self.create_backup(custom_name="pre_vacuum")
             
@@ -1644,6 +2098,15 @@ class DataManager:
         except sqlite3.Error as e:
             logger.error(f"Errore durante l'ottimizzazione del database: {str(e)}")
             return False
+    
+    async def vacuum_database_async(self) -> bool:
+        """
+        Esegue vacuum_database in un thread separato, senza bloccare l'event loop.
+        
+        Returns:
+            bool: True se l'operazione è riuscita, False altrimenti
+        """
+        return await asyncio.to_thread(self.vacuum_database)
 
 
 # Funzioni di utilità
@@ -1669,6 +2132,12 @@ def test_database_connection(db_path: str) -> bool:
 if __name__ == "__main__":
     """Test di base del modulo."""
     
+    # Configurazione logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
     async def run_test():
         try:
             print("Inizializzazione del DataManager...")
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import os
 
@@ -19,6 +20,14 @@ def main():
     )
     logging.getLogger("httpx").setLevel(logging.WARNING)
 
+    # Use the libuv-based event loop when available (optional dependency)
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        logging.info('Using uvloop event loop')
+    except ImportError:
+        pass
+
     # Check if the required environment variables are set
     required_values = ['TELEGRAM_BOT_TOKEN', 'ANTHROPIC_API_KEY']
     missing_values = [value for value in required_values if os.environ.get(value) is None]
@@ -98,6 +107,7 @@ def main():
         'tts_prices': [float(i) for i in os.environ.get('TTS_PRICES', "0.015,0.030").split(",")],
         'transcription_price': float(os.environ.get('TRANSCRIPTION_PRICE', 0.006)),
         'bot_language': os.environ.get('BOT_LANGUAGE', 'en'),
+        'persistence_file': os.environ.get('PERSISTENCE_FILE', ''),
     }
 
     plugin_config = {
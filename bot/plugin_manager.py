@@ -11,27 +11,49 @@ tramite plugin modulari, incluso il supporto per ricerche su internet con DuckDu
 import os
 import sys
 import importlib
+import importlib.util
+import importlib.machinery
 import logging
-import inspect
-import pkgutil
+import asyncio
 import json
-from typing import Dict, List, Optional, Union, Any, Callable, Type
+import itertools
+import time
+import threading
+from typing import Dict, List, Optional, Union, Any, Callable, Type, Iterator, Mapping, Tuple, FrozenSet
 from pathlib import Path
-import subprocess
-import tempfile
-import shutil
+from collections import OrderedDict, defaultdict
+from types import MappingProxyType
 
-# Configurazione logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Logger del modulo: la configurazione è lasciata all'applicazione
 logger = logging.getLogger(__name__)
 
 # Costanti
 PLUGINS_DIR = "plugins"
 DEFAULT_PLUGINS = ["duckduckgo_search"]
 PLUGIN_CONFIG_FILE = "plugin_config.json"
+# Pacchetto sotto cui vengono importati i plugin esterni (es. "bot_plugins.meteo")
+PLUGIN_PACKAGE = "bot_plugins"
+SEARCH_CACHE_SIZE = 256
+SEARCH_CACHE_TTL_SECONDS = 300
+
+
+def _dump_json(data: Any) -> bytes:
+    """Serializza in JSON indentato, usando orjson se disponibile."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2).encode("utf-8")
+
+
+def _load_json(raw: bytes) -> Any:
+    """Deserializza un documento JSON, usando orjson se disponibile."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
 
 
 class PluginException(Exception):
@@ -45,6 +67,9 @@ class BasePlugin:
     Definisce l'interfaccia standard che ogni plugin deve implementare.
     """
     
+    # Attributi fissi, senza __dict__ per istanza (le sottoclassi possono comunque aggiungerne)
+    __slots__ = ("config", "name", "version", "description", "_enabled", "_info")
+    
     def __init__(self, config: Optional[Dict[str, Any]] = None):
         """
         Inizializza il plugin con la configurazione fornita.
@@ -56,7 +81,39 @@ class BasePlugin:
         self.name = self.__class__.__name__
         self.version = "1.0.0"
         self.description = "Plugin base"
-        self.enabled = True
+        self._enabled = True
+        
+        # Informazioni sul plugin, costruite al primo accesso
+        self._info = None
+    
+    @property
+    def enabled(self) -> bool:
+        """Indica se il plugin è abilitato."""
+        return self._enabled
+    
+    @enabled.setter
+    def enabled(self, value: bool):
+        self._enabled = value
+        # Le informazioni memorizzate riportano lo stato precedente
+        self._info = None
+    
+    @property
+    def info(self) -> Mapping[str, Any]:
+        """
+        Informazioni sul plugin in sola lettura, calcolate una volta e poi riutilizzate.
+        
+        Returns:
+            Mapping[str, Any]: Informazioni sul plugin
+        """
+        if self._info is None:
+            self._info = MappingProxyType({
+                "name": self.name,
+                "version": self.version,
+                "description": self.description,
+                "enabled": self._enabled,
+                "capabilities": tuple(self.get_capabilities())
+            })
+        return self._info
         
     def initialize(self) -> bool:
         """
@@ -101,20 +158,14 @@ class BasePlugin:
         """
         raise PluginException(f"Azione '{action}' non supportata dal plugin {self.name}")
     
-    def get_info(self) -> Dict[str, Any]:
+    def get_info(self) -> Mapping[str, Any]:
         """
         Restituisce informazioni sul plugin.
         
         Returns:
-            Dict[str, Any]: Informazioni sul plugin
+            Mapping[str, Any]: Informazioni sul plugin (in sola lettura)
         """
-        return {
-            "name": self.name,
-            "version": self.version,
-            "description": self.description,
-            "enabled": self.enabled,
-            "capabilities": self.get_capabilities()
-        }
+        return self.info
 
 
 class DuckDuckGoSearchPlugin(BasePlugin):
@@ -123,6 +174,29 @@ class DuckDuckGoSearchPlugin(BasePlugin):
     Permette di eseguire ricerche su internet tramite il motore DuckDuckGo.
     """
     
+    # Attributi aggiuntivi rispetto a BasePlugin: anche le istanze del plugin restano senza __dict__
+    __slots__ = ("is_available", "_ddgs_local", "_ddgs_bin", "_dispatch")
+    
+    # Funzionalità supportate, con un insieme per la validazione delle azioni
+    _CAPABILITIES: Tuple[str, ...] = (
+        "text_search",
+        "image_search",
+        "news_search",
+        "video_search",
+        "answers",
+        "suggestions"
+    )
+    _CAPABILITY_SET: FrozenSet[str] = frozenset(_CAPABILITIES)
+    
+    # Impostazioni predefinite (condivise e in sola lettura)
+    default_config = MappingProxyType({
+        "max_results": 5,
+        "region": "wt-wt",  # Worldwide
+        "safesearch": "moderate",
+        "timelimit": None,  # No time limit
+        "backend": "api"    # Use API instead of HTML
+    })
+    
     def __init__(self, config: Optional[Dict[str, Any]] = None):
         """
         Inizializza il plugin DuckDuckGo Search.
@@ -135,21 +209,32 @@ class DuckDuckGoSearchPlugin(BasePlugin):
         self.version = "1.0.0"
         self.description = "Plugin per la ricerca su internet tramite DuckDuckGo"
         
-        # Impostazioni predefinite
-        self.default_config = {
-            "max_results": 5,
-            "region": "wt-wt",  # Worldwide
-            "safesearch": "moderate",
-            "timelimit": None,  # No time limit
-            "backend": "api"    # Use API instead of HTML
-        }
-        
         # Unisci la configurazione predefinita con quella fornita
-        self.config = {**self.default_config, **(config or {})}
+        self.config = dict(self.default_config)
+        if config:
+            self.config.update(config)
         
         # Flag per indicare se il pacchetto duckduckgo_search è installato
         self.is_available = False
         
+        # Client DDGS, importato e creato alla prima ricerca e poi riutilizzato; uno per
+        # thread, perché le ricerche asincrone girano in thread di lavoro concorrenti
+        self._ddgs_local = threading.local()
+        
+        # Percorso dell'eseguibile della CLI, risolto una sola volta
+        from shutil import which
+        self._ddgs_bin = which("ddgs")
+        
+        # Tabella di dispatch: azione -> funzione(ddgs, query, parametri)
+        self._dispatch: Dict[str, Callable[[Any, str, Dict[str, Any]], Any]] = {
+            "text_search": self._text_search,
+            "image_search": self._image_search,
+            "news_search": self._news_search,
+            "video_search": self._video_search,
+            "answers": lambda ddgs, query, params: ddgs.answers(query),
+            "suggestions": lambda ddgs, query, params: ddgs.suggestions(query)
+        }
+        
     def initialize(self) -> bool:
         """
         Inizializza il plugin e verifica che il pacchetto duckduckgo_search sia installato.
@@ -157,31 +242,37 @@ class DuckDuckGoSearchPlugin(BasePlugin):
         Returns:
             bool: True se l'inizializzazione è riuscita, False altrimenti
         """
-        try:
-            import duckduckgo_search
+        # Verifica la presenza del pacchetto senza importarlo: l'import avviene alla prima ricerca
+        if importlib.util.find_spec("duckduckgo_search") is not None:
             self.is_available = True
-            logger.info(f"Plugin {self.name} inizializzato correttamente.")
+            logger.info("Plugin %s inizializzato correttamente.", self.name)
             return True
-        except ImportError:
-            logger.warning(f"Il pacchetto 'duckduckgo_search' non è installato. Il plugin {self.name} non sarà disponibile.")
-            self.is_available = False
-            return False
+        
+        logger.warning("Il pacchetto 'duckduckgo_search' non è installato. Il plugin %s non sarà disponibile.", self.name)
+        self.is_available = False
+        return False
     
-    def get_capabilities(self) -> List[str]:
+    def _get_ddgs(self):
+        """
+        Restituisce il client DDGS, importando il pacchetto e creandolo al primo utilizzo.
+        
+        Returns:
+            DDGS: Istanza del client DuckDuckGo riservata al thread corrente
+        """
+        ddgs = getattr(self._ddgs_local, "client", None)
+        if ddgs is None:
+            from duckduckgo_search import DDGS
+            ddgs = self._ddgs_local.client = DDGS()
+        return ddgs
+    
+    def get_capabilities(self) -> Tuple[str, ...]:
         """
         Restituisce l'elenco delle funzionalità fornite dal plugin.
         
         Returns:
-            List[str]: Elenco delle funzionalità
+            Tuple[str, ...]: Elenco delle funzionalità (condiviso, in sola lettura)
         """
-        return [
-            "text_search",
-            "image_search",
-            "news_search",
-            "video_search",
-            "answers",
-            "suggestions"
-        ]
+        return self._CAPABILITIES
     
     def execute(self, action: str, params: Dict[str, Any] = None) -> Any:
         """
@@ -200,94 +291,130 @@ class DuckDuckGoSearchPlugin(BasePlugin):
         if not self.is_available:
             raise PluginException("Il plugin DuckDuckGoSearch non è disponibile. Installa il pacchetto 'duckduckgo_search'.")
         
+        try:
+            return list(self.execute_stream(action, params))
+        except Exception as e:
+            logger.error("Errore durante l'esecuzione dell'azione '%s': %s", action, e)
+            raise PluginException(f"Errore durante l'esecuzione dell'azione '{action}': {str(e)}")
+    
+    def execute_stream(self, action: str, params: Dict[str, Any] = None) -> Iterator[Any]:
+        """
+        Esegue una ricerca restituendo i risultati man mano che arrivano, senza creare la lista completa.
+        
+        Args:
+            action: Tipo di ricerca ('text_search', 'image_search', ecc.)
+            params: Parametri per la ricerca (opzionale)
+            
+        Returns:
+            Iterator[Any]: Iteratore sui risultati della ricerca
+            
+        Raises:
+            PluginException: Se il plugin non è disponibile o la richiesta non è valida
+        """
+        if not self.is_available:
+            raise PluginException("Il plugin DuckDuckGoSearch non è disponibile. Installa il pacchetto 'duckduckgo_search'.")
+        
+        # Valida l'azione prima di qualsiasi altro lavoro
+        if action not in self._CAPABILITY_SET:
+            raise PluginException(f"Azione '{action}' non supportata.")
+        
+        # Risolvi l'azione con una sola ricerca nella tabella di dispatch
+        handler = self._dispatch[action]
+        
+        # Parametri comuni
         params = params or {}
+        query = params.get("query", "")
+        if not query:
+            raise PluginException("La query di ricerca è obbligatoria.")
         
-        try:
-            from duckduckgo_search import DDGS
+        # Unisci una sola volta i parametri con la configurazione del plugin
+        merged = {**self.config, **params}
+        
+        # Riutilizza l'istanza di DDGS tra le ricerche
+        return iter(handler(self._get_ddgs(), query, merged))
+    
+    def text_search(self, query: str, max_results: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Esegue una ricerca testuale con la configurazione del plugin, senza passare
+        dalla validazione dell'azione e dall'unione dei parametri di execute.
+        
+        Args:
+            query: Query di ricerca
+            max_results: Numero massimo di risultati (se None, quello della configurazione)
             
-            # Crea un'istanza di DDGS
-            ddgs = DDGS()
-            
-            # Parametri comuni
-            query = params.get("query", "")
-            if not query:
-                raise PluginException("La query di ricerca è obbligatoria.")
-            
-            max_results = params.get("max_results", self.config["max_results"])
-            region = params.get("region", self.config["region"])
-            safesearch = params.get("safesearch", self.config["safesearch"])
-            timelimit = params.get("timelimit", self.config["timelimit"])
-            
-            # Esegui l'azione richiesta
-            if action == "text_search":
-                results = list(ddgs.text(
-                    query,
-                    region=region,
-                    safesearch=safesearch,
-                    timelimit=timelimit,
-                    max_results=max_results
-                ))
-                return results
-                
-            elif action == "image_search":
-                image_type = params.get("image_type", "photo")
-                size = params.get("size", None)
-                color = params.get("color", None)
-                layout = params.get("layout", None)
-                license_type = params.get("license", None)
-                
-                results = list(ddgs.images(
-                    query,
-                    region=region,
-                    safesearch=safesearch,
-                    size=size,
-                    color=color,
-                    type_image=image_type,
-                    layout=layout,
-                    license_image=license_type,
-                    max_results=max_results
-                ))
-                return results
-                
-            elif action == "news_search":
-                results = list(ddgs.news(
-                    query,
-                    region=region,
-                    safesearch=safesearch,
-                    timelimit=timelimit,
-                    max_results=max_results
-                ))
-                return results
-                
-            elif action == "video_search":
-                results = list(ddgs.videos(
-                    query,
-                    region=region,
-                    safesearch=safesearch,
-                    timelimit=timelimit,
-                    max_results=max_results
-                ))
-                return results
-                
-            elif action == "answers":
-                return ddgs.answers(query)
-                
-            elif action == "suggestions":
-                return ddgs.suggestions(query)
-                
-            else:
-                raise PluginException(f"Azione '{action}' non supportata.")
-                
+        Returns:
+            List[Dict[str, Any]]: Risultati della ricerca
+            
+        Raises:
+            PluginException: Se il plugin non è disponibile o si verifica un errore
+        """
+        if not self.is_available:
+            raise PluginException("Il plugin DuckDuckGoSearch non è disponibile. Installa il pacchetto 'duckduckgo_search'.")
+        if not query:
+            raise PluginException("La query di ricerca è obbligatoria.")
+        
+        params = self.config if max_results is None else {**self.config, "max_results": max_results}
+        try:
+            return list(self._text_search(self._get_ddgs(), query, params))
         except Exception as e:
-            logger.error(f"Errore durante l'esecuzione dell'azione '{action}': {str(e)}")
-            raise PluginException(f"Errore durante l'esecuzione dell'azione '{action}': {str(e)}")
+            logger.error("Errore durante l'esecuzione dell'azione 'text_search': %s", e)
+            raise PluginException(f"Errore durante l'esecuzione dell'azione 'text_search': {str(e)}")
+    
+    @staticmethod
+    def _text_search(ddgs, query: str, params: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Esegue una ricerca testuale."""
+        return itertools.islice(ddgs.text(
+            query,
+            region=params["region"],
+            safesearch=params["safesearch"],
+            timelimit=params["timelimit"],
+            max_results=params["max_results"]
+        ), params["max_results"])
     
-    def search_cli(self, command: str) -> str:
+    @staticmethod
+    def _image_search(ddgs, query: str, params: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Esegue una ricerca di immagini."""
+        return itertools.islice(ddgs.images(
+            query,
+            region=params["region"],
+            safesearch=params["safesearch"],
+            size=params.get("size"),
+            color=params.get("color"),
+            type_image=params.get("image_type", "photo"),
+            layout=params.get("layout"),
+            license_image=params.get("license"),
+            max_results=params["max_results"]
+        ), params["max_results"])
+    
+    @staticmethod
+    def _news_search(ddgs, query: str, params: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Esegue una ricerca di notizie."""
+        return itertools.islice(ddgs.news(
+            query,
+            region=params["region"],
+            safesearch=params["safesearch"],
+            timelimit=params["timelimit"],
+            max_results=params["max_results"]
+        ), params["max_results"])
+    
+    @staticmethod
+    def _video_search(ddgs, query: str, params: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Esegue una ricerca di video."""
+        return itertools.islice(ddgs.videos(
+            query,
+            region=params["region"],
+            safesearch=params["safesearch"],
+            timelimit=params["timelimit"],
+            max_results=params["max_results"]
+        ), params["max_results"])
+    
+    def search_cli(self, command: Union[str, List[str]]) -> str:
         """
         Esegue una ricerca tramite la CLI di duckduckgo_search.
         
         Args:
-            command: Comando da eseguire (es. "ddgs text -k 'query'")
+            command: Argomenti del comando come lista (es. ["text", "-k", "query"])
+                     oppure come stringa (es. "ddgs text -k 'query'")
             
         Returns:
             str: Output del comando
@@ -295,17 +422,24 @@ class DuckDuckGoSearchPlugin(BasePlugin):
         Raises:
             PluginException: Se si verifica un errore durante l'esecuzione del comando
         """
+        # Import locali: servono solo per la CLI
+        import shlex
+        import subprocess
+        
         try:
-            # Verifica che il comando inizi con "ddgs"
-            if not command.startswith("ddgs "):
-                command = "ddgs " + command
+            # Compatibilità con i comandi in formato stringa, senza passare dalla shell
+            args = shlex.split(command) if isinstance(command, str) else list(command)
+            
+            # Rimuovi il nome dell'eseguibile se presente
+            if args and args[0] == "ddgs":
+                args = args[1:]
             
             # Esegui il comando
             result = subprocess.run(
-                command,
-                shell=True,
+                [self._ddgs_bin or "ddgs", *args],
                 capture_output=True,
-                text=True
+                text=True,
+                check=False
             )
             
             if result.returncode != 0:
@@ -314,7 +448,7 @@ class DuckDuckGoSearchPlugin(BasePlugin):
             return result.stdout
             
         except Exception as e:
-            logger.error(f"Errore durante l'esecuzione del comando CLI: {str(e)}")
+            logger.error("Errore durante l'esecuzione del comando CLI: %s", e)
             raise PluginException(f"Errore durante l'esecuzione del comando CLI: {str(e)}")
 
 
@@ -328,6 +462,9 @@ class PluginManager:
     permettendo di utilizzare function calling attraverso Tool Use.
     """
     
+    # Plugin esterni già scoperti: percorso assoluto -> (firma dei file, {nome: classe})
+    _discovery_cache: Dict[str, tuple] = {}
+    
     def __init__(self, config: Optional[Dict[str, Any]] = None):
         """
         Inizializza il gestore dei plugin.
@@ -345,9 +482,19 @@ class PluginManager:
         # Dizionario per memorizzare le classi dei plugin
         self.plugin_classes = {}
         
-        # Dizionario per memorizzare i tool di Claude
+        # Lock per nome, per evitare attivazioni concorrenti dello stesso plugin
+        self._activation_locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+        self._async_activation_locks: Dict[str, asyncio.Lock] = {}
+        
+        # Tool di Claude dei plugin attivi: nome -> {"schema": dict, "json": bytes}
         self.claude_tools = {}
         
+        # Cache LRU dei risultati di ricerca: (query, tipo, max_results) -> (timestamp, risultati)
+        # (protetta da un lock: search_internet_async la usa da thread di lavoro)
+        self._search_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._search_cache_lock = threading.Lock()
+        self.search_cache_ttl = self.config.get("search_ttl", SEARCH_CACHE_TTL_SECONDS)
+        
         # Configurazione per Tool Use di Claude
         self.tool_use_config = {
             "disable_parallel_tool_use": self.config.get("disable_parallel_tool_use", False),
@@ -363,16 +510,16 @@ class PluginManager:
         # Inizializza i plugin abilitati
         self._initialize_enabled_plugins()
         
-        logger.info(f"PluginManager inizializzato con {len(self.plugins)} plugin.")
+        logger.info("PluginManager inizializzato con %s plugin.", len(self.plugins))
     
     def _load_builtin_plugins(self):
         """
         Carica i plugin integrati direttamente nel codice.
         """
         # Registra il plugin DuckDuckGo Search
-        self.plugin_classes["duckduckgo_search"] = DuckDuckGoSearchPlugin
+        self.plugin_classes[sys.intern("duckduckgo_search")] = DuckDuckGoSearchPlugin
         
-        logger.info(f"Caricati {len(self.plugin_classes)} plugin integrati.")
+        logger.info("Caricati %s plugin integrati.", len(self.plugin_classes))
     
     def _load_external_plugins(self):
         """
@@ -381,43 +528,98 @@ class PluginManager:
         plugins_path = Path(self.plugins_dir)
         
         # Controlla se la directory dei plugin esiste
-        if not plugins_path.exists() or not plugins_path.is_dir():
-            logger.warning(f"La directory dei plugin '{self.plugins_dir}' non esiste.")
+        if not plugins_path.is_dir():
+            logger.warning("La directory dei plugin '%s' non esiste.", self.plugins_dir)
+            return
+        
+        # Se nessun file è stato aggiunto, rimosso o modificato, riusa le classi già scoperte
+        # (l'mtime della directory non cambia quando un file viene modificato sul posto)
+        cache_key = str(plugins_path.resolve())
+        with os.scandir(plugins_path) as entries:
+            dir_signature = frozenset(
+                (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size) for entry in entries
+            )
+        cached = PluginManager._discovery_cache.get(cache_key)
+        if cached is not None and cached[0] == dir_signature:
+            self.plugin_classes.update(cached[1])
+            logger.info("Plugin esterni caricati dalla cache: %s", len(cached[1]))
             return
         
-        # Aggiungi la directory dei plugin al path di Python
-        sys.path.insert(0, str(plugins_path))
+        discovered = {}
+        
+        # Import locale: serve solo per la scoperta dei plugin esterni
+        import pkgutil
+        
+        self._register_plugin_package(plugins_path)
         
         # Cerca i moduli nella directory dei plugin
         for finder, name, ispkg in pkgutil.iter_modules([str(plugins_path)]):
             try:
-                # Importa il modulo
-                module = importlib.import_module(name)
+                # Importa il modulo nel pacchetto dei plugin: un file chiamato come un modulo
+                # esistente (es. "json") non lo sostituisce in sys.modules, e i moduli vicini
+                # sono importabili con "from . import helper" o "import bot_plugins.helper"
+                module = importlib.import_module(f"{PLUGIN_PACKAGE}.{name}")
+                
+                # Il modulo può dichiarare esplicitamente le sue classi in __plugins__
+                namespace = vars(module)
+                declared = namespace.get("__plugins__")
+                if declared is not None:
+                    candidates = [namespace[class_name] for class_name in declared]
+                else:
+                    # Solo le classi definite nel modulo, ignorando quelle importate
+                    candidates = [
+                        attr for attr in namespace.values()
+                        if isinstance(attr, type) and attr.__module__ == module.__name__
+                    ]
                 
                 # Cerca le classi che ereditano da BasePlugin
-                for attr_name in dir(module):
-                    attr = getattr(module, attr_name)
-                    
-                    if (inspect.isclass(attr) and 
-                        issubclass(attr, BasePlugin) and 
-                        attr is not BasePlugin):
-                        
+                for attr in candidates:
+                    if issubclass(attr, BasePlugin) and attr is not BasePlugin:
                         # Registra la classe del plugin
-                        self.plugin_classes[name] = attr
-                        logger.info(f"Plugin esterno '{name}' caricato: {attr.__name__}")
+                        discovered[sys.intern(name)] = attr
+                        logger.info("Plugin esterno '%s' caricato: %s", name, attr.__name__)
             
             except Exception as e:
-                logger.error(f"Errore durante il caricamento del plugin '{name}': {str(e)}")
+                logger.error("Errore durante il caricamento del plugin '%s': %s", name, e)
         
-        # Rimuovi la directory dei plugin dal path di Python
-        sys.path.pop(0)
+        self.plugin_classes.update(discovered)
+        PluginManager._discovery_cache[cache_key] = (dir_signature, discovered)
+    
+    @staticmethod
+    def _register_plugin_package(plugins_path: Path):
+        """
+        Registra in sys.modules il pacchetto dei plugin esterni, con la directory come percorso.
+        
+        I moduli importati da una scansione precedente vengono scartati, così i file
+        modificati vengono rieseguiti.
+        
+        Args:
+            plugins_path: Directory dei plugin esterni
+        """
+        prefix = PLUGIN_PACKAGE + "."
+        for module_name in [key for key in sys.modules if key.startswith(prefix)]:
+            del sys.modules[module_name]
+        
+        package = sys.modules.get(PLUGIN_PACKAGE)
+        if package is None:
+            spec = importlib.machinery.ModuleSpec(PLUGIN_PACKAGE, None, is_package=True)
+            package = importlib.util.module_from_spec(spec)
+            sys.modules[PLUGIN_PACKAGE] = package
+        package.__path__ = [str(plugins_path)]
+        importlib.invalidate_caches()
     
     def _initialize_enabled_plugins(self):
         """
         Inizializza tutti i plugin abilitati.
         """
+        plugin_classes = self.plugin_classes
+        missing = [name for name in self.enabled_plugins if name not in plugin_classes]
+        if missing:
+            logger.info("Ignorati %d plugin non disponibili: %s", len(missing), missing)
+        
         for plugin_name in self.enabled_plugins:
-            self.activate_plugin(plugin_name)
+            if plugin_name in plugin_classes:
+                self.activate_plugin(plugin_name)
     
     def activate_plugin(self, plugin_name: str, config: Dict[str, Any] = None) -> bool:
         """
@@ -430,14 +632,54 @@ class PluginManager:
         Returns:
             bool: True se l'attivazione è riuscita, False altrimenti
         """
+        plugin_name = sys.intern(plugin_name)
+        
         # Controlla se il plugin è già attivo
         if plugin_name in self.plugins:
-            logger.info(f"Il plugin '{plugin_name}' è già attivo.")
+            logger.info("Il plugin '%s' è già attivo.", plugin_name)
             return True
         
+        # Una sola attivazione per nome: le chiamate concorrenti attendono e trovano il plugin attivo
+        with self._activation_locks[plugin_name]:
+            if plugin_name in self.plugins:
+                return True
+            return self._activate_plugin_locked(plugin_name, config)
+    
+    async def activate_plugin_async(self, plugin_name: str, config: Dict[str, Any] = None) -> bool:
+        """
+        Attiva un plugin senza bloccare il loop di eventi.
+        
+        Args:
+            plugin_name: Nome del plugin da attivare
+            config: Configurazione specifica per il plugin (opzionale)
+            
+        Returns:
+            bool: True se l'attivazione è riuscita, False altrimenti
+        """
+        plugin_name = sys.intern(plugin_name)
+        if plugin_name in self.plugins:
+            return True
+        
+        lock = self._async_activation_locks.setdefault(plugin_name, asyncio.Lock())
+        async with lock:
+            if plugin_name in self.plugins:
+                return True
+            return await asyncio.to_thread(self.activate_plugin, plugin_name, config)
+    
+    def _activate_plugin_locked(self, plugin_name: str, config: Dict[str, Any] = None) -> bool:
+        """
+        Crea e inizializza un plugin; va chiamato tenendo il lock di attivazione del plugin.
+        
+        Args:
+            plugin_name: Nome del plugin da attivare
+            config: Configurazione specifica per il plugin (opzionale)
+            
+        Returns:
+            bool: True se l'attivazione è riuscita, False altrimenti
+        """
         # Controlla se la classe del plugin è stata caricata
         if plugin_name not in self.plugin_classes:
-            logger.warning(f"Il plugin '{plugin_name}' non è stato trovato.")
+            logger.warning("Il plugin '%s' non è stato trovato.", plugin_name)
             return False
         
         try:
@@ -449,22 +691,38 @@ class PluginManager:
             success = plugin.initialize()
             
             if success:
-                # Registra il plugin
+                # Registra il plugin e il relativo tool per Claude
                 self.plugins[plugin_name] = plugin
-                logger.info(f"Plugin '{plugin_name}' attivato con successo.")
+                self.claude_tools[plugin_name] = self._build_tool_schema(plugin_name, plugin)
+                logger.info("Plugin '%s' attivato con successo.", plugin_name)
                 return True
             else:
-                logger.warning(f"Inizializzazione del plugin '{plugin_name}' fallita.")
+                logger.warning("Inizializzazione del plugin '%s' fallita.", plugin_name)
                 return False
                 
         except Exception as e:
-            logger.error(f"Errore durante l'attivazione del plugin '{plugin_name}': {str(e)}")
+            logger.error("Errore durante l'attivazione del plugin '%s': %s", plugin_name, e)
             return False
     
     def deactivate_plugin(self, plugin_name: str) -> bool:
         """
         Disattiva un plugin specifico.
         
+        Args:
+            plugin_name: Nome del plugin da disattivare
+            
+        Returns:
+            bool: True se la disattivazione è riuscita, False altrimenti
+        """
+        plugin_name = sys.intern(plugin_name)
+        
+        with self._activation_locks[plugin_name]:
+            return self._deactivate_plugin_locked(plugin_name)
+    
+    def _deactivate_plugin_locked(self, plugin_name: str) -> bool:
+        """
+        Disattiva un plugin; va chiamato tenendo il lock di attivazione del plugin.
+        
         Args:
             plugin_name: Nome del plugin da disattivare
             
@@ -473,7 +731,7 @@ class PluginManager:
         """
         # Controlla se il plugin è attivo
         if plugin_name not in self.plugins:
-            logger.warning(f"Il plugin '{plugin_name}' non è attivo.")
+            logger.warning("Il plugin '%s' non è attivo.", plugin_name)
             return False
         
         try:
@@ -486,16 +744,80 @@ class PluginManager:
             if success:
                 # Rimuovi il plugin dalla lista dei plugin attivi
                 del self.plugins[plugin_name]
-                logger.info(f"Plugin '{plugin_name}' disattivato con successo.")
+                self.claude_tools.pop(plugin_name, None)
+                
+                # I risultati memorizzati non sono più validi senza il plugin di ricerca
+                if plugin_name == "duckduckgo_search":
+                    with self._search_cache_lock:
+                        self._search_cache.clear()
+                logger.info("Plugin '%s' disattivato con successo.", plugin_name)
                 return True
             else:
-                logger.warning(f"Disattivazione del plugin '{plugin_name}' fallita.")
+                logger.warning("Disattivazione del plugin '%s' fallita.", plugin_name)
                 return False
                 
         except Exception as e:
-            logger.error(f"Errore durante la disattivazione del plugin '{plugin_name}': {str(e)}")
+            logger.error("Errore durante la disattivazione del plugin '%s': %s", plugin_name, e)
             return False
     
+    def _build_tool_schema(self, plugin_name: str, plugin: BasePlugin) -> Dict[str, Any]:
+        """
+        Costruisce una volta sola lo schema del tool di Claude per un plugin attivo.
+        
+        Args:
+            plugin_name: Nome con cui il plugin è registrato
+            plugin: Istanza del plugin
+            
+        Returns:
+            Dict[str, Any]: Schema del tool e la sua serializzazione JSON
+        """
+        capabilities = list(plugin.get_capabilities())
+        schema = {
+            "name": plugin_name,
+            "description": plugin.description,
+            "input_schema": {
+                "type": "object",
+                "properties": {
+                    "action": {
+                        "type": "string",
+                        "enum": capabilities,
+                        "description": "Azione da eseguire"
+                    },
+                    "params": {
+                        "type": "object",
+                        "description": "Parametri dell'azione (es. query, max_results)"
+                    }
+                },
+                "required": ["action"]
+            }
+        }
+        
+        # Serializzazione compatta, calcolata una volta e riusata a ogni richiesta
+        if orjson is not None:
+            serialized = orjson.dumps(schema)
+        else:
+            serialized = json.dumps(schema, separators=(",", ":")).encode("utf-8")
+        
+        return {"schema": schema, "json": serialized}
+    
+    def get_claude_tools(self) -> List[Dict[str, Any]]:
+        """
+        Ottiene gli schemi dei tool di Claude per i plugin attivi.
+        
+        Returns:
+            List[Dict[str, Any]]: Schemi dei tool
+        """
+        return [tool["schema"] for tool in self.claude_tools.values()]
+    
+    def get_claude_tools_payload(self) -> bytes:
+        """
+        Ottiene l'array JSON dei tool di Claude già serializzato.
+        
+        Returns:
+            bytes: Array JSON degli schemi dei tool
+        """
+        return b"[" + b",".join(tool["json"] for tool in self.claude_tools.values()) + b"]"
+    
     def get_plugin(self, plugin_name: str) -> Optional[BasePlugin]:
         """
         Ottiene un'istanza di un plugin attivo.
@@ -506,7 +828,7 @@ class PluginManager:
         Returns:
             Optional[BasePlugin]: Istanza del plugin o None se non trovato
         """
-        return self.plugins.get(plugin_name)
+        return self.plugins.get(sys.intern(plugin_name))
     
     def execute_plugin_action(self, plugin_name: str, action: str, params: Dict[str, Any] = None) -> Any:
         """
@@ -551,7 +873,7 @@ class PluginManager:
         """
         return list(self.plugin_classes.keys())
     
-    def get_plugin_info(self, plugin_name: str) -> Optional[Dict[str, Any]]:
+    def get_plugin_info(self, plugin_name: str) -> Optional[Mapping[str, Any]]:
         """
         Ottiene informazioni su un plugin specifico.
         
@@ -559,7 +881,7 @@ class PluginManager:
             plugin_name: Nome del plugin
             
         Returns:
-            Optional[Dict[str, Any]]: Informazioni sul plugin o None se non trovato
+            Optional[Mapping[str, Any]]: Informazioni sul plugin o None se non trovato
         """
         plugin = self.get_plugin(plugin_name)
         return plugin.get_info() if plugin else None
@@ -580,28 +902,85 @@ class PluginManager:
             PluginException: Se si verifica un errore durante la ricerca
         """
         try:
-            # Controlla se il plugin DuckDuckGo è attivo
-            if "duckduckgo_search" not in self.plugins:
-                # Prova ad attivare il plugin
-                success = self.activate_plugin("duckduckgo_search")
-                if not success:
-                    raise PluginException("Il plugin DuckDuckGo Search non è disponibile.")
-            
-            # Esegui la ricerca
-            results = self.execute_plugin_action(
+            results = self._cached_search(query, search_type, max_results)
+            
+            # Restituisci copie, così il chiamante non modifica i risultati in cache
+            return [dict(result) if isinstance(result, dict) else result for result in results]
+            
+        except Exception as e:
+            logger.error("Errore durante la ricerca su internet: %s", e)
+            raise PluginException(f"Errore durante la ricerca su internet: {str(e)}")
+    
+    async def search_internet_async(self, query: str, search_type: str = "text_search", max_results: int = 5) -> List[Dict[str, Any]]:
+        """
+        Esegue search_internet in un thread separato, senza bloccare il loop di eventi del bot.
+        
+        Args:
+            query: Query di ricerca
+            search_type: Tipo di ricerca ('text_search', 'image_search', 'news_search', 'video_search')
+            max_results: Numero massimo di risultati
+            
+        Returns:
+            List[Dict[str, Any]]: Risultati della ricerca
+            
+        Raises:
+            PluginException: Se si verifica un errore durante la ricerca
+        """
+        return await asyncio.to_thread(self.search_internet, query, search_type, max_results)
+    
+    def _cached_search(self, query: str, search_type: str, max_results: int) -> tuple:
+        """
+        Esegue la ricerca su DuckDuckGo memorizzando i risultati in una cache LRU con scadenza.
+        
+        Args:
+            query: Query di ricerca
+            search_type: Tipo di ricerca
+            max_results: Numero massimo di risultati
+            
+        Returns:
+            tuple: Risultati della ricerca
+        """
+        key = (query, search_type, max_results)
+        now = time.monotonic()
+        
+        with self._search_cache_lock:
+            cached = self._search_cache.get(key)
+            if cached is not None:
+                timestamp, results = cached
+                if now - timestamp < self.search_cache_ttl:
+                    self._search_cache.move_to_end(key)
+                    return results
+                self._search_cache.pop(key, None)
+        
+        # Controlla se il plugin DuckDuckGo è attivo
+        if "duckduckgo_search" not in self.plugins:
+            # Prova ad attivare il plugin
+            success = self.activate_plugin("duckduckgo_search")
+            if not success:
+                raise PluginException("Il plugin DuckDuckGo Search non è disponibile.")
+        
+        # Esegui la ricerca (percorso diretto per la ricerca testuale, il caso più frequente;
+        # un plugin esterno con lo stesso nome passa dal percorso generico)
+        plugin = self.plugins.get("duckduckgo_search")
+        if search_type == "text_search" and isinstance(plugin, DuckDuckGoSearchPlugin):
+            results = tuple(plugin.text_search(query, max_results))
+        else:
+            results = tuple(self.execute_plugin_action(
                 "duckduckgo_search",
                 search_type,
                 {
                     "query": query,
                     "max_results": max_results
                 }
-            )
-            
-            return results
-            
-        except Exception as e:
-            logger.error(f"Errore durante la ricerca su internet: {str(e)}")
-            raise PluginException(f"Errore durante la ricerca su internet: {str(e)}")
+            ) or ())
+        
+        with self._search_cache_lock:
+            self._search_cache[key] = (now, results)
+            self._search_cache.move_to_end(key)
+            if len(self._search_cache) > SEARCH_CACHE_SIZE:
+                self._search_cache.popitem(last=False)
+        
+        return results
     
     def install_plugin(self, plugin_package: str) -> bool:
         """
@@ -613,15 +992,17 @@ class PluginManager:
         Returns:
             bool: True se l'installazione è riuscita, False altrimenti
         """
+        import subprocess
+        
         try:
             # Installa il pacchetto
             subprocess.check_call([sys.executable, "-m", "pip", "install", plugin_package])
             
-            logger.info(f"Plugin '{plugin_package}' installato con successo.")
+            logger.info("Plugin '%s' installato con successo.", plugin_package)
             return True
             
         except Exception as e:
-            logger.error(f"Errore durante l'installazione del plugin '{plugin_package}': {str(e)}")
+            logger.error("Errore durante l'installazione del plugin '%s': %s", plugin_package, e)
             return False
     
     def save_plugin_configuration(self) -> bool:
@@ -642,15 +1023,41 @@ class PluginManager:
             for plugin_name, plugin in self.plugins.items():
                 config["plugin_configs"][plugin_name] = plugin.config
             
-            # Salva la configurazione in un file JSON
-            with open(PLUGIN_CONFIG_FILE, "w", encoding="utf-8") as f:
-                json.dump(config, f, indent=4)
+            # Scrivi su un file temporaneo e sostituisci atomicamente quello esistente
+            import tempfile
+            config_dir = os.path.dirname(PLUGIN_CONFIG_FILE) or "."
             
-            logger.info(f"Configurazione dei plugin salvata in '{PLUGIN_CONFIG_FILE}'.")
+            # NamedTemporaryFile crea il file con permessi 0600: conserva quelli del file
+            # esistente, o quelli predefiniti per un nuovo file (0666 meno la umask)
+            try:
+                mode = os.stat(PLUGIN_CONFIG_FILE).st_mode & 0o7777
+            except FileNotFoundError:
+                umask = os.umask(0)
+                os.umask(umask)
+                mode = 0o666 & ~umask
+            
+            tmp_file = tempfile.NamedTemporaryFile("wb", dir=config_dir, delete=False)
+            tmp_path = tmp_file.name
+            try:
+                with tmp_file as f:
+                    f.write(_dump_json(config))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.chmod(tmp_path, mode)
+                os.replace(tmp_path, PLUGIN_CONFIG_FILE)
+            except Exception:
+                # Non lasciare il file temporaneo se la scrittura o la sostituzione falliscono
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+                raise
+            
+            logger.info("Configurazione dei plugin salvata in '%s'.", PLUGIN_CONFIG_FILE)
             return True
             
         except Exception as e:
-            logger.error(f"Errore durante il salvataggio della configurazione dei plugin: {str(e)}")
+            logger.error("Errore durante il salvataggio della configurazione dei plugin: %s", e)
             return False
     
     def load_plugin_configuration(self) -> bool:
@@ -663,12 +1070,11 @@ class PluginManager:
         try:
             # Controlla se il file di configurazione esiste
             if not os.path.exists(PLUGIN_CONFIG_FILE):
-                logger.warning(f"Il file di configurazione '{PLUGIN_CONFIG_FILE}' non esiste.")
+                logger.warning("Il file di configurazione '%s' non esiste.", PLUGIN_CONFIG_FILE)
                 return False
             
             # Carica la configurazione dal file JSON
-            with open(PLUGIN_CONFIG_FILE, "r", encoding="utf-8") as f:
-                config = json.load(f)
+            config = _load_json(Path(PLUGIN_CONFIG_FILE).read_bytes())
             
             # Aggiorna la lista dei plugin abilitati
             self.enabled_plugins = config.get("enabled_plugins", DEFAULT_PLUGINS)
@@ -683,16 +1089,43 @@ class PluginManager:
                 plugin_config = plugin_configs.get(plugin_name, {})
                 self.activate_plugin(plugin_name, plugin_config)
             
-            logger.info(f"Configurazione dei plugin caricata da '{PLUGIN_CONFIG_FILE}'.")
+            logger.info("Configurazione dei plugin caricata da '%s'.", PLUGIN_CONFIG_FILE)
             return True
             
         except Exception as e:
-            logger.error(f"Errore durante il caricamento della configurazione dei plugin: {str(e)}")
+            logger.error("Errore durante il caricamento della configurazione dei plugin: %s", e)
             return False
 
 
 # Funzioni di utilità
 
+# Istanza condivisa del plugin manager usata dalle funzioni di utilità
+_DEFAULT_MANAGER: Optional[PluginManager] = None
+_DEFAULT_MANAGER_LOCK = threading.Lock()
+
+
+def _get_default_manager() -> PluginManager:
+    """
+    Restituisce il plugin manager condiviso, creandolo al primo utilizzo.
+    
+    Returns:
+        PluginManager: Istanza condivisa del plugin manager
+    """
+    global _DEFAULT_MANAGER
+    if _DEFAULT_MANAGER is None:
+        with _DEFAULT_MANAGER_LOCK:
+            if _DEFAULT_MANAGER is None:
+                _DEFAULT_MANAGER = PluginManager()
+    return _DEFAULT_MANAGER
+
+
+def reset_default_manager():
+    """Elimina il plugin manager condiviso, che verrà ricreato alla prossima richiesta."""
+    global _DEFAULT_MANAGER
+    with _DEFAULT_MANAGER_LOCK:
+        _DEFAULT_MANAGER = None
+
+
 def get_duckduckgo_search_results(query: str, max_results: int = 5) -> List[Dict[str, Any]]:
     """
     Funzione di utilità per ottenere risultati di ricerca da DuckDuckGo.
@@ -705,22 +1138,25 @@ def get_duckduckgo_search_results(query: str, max_results: int = 5) -> List[Dict
         List[Dict[str, Any]]: Risultati della ricerca
     """
     try:
-        # Crea un'istanza temporanea del plugin manager
-        plugin_manager = PluginManager()
-        
-        # Esegui la ricerca
-        results = plugin_manager.search_internet(query, "text_search", max_results)
+        # Esegui la ricerca con il plugin manager condiviso
+        results = _get_default_manager().search_internet(query, "text_search", max_results)
         
         return results
         
     except Exception as e:
-        logger.error(f"Errore durante la ricerca su DuckDuckGo: {str(e)}")
+        logger.error("Errore durante la ricerca su DuckDuckGo: %s", e)
         return []
 
 
 if __name__ == "__main__":
     """Test di base del modulo."""
     
+    # Configurazione logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
     async def run_test():
         try:
             print("Inizializzazione del PluginManager...")
@@ -763,5 +1199,4 @@ if __name__ == "__main__":
             print(f"Errore durante il test: {str(e)}")
     
     # Esegui il test
-    import asyncio
     asyncio.run(run_test())
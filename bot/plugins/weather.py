@@ -73,7 +73,7 @@ class WeatherPlugin(Plugin):
             response = requests.get(url).json()
             results = {}
             for i, time in enumerate(response["daily"]["time"]):
-                results[datetime.strptime(time, "%Y-%m-%d").strftime("%A, %B %d, %Y")] = {
+                results[datetime.fromisoformat(time).strftime("%A, %B %d, %Y")] = {
                     "weathercode": response["daily"]["weathercode"][i],
                     "temperature_2m_max": response["daily"]["temperature_2m_max"][i],
                     "temperature_2m_min": response["daily"]["temperature_2m_min"][i],
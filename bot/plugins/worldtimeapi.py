@@ -41,7 +41,7 @@ class WorldTimeApiPlugin(Plugin):
 
         try:
             wtr = requests.get(url).json().get('datetime')
-            wtr_obj = datetime.strptime(wtr, "%Y-%m-%dT%H:%M:%S.%f%z")
+            wtr_obj = datetime.fromisoformat(wtr)
             time_24hr = wtr_obj.strftime("%H:%M:%S")
             time_12hr = wtr_obj.strftime("%I:%M:%S %p")
             return {"24hr": time_24hr, "12hr": time_12hr}
@@ -6,6 +6,9 @@ from pytube import YouTube
 
 from .plugin import Plugin
 
+# Characters not allowed in the downloaded file name
+UNSAFE_FILENAME_CHARS = re.compile(r'[^\w\-_\. ]')
+
 
 class YouTubeAudioExtractorPlugin(Plugin):
     """
@@ -33,7 +36,7 @@ class YouTubeAudioExtractorPlugin(Plugin):
         try:
             video = YouTube(link)
             audio = video.streams.filter(only_audio=True, file_extension='mp4').first()
-            output = re.sub(r'[^\w\-_\. ]', '_', video.title) + '.mp3'
+            output = UNSAFE_FILENAME_CHARS.sub('_', video.title) + '.mp3'
             audio.download(filename=output)
             return {
                 'direct_result': {
@@ -15,34 +15,34 @@ import logging
 import asyncio
 import datetime
 import tempfile
-from io import BytesIO
-from typing import Dict, List, Optional, Union, Any, Tuple, Callable, Set, BinaryIO
+import weakref
+from typing import Dict, List, Optional, Union, Any, Tuple, Callable, Set, BinaryIO, Iterator
+from collections import OrderedDict, defaultdict, deque
 from contextlib import asynccontextmanager
 from uuid import uuid4
 from pathlib import Path
 from functools import wraps
+from itertools import islice
 
 from telegram import (
     Update, Bot, Message, Chat, User, ChatMember, InlineKeyboardButton, 
-    InlineKeyboardMarkup, BotCommand, ChatAction, ParseMode, InputMediaPhoto,
+    InlineKeyboardMarkup, BotCommand, InputMediaPhoto,
     PhotoSize, Voice, Audio, Document, ReplyKeyboardMarkup, KeyboardButton,
     ReplyKeyboardRemove
 )
 from telegram.ext import (
     Application, ApplicationBuilder, CommandHandler, MessageHandler, 
     CallbackQueryHandler, ConversationHandler, ContextTypes, CallbackContext,
-    filters, AIORateLimiter
+    filters, AIORateLimiter, PicklePersistence
 )
-from telegram.constants import ParseMode
+from telegram.constants import ParseMode, ChatAction
+from telegram.error import BadRequest, TelegramError
+from aiolimiter import AsyncLimiter
 
 from anthropic_helper import AnthropicHelper, ClaudeException
 from data_manager import DataManager
 
-# Configurazione logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Logger del modulo: la configurazione è lasciata all'applicazione
 logger = logging.getLogger(__name__)
 
 # Stati per la conversazione
@@ -116,13 +116,320 @@ DATE_FORMAT = "%Y-%m-%d"
 DISPLAY_DATE_FORMAT = "%d/%m/%Y"
 TIME_FORMAT = "%H:%M"
 
+# Parser delle date salvate nel database (formato DATE_FORMAT), implementato in C
+_parse_date = datetime.date.fromisoformat
+
+# Date inserite dall'utente: giorno/mese/anno oppure anno-mese-giorno, con "/" o "-"
+_USER_DATE_RE = re.compile(r"^\s*(\d{1,4})[-/](\d{1,2})[-/](\d{1,4})\s*$")
+
+# Virgola decimale (es. "2,5") convertita in punto per float()
+_DECIMAL_COMMA_TRANS = str.maketrans(",", ".")
+
+# Tipi di pasto nell'ordine di visualizzazione, con il relativo titolo
+_MEAL_TYPE_TITLES = {
+    "colazione": "🌅 *Colazione*",
+    "pranzo": "☀️ *Pranzo*",
+    "cena": "🌙 *Cena*",
+    "spuntino": "🍎 *Spuntino*"
+}
+
 # Limiti di caratteri per messaggi Telegram
 MAX_MESSAGE_LENGTH = 4096
 
+# Tempo massimo di attesa per una risposta di Claude (secondi)
+CLAUDE_TIMEOUT_SECONDS = 120
+
+# Intervallo tra due invii dell'azione "sta scrivendo" (Telegram la mostra per ~5 secondi;
+# il margine residuo copre la latenza della richiesta successiva)
+CHAT_ACTION_INTERVAL_SECONDS = 4.5
+
+# Intervallo minimo tra due aggiornamenti di una risposta in streaming (secondi)
+STREAM_EDIT_INTERVAL_SECONDS = 1.0
+
+# Numero massimo di stati utente conservati e di messaggi nella cronologia di ciascuno
+MAX_USER_STATES = 10000
+MAX_CONVERSATION_HISTORY = 10
+
+# Numero massimo di tastiere della lista dei piani alimentari tenute in cache
+PLAN_KEYBOARD_CACHE_SIZE = 1024
+
+# Messaggi al secondo concessi a un broadcast: resta sotto il limite globale di 30/s
+# imposto dall'AIORateLimiter, lasciando margine alle risposte interattive
+BROADCAST_MAX_RATE = 20
+
+# Testi dei pulsanti della tastiera principale
+BUTTON_INVENTORY = "🍎 Inventario"
+BUTTON_MEAL_PLANS = "🍽️ Piani Alimentari"
+BUTTON_SHOPPING = "🛒 Lista Spesa"
+BUTTON_HEALTH = "❤️ Salute"
+BUTTON_HELP = "❓ Aiuto"
+BUTTON_SETTINGS = "⚙️ Impostazioni"
+
+# Richieste testuali che nominano solo una sezione del bot (es. "lista della spesa"),
+# instradate al pulsante corrispondente senza interpellare Claude. Le espressioni
+# devono coprire l'intero messaggio: una frase più articolata resta a Claude.
+_MENU_KEYWORD_PATTERNS = [
+    (re.compile(r"(?:mostra |apri )?(?:l'|il mio |la mia )?(?:inventario|dispensa|frigo(?:rifero)?)", re.IGNORECASE),
+     BUTTON_INVENTORY),
+    (re.compile(r"(?:mostra |apri )?(?:i miei )?(?:pian[oi](?: alimentar[ei])?|pasti)", re.IGNORECASE),
+     BUTTON_MEAL_PLANS),
+    (re.compile(r"(?:mostra |apri )?(?:la mia )?(?:lista(?: della| per la)? )?spesa", re.IGNORECASE),
+     BUTTON_SHOPPING),
+    (re.compile(r"(?:mostra |apri )?(?:la mia |il mio )?(?:salute|profilo (?:di )?salute|integratori)", re.IGNORECASE),
+     BUTTON_HEALTH),
+    (re.compile(r"aiuto|help|comandi", re.IGNORECASE), BUTTON_HELP),
+    (re.compile(r"impostazioni|settings", re.IGNORECASE), BUTTON_SETTINGS),
+]
+
+# Conferma dell'aggiunta di un alimento, seguita dalla richiesta dell'azione successiva
+FOOD_ADDED_TEMPLATE = (
+    "✅ Elemento aggiunto all'inventario:\n\n"
+    "- {name} ({category})\n"
+    "- Quantità: {quantity} {unit}\n"
+    "- Scadenza: {expiry}\n\n"
+    "Cosa vuoi fare ora?"
+)
+
+# Parte fissa del prompt di sistema per Claude, a cui si aggiungono le informazioni sanitarie dell'utente
+BASE_SYSTEM_PROMPT = (
+    "Sei Claude, un assistente personale specializzato in nutrizione, piani alimentari e salute. "
+    "Aiuti l'utente a gestire il proprio inventario alimentare, creare piani alimentari, "
+    "generare liste della spesa e monitorare la propria salute."
+)
+
+# Richiesta della data di scadenza e risposta a una data non valida
+EXPIRY_PROMPT_TEXT = "📅 Inserisci la data di scadenza nel formato GG/MM/AAAA o seleziona un'opzione:"
+INVALID_DATE_TEXT = "❌ Formato data non valido. Inserisci la data nel formato GG/MM/AAAA:"
+
+# Mostrato al posto di una risposta vuota di Claude
+EMPTY_RESPONSE_TEXT = "🤷 Claude non ha fornito una risposta. Prova a riformulare la domanda."
+
+# Testi statici dei messaggi di benvenuto, guida e menu
+WELCOME_TEXT = (
+    "👋 Benvenuto nell'Assistente Personale Claude!\n\n"
+    "Sono qui per aiutarti a gestire:\n"
+    "🍎 Inventario alimentare\n"
+    "🍽️ Piani alimentari\n"
+    "🛒 Liste della spesa\n"
+    "❤️ Monitoraggio sanitario\n\n"
+    "Usa /menu per accedere alle funzionalità o chiedimi direttamente ciò di cui hai bisogno."
+)
+
+HELP_TEXT = (
+    "🤖 *Guida all'Assistente Personale Claude*\n\n"
+    "*Comandi principali:*\n"
+    "/start - Avvia il bot\n"
+    "/menu - Mostra il menu principale\n"
+    "/help - Mostra questa guida\n"
+    "/settings - Gestisci le tue impostazioni\n"
+    "/reset - Resetta la conversazione corrente\n"
+    "/cancel - Annulla l'operazione corrente\n\n"
+
+    "*Funzionalità disponibili:*\n\n"
+
+    "*🍎 Inventario Alimentare*\n"
+    "- Aggiungi/rimuovi alimenti\n"
+    "- Traccia le scadenze\n"
+    "- Visualizza gli alimenti disponibili\n\n"
+
+    "*🍽️ Piani Alimentari*\n"
+    "- Crea piani settimanali/mensili\n"
+    "- Aggiungi pasti ai tuoi piani\n"
+    "- Consulta i pasti pianificati\n\n"
+
+    "*🛒 Lista della Spesa*\n"
+    "- Crea liste personalizzate\n"
+    "- Aggiungi articoli alla lista\n"
+    "- Genera liste in base all'inventario\n\n"
+
+    "*❤️ Monitoraggio Sanitario*\n"
+    "- Registra condizioni mediche\n"
+    "- Traccia l'assunzione di integratori\n"
+    "- Memorizza referti e restrizioni alimentari\n\n"
+
+    "*Utilizzo dell'intelligenza artificiale:*\n"
+    "Puoi chiedermi qualsiasi cosa riguardo a nutrizione, ricette, consigli alimentari in base alle tue condizioni, "
+    "e ti risponderò grazie all'AI di Claude. Puoi anche inviarmi foto di alimenti o ricevute per aiutarti "
+    "nell'aggiornamento dell'inventario o delle liste della spesa.\n\n"
+
+    "Per qualsiasi dubbio o assistenza, usa il comando /help o chiedi direttamente!"
+)
+
+INVENTORY_MENU_TEXT = (
+    "🍎 *Menu Inventario Alimentare*\n\n"
+    "Gestisci il tuo inventario di alimenti, tieni traccia delle scadenze "
+    "e monitora le quantità disponibili."
+)
+
+MEAL_PLAN_MENU_TEXT = (
+    "🍽️ *Menu Piani Alimentari*\n\n"
+    "Crea e gestisci i tuoi piani alimentari, visualizza i pasti programmati "
+    "e monitora il tuo apporto nutrizionale."
+)
+
+SHOPPING_MENU_TEXT = (
+    "🛒 *Menu Liste della Spesa*\n\n"
+    "Crea e gestisci le tue liste della spesa, aggiungi articoli "
+    "e tieni traccia degli acquisti."
+)
+
+HEALTH_MENU_TEXT = (
+    "❤️ *Menu Monitoraggio Sanitario*\n\n"
+    "Tieni traccia delle tue condizioni mediche, restrizioni alimentari, "
+    "integratori e referti per ricevere consigli personalizzati."
+)
+
+# Chiave sotto cui lo stato della conversazione è salvato in context.user_data
+USER_STATE_KEY = "state"
+
+
+def _parse_user_date(text: str) -> Optional[datetime.date]:
+    """
+    Analizza una data inserita dall'utente.
+    
+    Accetta sia il formato visualizzato (GG/MM/AAAA) sia quello del database
+    (AAAA-MM-GG); le forme esatte GG/MM/AAAA e AAAA-MM-GG vengono lette direttamente
+    per posizione, senza passare dall'espressione regolare.
+    
+    Args:
+        text: Testo inserito dall'utente
+        
+    Returns:
+        Optional[datetime.date]: Data analizzata o None se non valida
+    """
+    if (len(text) == 10 and text[2] == "/" and text[5] == "/"
+            and text[0:2].isdigit() and text[3:5].isdigit() and text[6:10].isdigit()):
+        day, month, year = text[0:2], text[3:5], text[6:10]
+    elif (len(text) == 10 and text[4] == "-" and text[7] == "-"
+            and text[0:4].isdigit() and text[5:7].isdigit() and text[8:10].isdigit()):
+        year, month, day = text[0:4], text[5:7], text[8:10]
+    else:
+        match = _USER_DATE_RE.match(text)
+        if not match:
+            return None
+        
+        first, month, last = match.groups()
+        if len(first) == 4:
+            year, day = first, last
+        elif len(last) == 4:
+            day, year = first, last
+        else:
+            return None
+    
+    try:
+        return datetime.date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+
+def _parse_quantity(text: str) -> float:
+    """
+    Analizza una quantità inserita dall'utente, accettando anche la virgola decimale.
+    
+    Il testo viene convertito solo se non è già un numero valido.
+    
+    Args:
+        text: Testo inserito dall'utente
+        
+    Returns:
+        float: Quantità analizzata
+        
+    Raises:
+        ValueError: Se il testo non è un numero
+    """
+    try:
+        return float(text)
+    except ValueError:
+        return float(text.translate(_DECIMAL_COMMA_TRANS))
+
+
+def _format_date(iso_date: str) -> str:
+    """
+    Converte una data del database (AAAA-MM-GG) nel formato visualizzato (GG/MM/AAAA).
+    
+    La conversione avviene per posizione, senza analizzare la data.
+    
+    Args:
+        iso_date: Data nel formato DATE_FORMAT (eventuali orari successivi sono ignorati)
+        
+    Returns:
+        str: Data nel formato DISPLAY_DATE_FORMAT
+    """
+    return f"{iso_date[8:10]}/{iso_date[5:7]}/{iso_date[0:4]}"
+
+
+def _format_expiry(expiry_date: Optional[str], today: datetime.date) -> str:
+    """
+    Formatta la scadenza di un alimento, evidenziando quelli scaduti o in scadenza entro 3 giorni.
+    
+    Args:
+        expiry_date: Data di scadenza nel formato DATE_FORMAT, o None se non scade
+        today: Data odierna
+        
+    Returns:
+        str: Scadenza da mostrare all'utente
+    """
+    if not expiry_date:
+        return "Non scade"
+    
+    expiry = _format_date(expiry_date)
+    days_to_expiry = (_parse_date(expiry_date) - today).days
+    
+    if days_to_expiry < 0:
+        return f"❌ {expiry} (scaduto)"
+    if days_to_expiry <= 3:
+        return f"⚠️ {expiry} (tra {days_to_expiry} giorni)"
+    return expiry
+
+
+def _split_message(text: str, limit: int = MAX_MESSAGE_LENGTH) -> Iterator[str]:
+    """
+    Divide un testo lungo in parti entro il limite di Telegram, in un solo passaggio.
+    
+    Le righe vengono accumulate finché la successiva non farebbe superare il limite,
+    così le parti terminano a fine riga e non spezzano la formattazione Markdown;
+    solo le righe più lunghe del limite vengono tagliate.
+    
+    Args:
+        text: Testo da dividere
+        limit: Lunghezza massima di ogni parte
+        
+    Yields:
+        str: Parti del testo, nell'ordine originale
+    """
+    buffer = []
+    length = 0
+    
+    for line in text.splitlines(keepends=True):
+        if length + len(line) > limit and buffer:
+            yield "".join(buffer)
+            buffer = []
+            length = 0
+        
+        while len(line) > limit:
+            yield line[:limit]
+            line = line[limit:]
+        
+        buffer.append(line)
+        length += len(line)
+    
+    if buffer:
+        yield "".join(buffer)
+
 
 class UserData:
     """Classe per gestire i dati temporanei dell'utente durante le conversazioni."""
     
+    # Attributi fissi: niente __dict__ per ogni utente e accesso diretto agli slot
+    __slots__ = (
+        "temp_food_item", "temp_meal_plan", "temp_meal",
+        "temp_shopping_list", "temp_shopping_item",
+        "temp_health_condition", "temp_dietary_restriction", "temp_supplement", "temp_health_report",
+        "current_page", "items_per_page",
+        "conversation_history", "last_interaction_time",
+        "current_context", "context_id"
+    )
+    
     def __init__(self):
         """Inizializza i dati dell'utente."""
         # Dati per l'aggiunta di alimenti
@@ -146,13 +453,51 @@ class UserData:
         self.current_page = {}
         self.items_per_page = 5
         
-        # Cronologia delle conversazioni per Claude
-        self.conversation_history = []
+        # Cronologia delle conversazioni per Claude: i messaggi più vecchi escono da soli
+        self.conversation_history = deque(maxlen=MAX_CONVERSATION_HISTORY)
         self.last_interaction_time = datetime.datetime.now()
         
         # Contesto corrente
         self.current_context = None
         self.context_id = None
+    
+    def clear_temp_data(self):
+        """
+        Termina l'operazione in corso, scartando i dati temporanei di tutti i flussi.
+        
+        Così anche i dati di un flusso abbandonato a metà non restano in memoria
+        (e nel file di persistenza) fino al prossimo /reset.
+        """
+        self.temp_food_item = {}
+        self.temp_meal_plan = {}
+        self.temp_meal = {}
+        self.temp_shopping_list = {}
+        self.temp_shopping_item = {}
+        self.temp_health_condition = {}
+        self.temp_dietary_restriction = {}
+        self.temp_supplement = {}
+        self.temp_health_report = {}
+        self.current_context = None
+    
+    def __setstate__(self, state):
+        """
+        Ripristina lo stato salvato dalla persistenza.
+        
+        Accetta sia lo stato delle istanze con __slots__ (tupla con il dizionario
+        degli slot) sia il dizionario salvato dalle versioni precedenti senza slot;
+        gli attributi mancanti mantengono il valore predefinito.
+        
+        Args:
+            state: Stato serializzato da pickle
+        """
+        if isinstance(state, tuple):
+            instance_dict, slots = state
+            state = {**(instance_dict or {}), **(slots or {})}
+        
+        self.__init__()
+        for name, value in state.items():
+            if name in UserData.__slots__:
+                setattr(self, name, value)
 
 
 class ChatGPTTelegramBot:
@@ -176,9 +521,6 @@ class ChatGPTTelegramBot:
         # Inizializza il gestore del database
         self.data_manager = DataManager()
         
-        # Dizionario per memorizzare i dati degli utenti durante le conversazioni
-        self.user_data = {}
-        
         # Set di utenti amministratori
         self.admin_user_ids = self._parse_admin_user_ids()
         
@@ -197,10 +539,366 @@ class ChatGPTTelegramBot:
         self.guest_budget = float(config.get('guest_budget', 100.0))
         self.user_usage = {}
         
+        # Lock per chat: gli update della stessa chat vengono serializzati,
+        # quelli di chat diverse restano concorrenti. I lock inutilizzati
+        # vengono rilasciati automaticamente dal WeakValueDictionary.
+        self._chat_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+        
+        # Utenti in ordine di utilizzo, per rimuovere gli stati meno recenti oltre MAX_USER_STATES
+        self._recent_users: "OrderedDict[int, None]" = OrderedDict()
+        
+        # Tastiere statiche costruite una sola volta e riutilizzate dagli handler
+        self._keyboards = self._build_static_keyboards()
+        
+        # Tastiere della lista dei piani alimentari, per (id, nome) dei piani mostrati
+        self._plan_keyboards: Dict[Tuple[Tuple[int, str], ...], InlineKeyboardMarkup] = {}
+        
+        # Azioni associate ai pulsanti della tastiera principale
+        self._keyboard_actions = {
+            BUTTON_INVENTORY: self.show_inventory_menu,
+            BUTTON_MEAL_PLANS: self.show_meal_plan_menu,
+            BUTTON_SHOPPING: self.show_shopping_list_menu,
+            BUTTON_HEALTH: self.show_health_menu,
+            BUTTON_HELP: self.command_help,
+            BUTTON_SETTINGS: self.command_settings,
+        }
+        
+        # Gestori delle callback inline per prefisso ("<prefisso>:<azione>")
+        self._callback_handlers = {
+            "menu": self.handle_menu_callback,
+            "inventory": self.handle_inventory_callback,
+            "meal": self.handle_meal_callback,
+            "shop": self.handle_shopping_callback,
+            "health": self.handle_health_callback,
+            "setting": self.handle_setting_callback,
+            "list": self.handle_list_callback,
+            "complete": self.handle_complete_callback,
+            "delete": self.handle_delete_callback,
+            "page": self.handle_pagination_callback,
+            "confirm": self.handle_confirmation_callback,
+            "cancel": self.handle_cancel_callback,
+        }
+        
         # Costruisci l'applicazione Telegram
         self.application = self._build_application()
         
-        logger.info("Bot Telegram inizializzato")
+        logger.info("Bot Telegram inizializzato")
+    
+    @staticmethod
+    def _build_static_keyboards() -> Dict[str, Union[InlineKeyboardMarkup, ReplyKeyboardMarkup]]:
+        """
+        Costruisce le tastiere che non dipendono dai dati dell'utente.
+        
+        I markup di Telegram sono immutabili, quindi possono essere condivisi
+        tra tutte le richieste senza ricrearli ad ogni messaggio.
+        
+        Returns:
+            Dict[str, Union[InlineKeyboardMarkup, ReplyKeyboardMarkup]]: Tastiere per nome
+        """
+        back_button = InlineKeyboardButton("🔙 Menu principale", callback_data="menu:back")
+        
+        return {
+            "start": ReplyKeyboardMarkup([
+                [KeyboardButton(BUTTON_INVENTORY), KeyboardButton(BUTTON_MEAL_PLANS)],
+                [KeyboardButton(BUTTON_SHOPPING), KeyboardButton(BUTTON_HEALTH)],
+                [KeyboardButton(BUTTON_HELP), KeyboardButton(BUTTON_SETTINGS)]
+            ], resize_keyboard=True),
+            "main_menu": InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("🍎 Inventario Alimentare", callback_data="menu:inventory"),
+                    InlineKeyboardButton("🍽️ Piani Alimentari", callback_data="menu:meal_plans")
+                ],
+                [
+                    InlineKeyboardButton("🛒 Lista della Spesa", callback_data="menu:shopping"),
+                    InlineKeyboardButton("❤️ Monitoraggio Sanitario", callback_data="menu:health")
+                ],
+                [
+                    InlineKeyboardButton("⚙️ Impostazioni", callback_data="menu:settings"),
+                    InlineKeyboardButton("❓ Aiuto", callback_data="menu:help")
+                ]
+            ]),
+            "back_to_menu": InlineKeyboardMarkup([[back_button]]),
+            "food_added": InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("➕ Aggiungi altro", callback_data="inventory:add"),
+                    InlineKeyboardButton("🔍 Visualizza inventario", callback_data="inventory:view")
+                ],
+                [back_button]
+            ]),
+            "inventory_menu": InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("➕ Aggiungi alimento", callback_data="inventory:add"),
+                    InlineKeyboardButton("🔍 Visualizza inventario", callback_data="inventory:view")
+                ],
+                [
+                    InlineKeyboardButton("⚠️ Alimenti in scadenza", callback_data="inventory:expiring"),
+                    InlineKeyboardButton("🗑️ Elimina alimento", callback_data="inventory:delete")
+                ],
+                [
+                    InlineKeyboardButton("🔍 Cerca per categoria", callback_data="inventory:search"),
+                    InlineKeyboardButton("📊 Statistiche inventario", callback_data="inventory:stats")
+                ],
+                [back_button]
+            ]),
+            "meal_plan_menu": InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("➕ Crea piano alimentare", callback_data="meal:create"),
+                    InlineKeyboardButton("🔍 Visualizza piani", callback_data="meal:view_plans")
+                ],
+                [
+                    InlineKeyboardButton("📆 Piano di oggi", callback_data="meal:today"),
+                    InlineKeyboardButton("📊 Statistiche nutrizionali", callback_data="meal:stats")
+                ],
+                [back_button]
+            ]),
+            "health_menu": InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("➕ Aggiungi condizione", callback_data="health:add_condition"),
+                    InlineKeyboardButton("🍽️ Restrizioni alimentari", callback_data="health:dietary")
+                ],
+                [
+                    InlineKeyboardButton("💊 Integratori", callback_data="health:supplements"),
+                    InlineKeyboardButton("📋 Referti medici", callback_data="health:reports")
+                ],
+                [
+                    InlineKeyboardButton("🔍 Riepilogo sanitario", callback_data="health:summary"),
+                    InlineKeyboardButton("🔄 Aggiorna dati", callback_data="health:update")
+                ],
+                [back_button]
+            ]),
+            "food_categories": InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("Frutta", callback_data="category:Frutta"),
+                    InlineKeyboardButton("Verdura", callback_data="category:Verdura")
+                ],
+                [
+                    InlineKeyboardButton("Carne", callback_data="category:Carne"),
+                    InlineKeyboardButton("Pesce", callback_data="category:Pesce")
+                ],
+                [
+                    InlineKeyboardButton("Latticini", callback_data="category:Latticini"),
+                    InlineKeyboardButton("Cereali", callback_data="category:Cereali")
+                ],
+                [
+                    InlineKeyboardButton("Altro", callback_data="category:Altro")
+                ]
+            ]),
+            "food_units": InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("g", callback_data="unit:g"),
+                    InlineKeyboardButton("kg", callback_data="unit:kg")
+                ],
+                [
+                    InlineKeyboardButton("ml", callback_data="unit:ml"),
+                    InlineKeyboardButton("L", callback_data="unit:L")
+                ],
+                [
+                    InlineKeyboardButton("pz", callback_data="unit:pz"),
+                    InlineKeyboardButton("conf", callback_data="unit:conf")
+                ]
+            ]),
+            "inventory_empty": InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("➕ Aggiungi alimento", callback_data="inventory:add"),
+                    InlineKeyboardButton("🔙 Menu inventario", callback_data="menu:inventory")
+                ]
+            ]),
+            "inventory_view": InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("➕ Aggiungi alimento", callback_data="inventory:add"),
+                    InlineKeyboardButton("🔍 Cerca per categoria", callback_data="inventory:search")
+                ],
+                [
+                    InlineKeyboardButton("🔙 Menu inventario", callback_data="menu:inventory")
+                ]
+            ]),
+            "inventory_all_categories": InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("🔍 Tutte le categorie", callback_data="inventory:view"),
+                    InlineKeyboardButton("🔙 Menu inventario", callback_data="menu:inventory")
+                ]
+            ]),
+            "inventory_view_all": InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("🔍 Visualizza tutto", callback_data="inventory:view"),
+                    InlineKeyboardButton("🔙 Menu inventario", callback_data="menu:inventory")
+                ]
+            ]),
+            "inventory_back_to_view": InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("🔍 Visualizza inventario", callback_data="inventory:view"),
+                    InlineKeyboardButton("🔙 Menu inventario", callback_data="menu:inventory")
+                ]
+            ]),
+            "inventory_stats": InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("⚠️ Alimenti in scadenza", callback_data="inventory:expiring"),
+                    InlineKeyboardButton("🔍 Visualizza inventario", callback_data="inventory:view")
+                ],
+                [
+                    InlineKeyboardButton("🔙 Menu inventario", callback_data="menu:inventory")
+                ]
+            ]),
+            "inventory_after_delete": InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("↩️ Riprova", callback_data="inventory:delete"),
+                    InlineKeyboardButton("🔙 Menu inventario", callback_data="menu:inventory")
+                ]
+            ]),
+            "meal_plans_empty": InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("➕ Crea piano", callback_data="meal:create"),
+                    InlineKeyboardButton("🔙 Menu piani", callback_data="menu:meal_plans")
+                ]
+            ]),
+            "meal_today_empty": InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("➕ Aggiungi pasto", callback_data="meal:add_today"),
+                    InlineKeyboardButton("🔙 Menu piani", callback_data="menu:meal_plans")
+                ]
+            ]),
+            "meal_today": InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("➕ Aggiungi pasto", callback_data="meal:add_today"),
+                    InlineKeyboardButton("📆 Cambia data", callback_data="meal:select_date")
+                ],
+                [
+                    InlineKeyboardButton("🔙 Menu piani", callback_data="menu:meal_plans")
+                ]
+            ]),
+            "shopping_empty": InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("➕ Crea lista", callback_data="shop:create"),
+                    InlineKeyboardButton("🔙 Menu liste", callback_data="menu:shopping")
+                ]
+            ]),
+            "shopping_generate_confirm": InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("✅ Sì, genera", callback_data="shop:generate_confirm"),
+                    InlineKeyboardButton("❌ No, annulla", callback_data="menu:shopping")
+                ]
+            ]),
+            "shopping_generate_retry": InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("↩️ Riprova", callback_data="shop:generate"),
+                    InlineKeyboardButton("🔙 Menu liste", callback_data="menu:shopping")
+                ]
+            ]),
+            "health_restrictions": InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("➕ Aggiungi restrizione", callback_data="health:add_restriction"),
+                    InlineKeyboardButton("🔙 Menu salute", callback_data="menu:health")
+                ]
+            ]),
+            "health_supplements": InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("➕ Aggiungi integratore", callback_data="health:add_supplement"),
+                    InlineKeyboardButton("🔙 Menu salute", callback_data="menu:health")
+                ]
+            ]),
+            "health_reports": InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("➕ Aggiungi referto", callback_data="health:add_report"),
+                    InlineKeyboardButton("🔙 Menu salute", callback_data="menu:health")
+                ]
+            ]),
+            "health_summary": InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("📋 Dettagli completi", callback_data="health:detail"),
+                    InlineKeyboardButton("🔙 Menu salute", callback_data="menu:health")
+                ]
+            ]),
+            "back_to_shopping": InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Menu liste della spesa", callback_data="menu:shopping")
+            ]]),
+            "back_to_shopping_lists": InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Menu liste", callback_data="menu:shopping")
+            ]]),
+            "back_to_settings": InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Torna alle impostazioni", callback_data="menu:settings")
+            ]]),
+        }
+    
+    @staticmethod
+    def _build_expiry_keyboard() -> InlineKeyboardMarkup:
+        """
+        Costruisce la tastiera con le scadenze suggerite a partire da oggi.
+        
+        Returns:
+            InlineKeyboardMarkup: Tastiera con le opzioni di scadenza
+        """
+        today = datetime.date.today()
+        
+        return InlineKeyboardMarkup([
+            [InlineKeyboardButton("Oggi", callback_data=f"expiry:{today.isoformat()}")],
+            [InlineKeyboardButton("+7 giorni", callback_data=f"expiry:{(today + datetime.timedelta(days=7)).isoformat()}")],
+            [InlineKeyboardButton("+30 giorni", callback_data=f"expiry:{(today + datetime.timedelta(days=30)).isoformat()}")],
+            [InlineKeyboardButton("Non scade", callback_data="expiry:none")]
+        ])
+    
+    async def _save_temp_food_item(self, user_id: int, user_data: UserData) -> Optional[int]:
+        """
+        Salva nel database l'alimento raccolto durante la conversazione.
+        
+        La scrittura avviene in un thread separato, così gli update delle altre chat
+        continuano a essere elaborati mentre SQLite completa il commit.
+        
+        Args:
+            user_id: ID dell'utente
+            user_data: Dati temporanei dell'utente
+            
+        Returns:
+            Optional[int]: ID dell'elemento aggiunto o None in caso di errore
+        """
+        item = user_data.temp_food_item
+        
+        return await asyncio.to_thread(
+            self.data_manager.add_food_item,
+            user_id=user_id,
+            name=item['name'],
+            category=item['category'],
+            quantity=item['quantity'],
+            unit=item['unit'],
+            expiry_date=item['expiry_date'],
+            notes=item.get('notes')
+        )
+    
+    def _meal_plans_keyboard(self, meal_plans: List[Dict[str, Any]]) -> InlineKeyboardMarkup:
+        """
+        Restituisce la tastiera della lista dei piani alimentari (solo i primi 5).
+        
+        La tastiera dipende solo da ID e nome dei piani mostrati, quindi viene
+        riutilizzata finché questi non cambiano.
+        
+        Args:
+            meal_plans: Piani alimentari dell'utente
+            
+        Returns:
+            InlineKeyboardMarkup: Tastiera con i piani e i pulsanti di navigazione
+        """
+        key = tuple((plan['id'], plan['name']) for plan in islice(meal_plans, 5))
+        reply_markup = self._plan_keyboards.get(key)
+        
+        if reply_markup is None:
+            keyboard = [
+                [InlineKeyboardButton(name, callback_data=f"meal:view_plan:{plan_id}")]
+                for plan_id, name in key
+            ]
+            
+            # Aggiungi pulsanti di navigazione
+            keyboard.append([
+                InlineKeyboardButton("➕ Crea piano", callback_data="meal:create"),
+                InlineKeyboardButton("🔙 Menu piani", callback_data="menu:meal_plans")
+            ])
+            
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            
+            # Limita la dimensione della cache scartando la tastiera più vecchia
+            if len(self._plan_keyboards) >= PLAN_KEYBOARD_CACHE_SIZE:
+                del self._plan_keyboards[next(iter(self._plan_keyboards))]
+            self._plan_keyboards[key] = reply_markup
+        
+        return reply_markup
     
     def _parse_admin_user_ids(self) -> Set[int]:
         """
@@ -259,6 +957,32 @@ class ChatGPTTelegramBot:
             logger.error("Formato non valido per user_budgets. Deve essere '*' o una lista di 'id:budget' separati da virgole.")
             return {}
     
+    def _per_chat(self, handler: Callable) -> Callable:
+        """
+        Avvolge un handler in modo che gli update della stessa chat siano
+        elaborati in ordine, senza bloccare le altre chat.
+        
+        Args:
+            handler: Handler asincrono (update, context)
+            
+        Returns:
+            Callable: Handler serializzato per chat
+        """
+        @wraps(handler)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            chat = update.effective_chat
+            if chat is None:
+                return await handler(update, context)
+            
+            lock = self._chat_locks.get(chat.id)
+            if lock is None:
+                lock = self._chat_locks[chat.id] = asyncio.Lock()
+            
+            async with lock:
+                return await handler(update, context)
+        
+        return wrapper
+    
     def _build_application(self) -> Application:
         """
         Costruisce l'applicazione Telegram con tutti gli handler.
@@ -266,31 +990,39 @@ class ChatGPTTelegramBot:
         Returns:
             Application: Applicazione Telegram configurata
         """
-        # Configurazione del rate limiter
+        # Configurazione del rate limiter (limiti di Telegram: 30 messaggi/s in totale,
+        # 20 messaggi/minuto per gruppo)
         rate_limiter = AIORateLimiter(
             overall_max_rate=30,
             overall_time_period=1,
             group_max_rate=20,
-            group_time_period=1,
+            group_time_period=60,
             max_retries=3,
             retry_delay=0.1
         )
         
         # Costruisci l'applicazione
-        application = (
+        builder = (
             ApplicationBuilder()
             .token(self.config['token'])
             .rate_limiter(rate_limiter)
-            .build()
+            .concurrent_updates(True)
         )
         
+        # Persistenza opzionale dello stato utente, condiviso tra riavvii e processi
+        persistence_file = self.config.get('persistence_file')
+        if persistence_file:
+            builder = builder.persistence(PicklePersistence(filepath=persistence_file))
+        
+        application = builder.build()
+        
         # Aggiungi gli handler per i comandi principali
-        application.add_handler(CommandHandler("start", self.command_start))
-        application.add_handler(CommandHandler("help", self.command_help))
-        application.add_handler(CommandHandler("reset", self.command_reset))
-        application.add_handler(CommandHandler("menu", self.command_menu))
-        application.add_handler(CommandHandler("settings", self.command_settings))
-        application.add_handler(CommandHandler("cancel", self.command_cancel))
+        application.add_handler(CommandHandler("start", self._per_chat(self.command_start)))
+        application.add_handler(CommandHandler("help", self._per_chat(self.command_help)))
+        application.add_handler(CommandHandler("reset", self._per_chat(self.command_reset)))
+        application.add_handler(CommandHandler("menu", self._per_chat(self.command_menu)))
+        application.add_handler(CommandHandler("settings", self._per_chat(self.command_settings)))
+        application.add_handler(CommandHandler("cancel", self._per_chat(self.command_cancel)))
         
         # Handler per i comandi amministrativi
         application.add_handler(CommandHandler("stats", self.command_stats))
@@ -298,19 +1030,24 @@ class ChatGPTTelegramBot:
         application.add_handler(CommandHandler("debug", self.command_debug))
         
         # Handler per i messaggi di testo generici
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
+        # (non bloccante: le chiamate a Claude non fermano gli update delle altre chat,
+        # mentre _per_chat mantiene l'ordine all'interno della stessa chat)
+        application.add_handler(MessageHandler(
+            filters.TEXT & ~filters.COMMAND, self._per_chat(self.handle_message), block=False
+        ))
         
         # Handler per le immagini (per l'analisi degli alimenti o ricevute)
-        application.add_handler(MessageHandler(filters.PHOTO, self.handle_photo))
+        application.add_handler(MessageHandler(filters.PHOTO, self._per_chat(self.handle_photo), block=False))
         
         # Handler per i documenti (per l'importazione di dati)
-        application.add_handler(MessageHandler(filters.Document.ALL, self.handle_document))
+        application.add_handler(MessageHandler(filters.Document.ALL, self._per_chat(self.handle_document)))
         
         # Handler per i callback da pulsanti inline
-        application.add_handler(CallbackQueryHandler(self.handle_callback))
+        application.add_handler(CallbackQueryHandler(self._per_chat(self.handle_callback)))
         
-        # Handler per gli errori
-        application.add_error_handler(self.error_handler)
+        # Handler per gli errori (non bloccante: la segnalazione all'utente viene eseguita
+        # come task separato e non trattiene l'elaborazione dell'update che ha fallito)
+        application.add_error_handler(self.error_handler, block=False)
         
         # Definizione della conversazione principale con gli stati
         # (In una versione più complessa, potremmo usare ConversationHandler)
@@ -350,8 +1087,11 @@ class ChatGPTTelegramBot:
         
         self.application.post_init = post_init
         
-        # Avvia il polling
-        self.application.run_polling(allowed_updates=Update.ALL_TYPES)
+        # Avvia il polling e chiudi le connessioni al database all'arresto
+        try:
+            self.application.run_polling(allowed_updates=Update.ALL_TYPES)
+        finally:
+            self.data_manager.close()
     
     def is_allowed(self, user_id: int) -> bool:
         """
@@ -390,15 +1130,62 @@ class ChatGPTTelegramBot:
         """
         Ottiene i dati temporanei dell'utente, inizializzandoli se necessario.
         
+        Lo stato è conservato nello user_data dell'applicazione, così da essere
+        salvato dalla persistenza configurata invece che solo in memoria.
+        
         Args:
             user_id: ID utente Telegram
             
         Returns:
             UserData: Oggetto con i dati dell'utente
         """
-        if user_id not in self.user_data:
-            self.user_data[user_id] = UserData()
-        return self.user_data[user_id]
+        # Aggiorna l'ordine di utilizzo (dal meno al più recente)
+        recent = self._recent_users
+        try:
+            recent.move_to_end(user_id)
+        except KeyError:
+            recent[user_id] = None
+        
+        store = self.application.user_data[user_id]
+        state = store.get(USER_STATE_KEY)
+        if state is None:
+            state = store[USER_STATE_KEY] = UserData()
+            self._evict_user_states()
+        return state
+    
+    def _evict_user_states(self):
+        """
+        Limita il numero di stati utente conservati, scartando quelli usati meno di recente.
+        
+        Quando si supera MAX_USER_STATES vengono rimossi gli stati in eccesso più un
+        margine del 10%, così la scansione non si ripete a ogni nuovo utente. Gli stati
+        ricaricati dalla persistenza e non ancora usati da questo processo sono i primi a essere rimossi.
+        """
+        active = self._active_user_ids()
+        if len(active) <= MAX_USER_STATES:
+            return
+        
+        recent = self._recent_users
+        candidates = [user_id for user_id in active if user_id not in recent]
+        candidates.extend(recent)
+        
+        for user_id in candidates[:len(active) - MAX_USER_STATES + MAX_USER_STATES // 10]:
+            recent.pop(user_id, None)
+            self.application.drop_user_data(user_id)
+        
+        logger.info(f"Stati utente inattivi rimossi, attivi: {len(self._active_user_ids())}")
+    
+    def _active_user_ids(self) -> List[int]:
+        """
+        Restituisce gli ID degli utenti che hanno uno stato di conversazione.
+        
+        Returns:
+            List[int]: Lista degli ID utente
+        """
+        return [
+            user_id for user_id, store in self.application.user_data.items()
+            if USER_STATE_KEY in store
+        ]
     
     async def reset_user_data(self, user_id: int):
         """
@@ -407,17 +1194,13 @@ class ChatGPTTelegramBot:
         Args:
             user_id: ID utente Telegram
         """
-        if user_id in self.user_data:
-            # Preserva la cronologia delle conversazioni
-            history = self.user_data[user_id].conversation_history
-            last_time = self.user_data[user_id].last_interaction_time
-            
-            # Resetta i dati
-            self.user_data[user_id] = UserData()
-            
-            # Ripristina la cronologia
-            self.user_data[user_id].conversation_history = history
-            self.user_data[user_id].last_interaction_time = last_time
+        store = self.application.user_data.get(user_id)
+        old_state = store.get(USER_STATE_KEY) if store else None
+        if old_state is not None:
+            # Resetta i dati preservando la cronologia delle conversazioni
+            state = store[USER_STATE_KEY] = UserData()
+            state.conversation_history = old_state.conversation_history
+            state.last_interaction_time = old_state.last_interaction_time
     
     async def command_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
@@ -446,26 +1229,9 @@ class ChatGPTTelegramBot:
         # Salva i dati utente nel database se è la prima volta
         # TODO: Implementare la creazione dell'utente nel database
         
-        # Messaggio di benvenuto
-        welcome_text = (
-            f"👋 Benvenuto nell'Assistente Personale Claude!\n\n"
-            f"Sono qui per aiutarti a gestire:\n"
-            f"🍎 Inventario alimentare\n"
-            f"🍽️ Piani alimentari\n"
-            f"🛒 Liste della spesa\n"
-            f"❤️ Monitoraggio sanitario\n\n"
-            f"Usa /menu per accedere alle funzionalità o chiedimi direttamente ciò di cui hai bisogno."
-        )
-        
-        # Crea la tastiera con i pulsanti principali
-        keyboard = [
-            [KeyboardButton("🍎 Inventario"), KeyboardButton("🍽️ Piani Alimentari")],
-            [KeyboardButton("🛒 Lista Spesa"), KeyboardButton("❤️ Salute")],
-            [KeyboardButton("❓ Aiuto"), KeyboardButton("⚙️ Impostazioni")]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+        reply_markup = self._keyboards["start"]
         
-        await update.message.reply_text(welcome_text, reply_markup=reply_markup)
+        await update.message.reply_text(WELCOME_TEXT, reply_markup=reply_markup)
     
     async def command_help(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
@@ -484,47 +1250,8 @@ class ChatGPTTelegramBot:
         if not self.is_allowed(user_id):
             return
         
-        help_text = (
-            "🤖 *Guida all'Assistente Personale Claude*\n\n"
-            "*Comandi principali:*\n"
-            "/start - Avvia il bot\n"
-            "/menu - Mostra il menu principale\n"
-            "/help - Mostra questa guida\n"
-            "/settings - Gestisci le tue impostazioni\n"
-            "/reset - Resetta la conversazione corrente\n"
-            "/cancel - Annulla l'operazione corrente\n\n"
-            
-            "*Funzionalità disponibili:*\n\n"
-            
-            "*🍎 Inventario Alimentare*\n"
-            "- Aggiungi/rimuovi alimenti\n"
-            "- Traccia le scadenze\n"
-            "- Visualizza gli alimenti disponibili\n\n"
-            
-            "*🍽️ Piani Alimentari*\n"
-            "- Crea piani settimanali/mensili\n"
-            "- Aggiungi pasti ai tuoi piani\n"
-            "- Consulta i pasti pianificati\n\n"
-            
-            "*🛒 Lista della Spesa*\n"
-            "- Crea liste personalizzate\n"
-            "- Aggiungi articoli alla lista\n"
-            "- Genera liste in base all'inventario\n\n"
-            
-            "*❤️ Monitoraggio Sanitario*\n"
-            "- Registra condizioni mediche\n"
-            "- Traccia l'assunzione di integratori\n"
-            "- Memorizza referti e restrizioni alimentari\n\n"
-            
-            "*Utilizzo dell'intelligenza artificiale:*\n"
-            "Puoi chiedermi qualsiasi cosa riguardo a nutrizione, ricette, consigli alimentari in base alle tue condizioni, "
-            "e ti risponderò grazie all'AI di Claude. Puoi anche inviarmi foto di alimenti o ricevute per aiutarti "
-            "nell'aggiornamento dell'inventario o delle liste della spesa.\n\n"
-            
-            "Per qualsiasi dubbio o assistenza, usa il comando /help o chiedi direttamente!"
-        )
         
-        await update.message.reply_text(help_text, parse_mode=ParseMode.MARKDOWN)
+        await update.message.reply_text(HELP_TEXT, parse_mode=ParseMode.MARKDOWN)
     
     async def command_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
@@ -546,23 +1273,7 @@ class ChatGPTTelegramBot:
         # Resetta lo stato corrente
         await self.reset_user_data(user_id)
         
-        # Crea la tastiera inline per il menu principale
-        keyboard = [
-            [
-                InlineKeyboardButton("🍎 Inventario Alimentare", callback_data="menu:inventory"),
-                InlineKeyboardButton("🍽️ Piani Alimentari", callback_data="menu:meal_plans")
-            ],
-            [
-                InlineKeyboardButton("🛒 Lista della Spesa", callback_data="menu:shopping"),
-                InlineKeyboardButton("❤️ Monitoraggio Sanitario", callback_data="menu:health")
-            ],
-            [
-                InlineKeyboardButton("⚙️ Impostazioni", callback_data="menu:settings"),
-                InlineKeyboardButton("❓ Aiuto", callback_data="menu:help")
-            ]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = self._keyboards["main_menu"]
         
         await update.message.reply_text(
             "🔍 *Menu Principale*\n\n"
@@ -661,8 +1372,9 @@ class ChatGPTTelegramBot:
             return
         
         # Resetta i dati dell'utente inclusa la cronologia delle conversazioni
-        if user_id in self.user_data:
-            self.user_data[user_id] = UserData()
+        store = self.application.user_data.get(user_id)
+        if store and USER_STATE_KEY in store:
+            store[USER_STATE_KEY] = UserData()
         
         await update.message.reply_text(
             "🔄 La conversazione è stata resettata. Usa /menu per iniziare una nuova conversazione."
@@ -730,7 +1442,7 @@ class ChatGPTTelegramBot:
             stats_text += f"- {table}: {count} righe\n"
         
         stats_text += "\n*Utenti attivi*\n"
-        stats_text += f"- Totale: {len(self.user_data)}\n"
+        stats_text += f"- Totale: {len(self._active_user_ids())}\n"
         
         # Aggiungi statistiche sull'utilizzo delle API
         stats_text += "\n*Utilizzo API*\n"
@@ -762,27 +1474,34 @@ class ChatGPTTelegramBot:
         message_text = " ".join(context.args)
         
         # Ottieni tutti gli utenti attivi
-        active_users = list(self.user_data.keys())
+        active_users = self._active_user_ids()
         
         await update.message.reply_text(
             f"📣 Invio messaggio a {len(active_users)} utenti..."
         )
         
-        # Invia il messaggio a tutti gli utenti attivi
-        sent_count = 0
-        failed_count = 0
+        # Invia il messaggio a tutti gli utenti attivi: le chat sono indipendenti,
+        # quindi gli invii procedono in parallelo, cadenzati a BROADCAST_MAX_RATE al secondo
+        # perché il broadcast non consumi tutta la banda condivisa con le risposte agli utenti
+        text = f"📣 *Messaggio dall'amministratore*\n\n{message_text}"
+        limiter = AsyncLimiter(BROADCAST_MAX_RATE, 1)
         
-        for user_id in active_users:
-            try:
-                await context.bot.send_message(
-                    chat_id=user_id,
-                    text=f"📣 *Messaggio dall'amministratore*\n\n{message_text}",
-                    parse_mode=ParseMode.MARKDOWN
-                )
-                sent_count += 1
-            except Exception as e:
-                logger.error(f"Errore nell'invio del messaggio all'utente {user_id}: {str(e)}")
-                failed_count += 1
+        async def send_to(chat_id: int) -> bool:
+            async with limiter:
+                try:
+                    await context.bot.send_message(
+                        chat_id=chat_id,
+                        text=text,
+                        parse_mode=ParseMode.MARKDOWN
+                    )
+                    return True
+                except Exception as e:
+                    logger.error(f"Errore nell'invio del messaggio all'utente {chat_id}: {str(e)}")
+                    return False
+        
+        results = await asyncio.gather(*(send_to(chat_id) for chat_id in active_users))
+        sent_count = sum(results)
+        failed_count = len(results) - sent_count
         
         await update.message.reply_text(
             f"📣 Messaggio inviato a {sent_count} utenti.\n"
@@ -838,23 +1557,9 @@ class ChatGPTTelegramBot:
         user_data = self.get_user_data(user_id)
         
         # Gestione dei pulsanti della tastiera principale
-        if message_text == "🍎 Inventario":
-            await self.show_inventory_menu(update, context)
-            return
-        elif message_text == "🍽️ Piani Alimentari":
-            await self.show_meal_plan_menu(update, context)
-            return
-        elif message_text == "🛒 Lista Spesa":
-            await self.show_shopping_list_menu(update, context)
-            return
-        elif message_text == "❤️ Salute":
-            await self.show_health_menu(update, context)
-            return
-        elif message_text == "❓ Aiuto":
-            await self.command_help(update, context)
-            return
-        elif message_text == "⚙️ Impostazioni":
-            await self.command_settings(update, context)
+        keyboard_action = self._keyboard_actions.get(message_text)
+        if keyboard_action is not None:
+            await keyboard_action(update, context)
             return
         
         # Se siamo in attesa di input specifici per completare un'operazione
@@ -863,6 +1568,13 @@ class ChatGPTTelegramBot:
             await self.handle_context_input(update, context, user_data.current_context, message_text)
             return
         
+        # Messaggi che nominano solo una sezione: apri il menu senza chiamare Claude
+        normalized_text = message_text.strip().rstrip("?!.").strip()
+        for pattern, button in _MENU_KEYWORD_PATTERNS:
+            if pattern.fullmatch(normalized_text):
+                await self._keyboard_actions[button](update, context)
+                return
+        
         # Altrimenti, invia il messaggio a Claude per un'elaborazione con AI
         await self.process_with_ai(update, context)
     
@@ -886,25 +1598,7 @@ class ChatGPTTelegramBot:
             user_data.current_context = WAITING_FOR_FOOD_CATEGORY
             
             # Suggerisci categorie comuni
-            keyboard = [
-                [
-                    InlineKeyboardButton("Frutta", callback_data="category:Frutta"),
-                    InlineKeyboardButton("Verdura", callback_data="category:Verdura")
-                ],
-                [
-                    InlineKeyboardButton("Carne", callback_data="category:Carne"),
-                    InlineKeyboardButton("Pesce", callback_data="category:Pesce")
-                ],
-                [
-                    InlineKeyboardButton("Latticini", callback_data="category:Latticini"),
-                    InlineKeyboardButton("Cereali", callback_data="category:Cereali")
-                ],
-                [
-                    InlineKeyboardButton("Altro", callback_data="category:Altro")
-                ]
-            ]
-            
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = self._keyboards["food_categories"]
             
             await update.message.reply_text(
                 "📋 Seleziona la categoria o inseriscine una personalizzata:",
@@ -921,27 +1615,12 @@ class ChatGPTTelegramBot:
             
         elif current_context == WAITING_FOR_FOOD_QUANTITY:
             try:
-                quantity = float(message_text.replace(',', '.'))
+                quantity = _parse_quantity(message_text)
                 user_data.temp_food_item['quantity'] = quantity
                 user_data.current_context = WAITING_FOR_FOOD_UNIT
                 
                 # Suggerisci unità comuni
-                keyboard = [
-                    [
-                        InlineKeyboardButton("g", callback_data="unit:g"),
-                        InlineKeyboardButton("kg", callback_data="unit:kg")
-                    ],
-                    [
-                        InlineKeyboardButton("ml", callback_data="unit:ml"),
-                        InlineKeyboardButton("L", callback_data="unit:L")
-                    ],
-                    [
-                        InlineKeyboardButton("pz", callback_data="unit:pz"),
-                        InlineKeyboardButton("conf", callback_data="unit:conf")
-                    ]
-                ]
-                
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = self._keyboards["food_units"]
                 
                 await update.message.reply_text(
                     "📏 Seleziona l'unità di misura o inseriscine una personalizzata:",
@@ -957,89 +1636,35 @@ class ChatGPTTelegramBot:
             user_data.temp_food_item['unit'] = message_text
             user_data.current_context = WAITING_FOR_FOOD_EXPIRY
             
-            # Calcola la data tra un mese come suggerimento
-            one_month_later = datetime.datetime.now() + datetime.timedelta(days=30)
-            suggested_date = one_month_later.strftime(DISPLAY_DATE_FORMAT)
-            
-            keyboard = [
-                [
-                    InlineKeyboardButton("Oggi", callback_data=f"expiry:{datetime.datetime.now().strftime(DATE_FORMAT)}")
-                ],
-                [
-                    InlineKeyboardButton("+7 giorni", callback_data=f"expiry:{(datetime.datetime.now() + datetime.timedelta(days=7)).strftime(DATE_FORMAT)}")
-                ],
-                [
-                    InlineKeyboardButton("+30 giorni", callback_data=f"expiry:{(datetime.datetime.now() + datetime.timedelta(days=30)).strftime(DATE_FORMAT)}")
-                ],
-                [
-                    InlineKeyboardButton("Non scade", callback_data="expiry:none")
-                ]
-            ]
-            
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            # Suggerisci date di scadenza
+            reply_markup = self._build_expiry_keyboard()
             
-            await update.message.reply_text(
-                f"📅 Inserisci la data di scadenza nel formato {DISPLAY_DATE_FORMAT} o seleziona un'opzione:",
-                reply_markup=reply_markup
-            )
+            await update.message.reply_text(EXPIRY_PROMPT_TEXT, reply_markup=reply_markup)
             
         elif current_context == WAITING_FOR_FOOD_EXPIRY:
             # Converti la data nel formato corretto
-            try:
-                # Prova prima il formato visualizzato
-                expiry_date = datetime.datetime.strptime(message_text, DISPLAY_DATE_FORMAT).strftime(DATE_FORMAT)
-            except ValueError:
-                try:
-                    # Prova anche il formato del database
-                    expiry_date = datetime.datetime.strptime(message_text, DATE_FORMAT).strftime(DATE_FORMAT)
-                except ValueError:
-                    await update.message.reply_text(
-                        f"❌ Formato data non valido. Inserisci la data nel formato {DISPLAY_DATE_FORMAT}:"
-                    )
-                    return
+            expiry = _parse_user_date(message_text)
+            if expiry is None:
+                await update.message.reply_text(INVALID_DATE_TEXT)
+                return
             
+            # Entrambe le rappresentazioni vengono calcolate una sola volta dalla data analizzata
+            expiry_date = expiry.strftime(DATE_FORMAT)
+            expiry_display = expiry.strftime(DISPLAY_DATE_FORMAT)
             user_data.temp_food_item['expiry_date'] = expiry_date
             
             # Salva l'elemento nel database
-            item_id = self.data_manager.add_food_item(
-                user_id=user_id,
-                name=user_data.temp_food_item['name'],
-                category=user_data.temp_food_item['category'],
-                quantity=user_data.temp_food_item['quantity'],
-                unit=user_data.temp_food_item['unit'],
-                expiry_date=user_data.temp_food_item['expiry_date'],
-                notes=user_data.temp_food_item.get('notes')
-            )
+            item_id = await self._save_temp_food_item(user_id, user_data)
             
             if item_id:
+                # Conferma e menu successivo in un unico messaggio
                 await update.message.reply_text(
-                    f"✅ Elemento aggiunto all'inventario:\n\n"
-                    f"- {user_data.temp_food_item['name']} ({user_data.temp_food_item['category']})\n"
-                    f"- Quantità: {user_data.temp_food_item['quantity']} {user_data.temp_food_item['unit']}\n"
-                    f"- Scadenza: {datetime.datetime.strptime(expiry_date, DATE_FORMAT).strftime(DISPLAY_DATE_FORMAT) if expiry_date != 'none' else 'Non scade'}"
-                )
-                
-                # Chiedi se vuole aggiungere un altro elemento
-                keyboard = [
-                    [
-                        InlineKeyboardButton("➕ Aggiungi altro", callback_data="inventory:add"),
-                        InlineKeyboardButton("🔍 Visualizza inventario", callback_data="inventory:view")
-                    ],
-                    [
-                        InlineKeyboardButton("🔙 Menu principale", callback_data="menu:back")
-                    ]
-                ]
-                
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
-                await update.message.reply_text(
-                    "Cosa vuoi fare ora?",
-                    reply_markup=reply_markup
+                    FOOD_ADDED_TEMPLATE.format(expiry=expiry_display, **user_data.temp_food_item),
+                    reply_markup=self._keyboards["food_added"]
                 )
                 
                 # Resetta i dati temporanei e il contesto
-                user_data.temp_food_item = {}
-                user_data.current_context = None
+                user_data.clear_temp_data()
                 
             else:
                 await update.message.reply_text(
@@ -1073,31 +1698,35 @@ class ChatGPTTelegramBot:
         # Ottieni la foto con la risoluzione più alta
         photo = update.message.photo[-1]
         
-        # Invia un messaggio di attesa
-        await update.message.reply_text(
-            "🔍 Sto analizzando l'immagine... Attendere prego."
-        )
-        
-        # Ottieni il file dalla foto
-        photo_file = await context.bot.get_file(photo.file_id)
-        
-        # Scarica la foto
-        photo_bytes = await photo_file.download_as_bytearray()
-        photo_stream = BytesIO(photo_bytes)
-        
         # Ottieni la didascalia o usa un prompt predefinito
         caption = update.message.caption or "Analizza questa immagine e identificala."
         
         try:
-            # Usa Claude Vision per analizzare l'immagine
-            result = await self.anthropic.analyze_image(
-                image_data=photo_stream,
-                query=caption
-            )
+            # Indicatore "sta scrivendo" finché l'analisi non è terminata,
+            # al posto di un messaggio di attesa che resterebbe visibile
+            async with self._show_typing(context.bot, update.message.chat_id):
+                # Scarica la foto e passa il buffer così com'è, senza copiarlo in un nuovo stream
+                photo_file = await context.bot.get_file(photo.file_id)
+                photo_bytes = await photo_file.download_as_bytearray()
+                
+                # Usa Claude Vision per analizzare l'immagine
+                result = await asyncio.wait_for(
+                    self.anthropic.analyze_image(
+                        image_data=photo_bytes,
+                        query=caption
+                    ),
+                    timeout=CLAUDE_TIMEOUT_SECONDS
+                )
             
             # Invia la risposta
             await self.send_large_message(update.message.chat_id, result, context.bot)
             
+        except asyncio.TimeoutError:
+            logger.error("Timeout durante l'analisi dell'immagine con Claude")
+            await update.message.reply_text(
+                "⏱️ L'analisi dell'immagine sta richiedendo troppo tempo. Riprova più tardi."
+            )
+            
         except ClaudeException as e:
             logger.error(f"Errore durante l'analisi dell'immagine: {str(e)}")
             await update.message.reply_text(
@@ -1110,6 +1739,39 @@ class ChatGPTTelegramBot:
                 "❌ Si è verificato un errore durante l'elaborazione dell'immagine. Riprova più tardi."
             )
     
+    @asynccontextmanager
+    async def _show_typing(self, bot: Bot, chat_id: int):
+        """
+        Mostra l'azione "sta scrivendo" nella chat per la durata del blocco.
+        
+        Gli handler che lo usano sono serializzati per chat da _per_chat, quindi
+        ogni blocco avvia il proprio task e lo annulla all'uscita.
+        
+        Args:
+            bot: Istanza del bot Telegram
+            chat_id: ID della chat
+        """
+        typing_task = asyncio.create_task(self._typing_loop(bot, chat_id))
+        try:
+            yield
+        finally:
+            typing_task.cancel()
+    
+    async def _typing_loop(self, bot: Bot, chat_id: int):
+        """
+        Invia periodicamente l'azione "sta scrivendo" finché il task non viene annullato.
+        
+        Args:
+            bot: Istanza del bot Telegram
+            chat_id: ID della chat
+        """
+        while True:
+            try:
+                await bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
+            except Exception as e:
+                logger.warning(f"Impossibile inviare l'azione di chat: {str(e)}")
+            await asyncio.sleep(CHAT_ACTION_INTERVAL_SECONDS)
+    
     async def handle_document(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
         Gestisce i messaggi con documenti.
@@ -1209,45 +1871,37 @@ class ChatGPTTelegramBot:
             await update.callback_query.answer("Non sei autorizzato a utilizzare questo bot.")
             return
         
-        # Conferma la ricezione del callback
-        await update.callback_query.answer()
+        # Conferma la ricezione del callback in parallelo all'elaborazione:
+        # l'ordine tra le due chiamate non è rilevante per il client
+        answer_result, dispatch_result = await asyncio.gather(
+            update.callback_query.answer(),
+            self._dispatch_callback(update, context, user_id, callback_data),
+            return_exceptions=True
+        )
         
-        # Elabora il callback in base al prefisso
-        if callback_data.startswith("menu:"):
-            await self.handle_menu_callback(update, context, callback_data[5:])
-            
-        elif callback_data.startswith("inventory:"):
-            await self.handle_inventory_callback(update, context, callback_data[10:])
-            
-        elif callback_data.startswith("meal:"):
-            await self.handle_meal_callback(update, context, callback_data[5:])
-            
-        elif callback_data.startswith("shop:"):
-            await self.handle_shopping_callback(update, context, callback_data[5:])
-            
-        elif callback_data.startswith("health:"):
-            await self.handle_health_callback(update, context, callback_data[7:])
-            
-        elif callback_data.startswith("setting:"):
-            await self.handle_setting_callback(update, context, callback_data[8:])
-            
-        elif callback_data.startswith("list:"):
-            await self.handle_list_callback(update, context, callback_data[5:])
-            
-        elif callback_data.startswith("complete:"):
-            await self.handle_complete_callback(update, context, callback_data[9:])
-            
-        elif callback_data.startswith("delete:"):
-            await self.handle_delete_callback(update, context, callback_data[7:])
-            
-        elif callback_data.startswith("page:"):
-            await self.handle_pagination_callback(update, context, callback_data[5:])
-            
-        elif callback_data.startswith("confirm:"):
-            await self.handle_confirmation_callback(update, context, callback_data[8:])
-            
-        elif callback_data.startswith("cancel:"):
-            await self.handle_cancel_callback(update, context, callback_data[7:])
+        # Una conferma non riuscita (es. callback troppo vecchia) non annulla l'azione
+        # già eseguita: si registra senza mostrare errori all'utente
+        if isinstance(answer_result, Exception):
+            logger.warning(f"Impossibile confermare il callback '{callback_data}': {str(answer_result)}")
+        if isinstance(dispatch_result, BaseException):
+            raise dispatch_result
+    
+    async def _dispatch_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
+                                 user_id: int, callback_data: str):
+        """
+        Instrada una callback inline al gestore corrispondente al suo prefisso.
+        
+        Args:
+            update: Oggetto update di Telegram
+            context: Contesto della conversazione
+            user_id: ID utente Telegram
+            callback_data: Dati della callback
+        """
+        # Prefissi gestiti interamente da un metodo dedicato
+        prefix, separator, action = callback_data.partition(":")
+        handler = self._callback_handlers.get(prefix) if separator else None
+        if handler is not None:
+            await handler(update, context, action)
             
         elif callback_data.startswith("category:"):
             # Gestione callback per la selezione della categoria
@@ -1273,26 +1927,10 @@ class ChatGPTTelegramBot:
                 user_data.current_context = WAITING_FOR_FOOD_EXPIRY
                 
                 # Suggerisci date di scadenza
-                keyboard = [
-                    [
-                        InlineKeyboardButton("Oggi", callback_data=f"expiry:{datetime.datetime.now().strftime(DATE_FORMAT)}")
-                    ],
-                    [
-                        InlineKeyboardButton("+7 giorni", callback_data=f"expiry:{(datetime.datetime.now() + datetime.timedelta(days=7)).strftime(DATE_FORMAT)}")
-                    ],
-                    [
-                        InlineKeyboardButton("+30 giorni", callback_data=f"expiry:{(datetime.datetime.now() + datetime.timedelta(days=30)).strftime(DATE_FORMAT)}")
-                    ],
-                    [
-                        InlineKeyboardButton("Non scade", callback_data="expiry:none")
-                    ]
-                ]
-                
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = self._build_expiry_keyboard()
                 
                 await update.callback_query.edit_message_text(
-                    f"📏 Unità selezionata: {unit}\n\n"
-                    f"📅 Inserisci la data di scadenza nel formato {DISPLAY_DATE_FORMAT} o seleziona un'opzione:",
+                    f"📏 Unità selezionata: {unit}\n\n{EXPIRY_PROMPT_TEXT}",
                     reply_markup=reply_markup
                 )
                 
@@ -1305,54 +1943,23 @@ class ChatGPTTelegramBot:
                 user_data.temp_food_item['expiry_date'] = None if expiry == "none" else expiry
                 
                 # Salva l'elemento nel database
-                item_id = self.data_manager.add_food_item(
-                    user_id=user_id,
-                    name=user_data.temp_food_item['name'],
-                    category=user_data.temp_food_item['category'],
-                    quantity=user_data.temp_food_item['quantity'],
-                    unit=user_data.temp_food_item['unit'],
-                    expiry_date=user_data.temp_food_item['expiry_date'],
-                    notes=user_data.temp_food_item.get('notes')
-                )
+                item_id = await self._save_temp_food_item(user_id, user_data)
                 
                 if item_id:
                     # Formatta la data di scadenza per la visualizzazione
-                    expiry_display = "Non scade" if expiry == "none" else datetime.datetime.strptime(expiry, DATE_FORMAT).strftime(DISPLAY_DATE_FORMAT)
-                    
-                    # Crea la tastiera per le azioni successive
-                    keyboard = [
-                        [
-                            InlineKeyboardButton("➕ Aggiungi altro", callback_data="inventory:add"),
-                            InlineKeyboardButton("🔍 Visualizza inventario", callback_data="inventory:view")
-                        ],
-                        [
-                            InlineKeyboardButton("🔙 Menu principale", callback_data="menu:back")
-                        ]
-                    ]
-                    
-                    reply_markup = InlineKeyboardMarkup(keyboard)
+                    expiry_display = "Non scade" if expiry == "none" else _format_date(expiry)
                     
                     await update.callback_query.edit_message_text(
-                        f"✅ Elemento aggiunto all'inventario:\n\n"
-                        f"- {user_data.temp_food_item['name']} ({user_data.temp_food_item['category']})\n"
-                        f"- Quantità: {user_data.temp_food_item['quantity']} {user_data.temp_food_item['unit']}\n"
-                        f"- Scadenza: {expiry_display}\n\n"
-                        f"Cosa vuoi fare ora?",
-                        reply_markup=reply_markup
+                        FOOD_ADDED_TEMPLATE.format(expiry=expiry_display, **user_data.temp_food_item),
+                        reply_markup=self._keyboards["food_added"]
                     )
-                    
-                    # Resetta i dati temporanei e il contesto
-                    user_data.temp_food_item = {}
-                    user_data.current_context = None
-                    
                 else:
                     await update.callback_query.edit_message_text(
                         "❌ Si è verificato un errore durante l'aggiunta dell'elemento. Riprova più tardi."
                     )
-                    
-                    # Resetta i dati temporanei e il contesto
-                    user_data.temp_food_item = {}
-                    user_data.current_context = None
+                
+                # Resetta i dati temporanei e il contesto
+                user_data.clear_temp_data()
             
         elif callback_data.startswith("import:"):
             # Gestione callback per l'importazione dei dati
@@ -1449,8 +2056,7 @@ class ChatGPTTelegramBot:
                     "Per tornare al menu principale, usa /menu."
                 )
                 
-                keyboard = [[InlineKeyboardButton("🔙 Menu principale", callback_data="menu:back")]]
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = self._keyboards["back_to_menu"]
                 
                 await update.callback_query.edit_message_text(
                     text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN
@@ -1458,22 +2064,7 @@ class ChatGPTTelegramBot:
                 
         elif action == "back":
             # Torna al menu principale
-            keyboard = [
-                [
-                    InlineKeyboardButton("🍎 Inventario Alimentare", callback_data="menu:inventory"),
-                    InlineKeyboardButton("🍽️ Piani Alimentari", callback_data="menu:meal_plans")
-                ],
-                [
-                    InlineKeyboardButton("🛒 Lista della Spesa", callback_data="menu:shopping"),
-                    InlineKeyboardButton("❤️ Monitoraggio Sanitario", callback_data="menu:health")
-                ],
-                [
-                    InlineKeyboardButton("⚙️ Impostazioni", callback_data="menu:settings"),
-                    InlineKeyboardButton("❓ Aiuto", callback_data="menu:help")
-                ]
-            ]
-            
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = self._keyboards["main_menu"]
             
             await update.callback_query.edit_message_text(
                 "🔍 *Menu Principale*\n\n"
@@ -1482,41 +2073,16 @@ class ChatGPTTelegramBot:
                 parse_mode=ParseMode.MARKDOWN
             )
     
-    async def show_inventory_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE, edit: bool = False):
+    async def _send_menu(self, update: Update, text: str, reply_markup: InlineKeyboardMarkup, edit: bool):
         """
-        Mostra il menu dell'inventario alimentare.
+        Invia un menu, modificando il messaggio del pulsante premuto se richiesto.
         
         Args:
             update: Oggetto update di Telegram
-            context: Contesto della conversazione
+            text: Testo del menu in formato Markdown
+            reply_markup: Tastiera del menu
             edit: Se True, modifica il messaggio esistente invece di inviarne uno nuovo
         """
-        keyboard = [
-            [
-                InlineKeyboardButton("➕ Aggiungi alimento", callback_data="inventory:add"),
-                InlineKeyboardButton("🔍 Visualizza inventario", callback_data="inventory:view")
-            ],
-            [
-                InlineKeyboardButton("⚠️ Alimenti in scadenza", callback_data="inventory:expiring"),
-                InlineKeyboardButton("🗑️ Elimina alimento", callback_data="inventory:delete")
-            ],
-            [
-                InlineKeyboardButton("🔍 Cerca per categoria", callback_data="inventory:search"),
-                InlineKeyboardButton("📊 Statistiche inventario", callback_data="inventory:stats")
-            ],
-            [
-                InlineKeyboardButton("🔙 Menu principale", callback_data="menu:back")
-            ]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        text = (
-            "🍎 *Menu Inventario Alimentare*\n\n"
-            "Gestisci il tuo inventario di alimenti, tieni traccia delle scadenze "
-            "e monitora le quantità disponibili."
-        )
-        
         if edit and update.callback_query and update.callback_query.message:
             await update.callback_query.edit_message_text(
                 text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN
@@ -1526,6 +2092,19 @@ class ChatGPTTelegramBot:
                 text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN
             )
     
+    async def show_inventory_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE, edit: bool = False):
+        """
+        Mostra il menu dell'inventario alimentare.
+        
+        Args:
+            update: Oggetto update di Telegram
+            context: Contesto della conversazione
+            edit: Se True, modifica il messaggio esistente invece di inviarne uno nuovo
+        """
+        reply_markup = self._keyboards["inventory_menu"]
+        
+        await self._send_menu(update, INVENTORY_MENU_TEXT, reply_markup, edit)
+    
     async def handle_inventory_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE, action: str):
         """
         Gestisce i callback dell'inventario alimentare.
@@ -1544,9 +2123,8 @@ class ChatGPTTelegramBot:
             user_data.current_context = WAITING_FOR_FOOD_NAME
             
             await update.callback_query.edit_message_text(
-                "➕ *Aggiungi Alimento*\n\n"
-                "Inserisci il nome dell'alimento:",
-                parse_mode=ParseMode.MARKDOWN
+                "➕ Aggiungi Alimento\n\n"
+                "Inserisci il nome dell'alimento:"
             )
             
         elif action == "view":
@@ -1555,14 +2133,7 @@ class ChatGPTTelegramBot:
             
             if not inventory:
                 # Inventario vuoto
-                keyboard = [
-                    [
-                        InlineKeyboardButton("➕ Aggiungi alimento", callback_data="inventory:add"),
-                        InlineKeyboardButton("🔙 Menu inventario", callback_data="menu:inventory")
-                    ]
-                ]
-                
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = self._keyboards["inventory_empty"]
                 
                 await update.callback_query.edit_message_text(
                     "🍎 *Inventario Alimentare*\n\n"
@@ -1573,47 +2144,26 @@ class ChatGPTTelegramBot:
                 
             else:
                 # Organizza l'inventario per categoria
-                inventory_by_category = {}
+                inventory_by_category = defaultdict(list)
                 for item in inventory:
-                    category = item['category']
-                    if category not in inventory_by_category:
-                        inventory_by_category[category] = []
-                    inventory_by_category[category].append(item)
+                    inventory_by_category[item['category']].append(item)
                 
                 # Crea il messaggio
-                text = "🍎 *Inventario Alimentare*\n\n"
+                parts = ["🍎 *Inventario Alimentare*\n\n"]
+                today = datetime.date.today()
                 
                 for category, items in inventory_by_category.items():
-                    text += f"*{category}*:\n"
+                    parts.append(f"*{category}*:\n")
                     
                     for item in items:
-                        # Formatta la data di scadenza
-                        expiry = "Non scade"
-                        if item['expiry_date']:
-                            expiry_date = datetime.datetime.strptime(item['expiry_date'], DATE_FORMAT)
-                            expiry = expiry_date.strftime(DISPLAY_DATE_FORMAT)
-                            
-                            # Evidenzia se in scadenza (entro 3 giorni)
-                            days_to_expiry = (expiry_date.date() - datetime.date.today()).days
-                            if days_to_expiry <= 3 and days_to_expiry >= 0:
-                                expiry = f"⚠️ {expiry} (tra {days_to_expiry} giorni)"
-                            elif days_to_expiry < 0:
-                                expiry = f"❌ {expiry} (scaduto)"
-                        
-                        text += f"- {item['name']}: {item['quantity']} {item['unit']} (Scad: {expiry})\n"
+                        expiry = _format_expiry(item['expiry_date'], today)
+                        parts.append(f"- {item['name']}: {item['quantity']} {item['unit']} (Scad: {expiry})\n")
                     
-                    text += "\n"
+                    parts.append("\n")
                 
-                # Verifica se il messaggio è troppo lungo
-                if len(text) > MAX_MESSAGE_LENGTH:
-                    # Se troppo lungo, dividi per categorie
-                    await update.callback_query.edit_message_text(
-                        "🍎 *Inventario Alimentare*\n\n"
-                        "Il tuo inventario è molto ampio. Seleziona una categoria per visualizzarla:",
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                    
-                    # Crea una tastiera con le categorie
+                # Verifica se il messaggio è troppo lungo prima di unire i frammenti
+                if sum(map(len, parts)) > MAX_MESSAGE_LENGTH:
+                    # Se troppo lungo, mostra una tastiera con le categorie
                     keyboard = []
                     row = []
                     
@@ -1633,24 +2183,20 @@ class ChatGPTTelegramBot:
                     
                     reply_markup = InlineKeyboardMarkup(keyboard)
                     
-                    await update.callback_query.edit_message_reply_markup(reply_markup)
+                    # Testo e tastiera in un'unica modifica, per non consumare due chiamate API
+                    await update.callback_query.edit_message_text(
+                        "🍎 *Inventario Alimentare*\n\n"
+                        "Il tuo inventario è molto ampio. Seleziona una categoria per visualizzarla:",
+                        reply_markup=reply_markup,
+                        parse_mode=ParseMode.MARKDOWN
+                    )
                     
                 else:
                     # Se non troppo lungo, mostra tutto
-                    keyboard = [
-                        [
-                            InlineKeyboardButton("➕ Aggiungi alimento", callback_data="inventory:add"),
-                            InlineKeyboardButton("🔍 Cerca per categoria", callback_data="inventory:search")
-                        ],
-                        [
-                            InlineKeyboardButton("🔙 Menu inventario", callback_data="menu:inventory")
-                        ]
-                    ]
-                    
-                    reply_markup = InlineKeyboardMarkup(keyboard)
+                    reply_markup = self._keyboards["inventory_view"]
                     
                     await update.callback_query.edit_message_text(
-                        text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN
+                        "".join(parts), reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN
                     )
                     
         elif action.startswith("category:"):
@@ -1658,35 +2204,20 @@ class ChatGPTTelegramBot:
             category = action[9:]
             inventory = self.data_manager.get_food_inventory(user_id, category=category)
             
-            text = f"🍎 *Inventario Alimentare - {category}*\n\n"
+            parts = [f"🍎 *Inventario Alimentare - {category}*\n\n"]
             
             if not inventory:
-                text += f"Nessun elemento trovato nella categoria {category}."
+                parts.append(f"Nessun elemento trovato nella categoria {category}.")
             else:
+                today = datetime.date.today()
+                
                 for item in inventory:
-                    # Formatta la data di scadenza
-                    expiry = "Non scade"
-                    if item['expiry_date']:
-                        expiry_date = datetime.datetime.strptime(item['expiry_date'], DATE_FORMAT)
-                        expiry = expiry_date.strftime(DISPLAY_DATE_FORMAT)
-                        
-                        # Evidenzia se in scadenza (entro 3 giorni)
-                        days_to_expiry = (expiry_date.date() - datetime.date.today()).days
-                        if days_to_expiry <= 3 and days_to_expiry >= 0:
-                            expiry = f"⚠️ {expiry} (tra {days_to_expiry} giorni)"
-                        elif days_to_expiry < 0:
-                            expiry = f"❌ {expiry} (scaduto)"
-                    
-                    text += f"- {item['name']}: {item['quantity']} {item['unit']} (Scad: {expiry})\n"
+                    expiry = _format_expiry(item['expiry_date'], today)
+                    parts.append(f"- {item['name']}: {item['quantity']} {item['unit']} (Scad: {expiry})\n")
             
-            keyboard = [
-                [
-                    InlineKeyboardButton("🔍 Tutte le categorie", callback_data="inventory:view"),
-                    InlineKeyboardButton("🔙 Menu inventario", callback_data="menu:inventory")
-                ]
-            ]
+            text = "".join(parts)
             
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = self._keyboards["inventory_all_categories"]
             
             await update.callback_query.edit_message_text(
                 text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN
@@ -1696,22 +2227,23 @@ class ChatGPTTelegramBot:
             # Visualizza gli alimenti in scadenza (entro 7 giorni)
             inventory = self.data_manager.get_food_inventory(user_id, expiring_soon=True, days_threshold=7)
             
-            text = "⚠️ *Alimenti in Scadenza*\n\n"
+            parts = ["⚠️ *Alimenti in Scadenza*\n\n"]
             
             if not inventory:
-                text += "Non hai alimenti in scadenza nei prossimi 7 giorni."
+                parts.append("Non hai alimenti in scadenza nei prossimi 7 giorni.")
             else:
                 # Ordina per data di scadenza
                 inventory.sort(key=lambda x: x['expiry_date'] or "9999-12-31")
+                today = datetime.date.today()
                 
                 for item in inventory:
                     # Formatta la data di scadenza
                     if item['expiry_date']:
-                        expiry_date = datetime.datetime.strptime(item['expiry_date'], DATE_FORMAT)
+                        expiry_date = _parse_date(item['expiry_date'])
                         expiry = expiry_date.strftime(DISPLAY_DATE_FORMAT)
                         
                         # Calcola i giorni rimanenti
-                        days_to_expiry = (expiry_date.date() - datetime.date.today()).days
+                        days_to_expiry = (expiry_date - today).days
                         
                         if days_to_expiry < 0:
                             expiry_info = f"❌ Scaduto da {abs(days_to_expiry)} giorni"
@@ -1720,17 +2252,12 @@ class ChatGPTTelegramBot:
                         else:
                             expiry_info = f"⚠️ Scade tra {days_to_expiry} giorni"
                         
-                        text += f"- {item['name']} ({item['category']}): {item['quantity']} {item['unit']}\n"
-                        text += f"  {expiry_info} ({expiry})\n"
+                        parts.append(f"- {item['name']} ({item['category']}): {item['quantity']} {item['unit']}\n")
+                        parts.append(f"  {expiry_info} ({expiry})\n")
             
-            keyboard = [
-                [
-                    InlineKeyboardButton("🔍 Visualizza tutto", callback_data="inventory:view"),
-                    InlineKeyboardButton("🔙 Menu inventario", callback_data="menu:inventory")
-                ]
-            ]
+            text = "".join(parts)
             
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = self._keyboards["inventory_view_all"]
             
             await update.callback_query.edit_message_text(
                 text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN
@@ -1742,14 +2269,7 @@ class ChatGPTTelegramBot:
             
             if not inventory:
                 # Inventario vuoto
-                keyboard = [
-                    [
-                        InlineKeyboardButton("➕ Aggiungi alimento", callback_data="inventory:add"),
-                        InlineKeyboardButton("🔙 Menu inventario", callback_data="menu:inventory")
-                    ]
-                ]
-                
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = self._keyboards["inventory_empty"]
                 
                 await update.callback_query.edit_message_text(
                     "🍎 *Elimina Alimento*\n\n"
@@ -1759,16 +2279,14 @@ class ChatGPTTelegramBot:
                 )
                 
             else:
-                # Crea la tastiera con gli alimenti
-                keyboard = []
-                
-                for item in inventory[:8]:  # Limita a 8 elementi per non superare i limiti di Telegram
-                    keyboard.append([
-                        InlineKeyboardButton(
-                            f"{item['name']} ({item['quantity']} {item['unit']})",
-                            callback_data=f"delete:food:{item['id']}"
-                        )
-                    ])
+                # Crea la tastiera con gli alimenti (massimo 8 per non superare i limiti di Telegram)
+                keyboard = [
+                    [InlineKeyboardButton(
+                        f"{item['name']} ({item['quantity']} {item['unit']})",
+                        callback_data=f"delete:food:{item['id']}"
+                    )]
+                    for item in islice(inventory, 8)
+                ]
                 
                 # Aggiungi i pulsanti di navigazione
                 keyboard.append([
@@ -1796,14 +2314,7 @@ class ChatGPTTelegramBot:
             
             if not inventory:
                 # Inventario vuoto
-                keyboard = [
-                    [
-                        InlineKeyboardButton("➕ Aggiungi alimento", callback_data="inventory:add"),
-                        InlineKeyboardButton("🔙 Menu inventario", callback_data="menu:inventory")
-                    ]
-                ]
-                
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = self._keyboards["inventory_empty"]
                 
                 await update.callback_query.edit_message_text(
                     "🔍 *Cerca per Categoria*\n\n"
@@ -1849,14 +2360,7 @@ class ChatGPTTelegramBot:
             
             if not inventory:
                 # Inventario vuoto
-                keyboard = [
-                    [
-                        InlineKeyboardButton("➕ Aggiungi alimento", callback_data="inventory:add"),
-                        InlineKeyboardButton("🔙 Menu inventario", callback_data="menu:inventory")
-                    ]
-                ]
-                
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = self._keyboards["inventory_empty"]
                 
                 await update.callback_query.edit_message_text(
                     "📊 *Statistiche Inventario*\n\n"
@@ -1868,7 +2372,7 @@ class ChatGPTTelegramBot:
             else:
                 # Calcola statistiche
                 total_items = len(inventory)
-                categories = {}
+                categories = defaultdict(int)
                 expiring_soon = 0
                 expired = 0
                 
@@ -1876,14 +2380,11 @@ class ChatGPTTelegramBot:
                 
                 for item in inventory:
                     # Conta per categoria
-                    category = item['category']
-                    if category not in categories:
-                        categories[category] = 0
-                    categories[category] += 1
+                    categories[item['category']] += 1
                     
                     # Conta scadenze
                     if item['expiry_date']:
-                        expiry_date = datetime.datetime.strptime(item['expiry_date'], DATE_FORMAT).date()
+                        expiry_date = _parse_date(item['expiry_date'])
                         days_to_expiry = (expiry_date - today).days
                         
                         if days_to_expiry < 0:
@@ -1892,7 +2393,7 @@ class ChatGPTTelegramBot:
                             expiring_soon += 1
                 
                 # Crea il messaggio
-                text = (
+                parts = [
                     "📊 *Statistiche Inventario*\n\n"
                     f"📦 Totale elementi: {total_items}\n"
                     f"🏷️ Categorie: {len(categories)}\n"
@@ -1900,24 +2401,16 @@ class ChatGPTTelegramBot:
                     f"❌ Scaduti: {expired}\n\n"
                     
                     "*Distribuzione per categoria:*\n"
-                )
+                ]
                 
                 # Aggiungi distribuzione per categoria
                 for category, count in categories.items():
                     percentage = round((count / total_items) * 100)
-                    text += f"- {category}: {count} ({percentage}%)\n"
+                    parts.append(f"- {category}: {count} ({percentage}%)\n")
                 
-                keyboard = [
-                    [
-                        InlineKeyboardButton("⚠️ Alimenti in scadenza", callback_data="inventory:expiring"),
-                        InlineKeyboardButton("🔍 Visualizza inventario", callback_data="inventory:view")
-                    ],
-                    [
-                        InlineKeyboardButton("🔙 Menu inventario", callback_data="menu:inventory")
-                    ]
-                ]
+                text = "".join(parts)
                 
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = self._keyboards["inventory_stats"]
                 
                 await update.callback_query.edit_message_text(
                     text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN
@@ -1958,19 +2451,17 @@ class ChatGPTTelegramBot:
             reply_markup = InlineKeyboardMarkup(keyboard)
             
             # Formatta la data di scadenza
-            expiry = "Non scade"
-            if item['expiry_date']:
-                expiry_date = datetime.datetime.strptime(item['expiry_date'], DATE_FORMAT)
-                expiry = expiry_date.strftime(DISPLAY_DATE_FORMAT)
+            expiry = _format_date(item['expiry_date']) if item['expiry_date'] else "Non scade"
             
+            # Testo semplice: nome e categoria sono inseriti dall'utente e potrebbero
+            # contenere caratteri speciali del Markdown
             await update.callback_query.edit_message_text(
-                f"⚠️ *Conferma Eliminazione*\n\n"
-                f"Sei sicuro di voler eliminare questo elemento?\n\n"
+                "⚠️ Conferma Eliminazione\n\n"
+                "Sei sicuro di voler eliminare questo elemento?\n\n"
                 f"- {item['name']} ({item['category']})\n"
                 f"- Quantità: {item['quantity']} {item['unit']}\n"
                 f"- Scadenza: {expiry}",
-                reply_markup=reply_markup,
-                parse_mode=ParseMode.MARKDOWN
+                reply_markup=reply_markup
             )
     
     async def handle_confirmation_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE, action: str):
@@ -1992,14 +2483,7 @@ class ChatGPTTelegramBot:
             success = self.data_manager.delete_food_item(item_id)
             
             if success:
-                keyboard = [
-                    [
-                        InlineKeyboardButton("🔍 Visualizza inventario", callback_data="inventory:view"),
-                        InlineKeyboardButton("🔙 Menu inventario", callback_data="menu:inventory")
-                    ]
-                ]
-                
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = self._keyboards["inventory_back_to_view"]
                 
                 await update.callback_query.edit_message_text(
                     "✅ Elemento eliminato con successo!",
@@ -2007,14 +2491,7 @@ class ChatGPTTelegramBot:
                 )
                 
             else:
-                keyboard = [
-                    [
-                        InlineKeyboardButton("↩️ Riprova", callback_data="inventory:delete"),
-                        InlineKeyboardButton("🔙 Menu inventario", callback_data="menu:inventory")
-                    ]
-                ]
-                
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = self._keyboards["inventory_after_delete"]
                 
                 await update.callback_query.edit_message_text(
                     "❌ Si è verificato un errore durante l'eliminazione dell'elemento. Riprova più tardi.",
@@ -2160,16 +2637,12 @@ class ChatGPTTelegramBot:
                 else:
                     await update.callback_query.edit_message_text(
                         "✅ Elemento completato con successo!",
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("🔙 Menu liste della spesa", callback_data="menu:shopping")
-                        ]])
+                        reply_markup=self._keyboards["back_to_shopping"]
                     )
             else:
                 await update.callback_query.edit_message_text(
                     "❌ Si è verificato un errore durante l'aggiornamento dell'elemento. Riprova più tardi.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Menu liste della spesa", callback_data="menu:shopping")
-                    ]])
+                    reply_markup=self._keyboards["back_to_shopping"]
                 )
     
     async def handle_pagination_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE, action: str):
@@ -2205,16 +2678,18 @@ class ChatGPTTelegramBot:
             current_page_items = inventory[start_idx:end_idx]
             
             # Crea il messaggio
-            text = "🍎 *Inventario Alimentare*\n\n"
+            text_parts = ["🍎 *Inventario Alimentare*\n\n"]
             
             for item in current_page_items:
                 # Formatta la data di scadenza
                 expiry = "Non scade"
                 if item['expiry_date']:
-                    expiry_date = datetime.datetime.strptime(item['expiry_date'], DATE_FORMAT)
+                    expiry_date = _parse_date(item['expiry_date'])
                     expiry = expiry_date.strftime(DISPLAY_DATE_FORMAT)
                 
-                text += f"- {item['name']} ({item['category']}): {item['quantity']} {item['unit']} (Scad: {expiry})\n"
+                text_parts.append(f"- {item['name']} ({item['category']}): {item['quantity']} {item['unit']} (Scad: {expiry})\n")
+            
+            text = "".join(text_parts)
             
             # Crea la tastiera con i pulsanti di navigazione
             keyboard = []
@@ -2273,66 +2748,101 @@ class ChatGPTTelegramBot:
         try:
             # Aggiorna la cronologia delle conversazioni
             current_time = datetime.datetime.now()
+            conversation = user_data.conversation_history
+            
+            # Gli stati salvati dalla persistenza prima dell'uso di deque hanno ancora una lista
+            if not isinstance(conversation, deque):
+                conversation = user_data.conversation_history = deque(
+                    conversation, maxlen=MAX_CONVERSATION_HISTORY
+                )
             
             # Resetta la cronologia se è passato troppo tempo dall'ultima interazione
             if (current_time - user_data.last_interaction_time).total_seconds() > 30 * 60:  # 30 minuti
-                user_data.conversation_history = []
+                conversation.clear()
             
             user_data.last_interaction_time = current_time
             
             # Aggiungi il messaggio utente alla cronologia
-            user_data.conversation_history.append({"role": "user", "content": message_text})
+            conversation.append({"role": "user", "content": message_text})
             
             # Prepara il contesto per Claude
-            # Ottieni informazioni utente dal database
-            user_preferences = self.data_manager.get_all_user_preferences(user_id)
-            health_conditions = self.data_manager.get_health_conditions(user_id)
-            dietary_restrictions = self.data_manager.get_dietary_restrictions(user_id)
+            # Ottieni le informazioni sanitarie dal database in un solo passaggio
+            health_profile = await asyncio.to_thread(
+                self.data_manager.get_health_profile, user_id, include_supplements=False
+            )
+            health_conditions = health_profile["conditions"]
+            dietary_restrictions = health_profile["restrictions"]
             
             # Crea un prompt di sistema personalizzato
-            system_prompt = (
-                "Sei Claude, un assistente personale specializzato in nutrizione, piani alimentari e salute. "
-                "Aiuti l'utente a gestire il proprio inventario alimentare, creare piani alimentari, "
-                "generare liste della spesa e monitorare la propria salute."
-            )
+            prompt_parts = [BASE_SYSTEM_PROMPT]
             
             # Aggiungi informazioni sanitarie se disponibili
             if health_conditions or dietary_restrictions:
-                system_prompt += "\n\nInformazioni sanitarie dell'utente:"
+                prompt_parts.append("\n\nInformazioni sanitarie dell'utente:")
                 
                 if health_conditions:
-                    system_prompt += "\nCondizioni mediche:"
+                    prompt_parts.append("\nCondizioni mediche:")
                     for condition in health_conditions:
-                        system_prompt += f"\n- {condition['name']}"
+                        prompt_parts.append(f"\n- {condition['name']}")
                         if condition.get('description'):
-                            system_prompt += f": {condition['description']}"
+                            prompt_parts.append(f": {condition['description']}")
                 
                 if dietary_restrictions:
-                    system_prompt += "\nRestrizioni alimentari:"
+                    prompt_parts.append("\nRestrizioni alimentari:")
                     for restriction in dietary_restrictions:
-                        system_prompt += f"\n- {restriction['name']} ({restriction['food_type']})"
+                        prompt_parts.append(f"\n- {restriction['name']} ({restriction['food_type']})")
                         if restriction.get('reason'):
-                            system_prompt += f": {restriction['reason']}"
+                            prompt_parts.append(f": {restriction['reason']}")
             
-            # Chiama l'API di Claude
-            response = await self.anthropic.simple_query(
-                text=message_text,
-                system=system_prompt,
-                conversation_history=user_data.conversation_history[-5:] if len(user_data.conversation_history) > 1 else None
-            )
+            system_prompt = "".join(prompt_parts)
+            
+            # Messaggi precedenti, escluso quello appena aggiunto
+            history = list(islice(conversation, max(len(conversation) - 6, 0), len(conversation) - 1)) or None
+            
+            if self.stream:
+                # Mostra la risposta man mano che Claude la genera
+                response = await asyncio.wait_for(
+                    self._stream_claude_reply(waiting_message, context.bot, message_text, system_prompt, history),
+                    timeout=CLAUDE_TIMEOUT_SECONDS
+                )
+            else:
+                # Chiama l'API di Claude, mostrando "sta scrivendo" durante l'attesa
+                async with self._show_typing(context.bot, update.message.chat_id):
+                    response = await asyncio.wait_for(
+                        self.anthropic.simple_query(
+                            text=message_text,
+                            system=system_prompt,
+                            conversation_history=history
+                        ),
+                        timeout=CLAUDE_TIMEOUT_SECONDS
+                    )
+                
+                if response.strip():
+                    # Elimina il messaggio di attesa
+                    await context.bot.delete_message(
+                        chat_id=update.message.chat_id,
+                        message_id=waiting_message.message_id
+                    )
+                    
+                    # Invia la risposta
+                    await self.send_large_message(update.message.chat_id, response, context.bot)
+                else:
+                    await waiting_message.edit_text(EMPTY_RESPONSE_TEXT)
+            
+            # Aggiungi la risposta alla cronologia (la deque scarta i messaggi più vecchi);
+            # una risposta vuota verrebbe rifiutata dall'API al turno successivo
+            if response.strip():
+                conversation.append({"role": "assistant", "content": response})
             
-            # Aggiungi la risposta alla cronologia
-            user_data.conversation_history.append({"role": "assistant", "content": response})
+        except asyncio.TimeoutError:
+            logger.error("Timeout durante l'elaborazione con Claude")
             
-            # Elimina il messaggio di attesa
-            await context.bot.delete_message(
+            await context.bot.edit_message_text(
                 chat_id=update.message.chat_id,
-                message_id=waiting_message.message_id
+                message_id=waiting_message.message_id,
+                text="⏱️ Claude sta impiegando troppo tempo a rispondere. Riprova più tardi."
             )
             
-            # Invia la risposta
-            await self.send_large_message(update.message.chat_id, response, context.bot)
-            
         except ClaudeException as e:
             logger.error(f"Errore durante l'elaborazione con Claude: {str(e)}")
             
@@ -2351,6 +2861,75 @@ class ChatGPTTelegramBot:
                 text="❌ Si è verificato un errore durante l'elaborazione del messaggio. Riprova più tardi."
             )
     
+    async def _stream_claude_reply(self, message: Message, bot: Bot, text: str,
+                                   system: Optional[str], history: Optional[List[Dict[str, str]]]) -> str:
+        """
+        Ottiene la risposta di Claude in streaming aggiornando un messaggio esistente.
+        
+        La lettura dello stream e gli aggiornamenti del messaggio sono separati:
+        un task dedicato modifica il messaggio ogni STREAM_EDIT_INTERVAL_SECONDS con
+        il testo ricevuto fino a quel momento, senza rallentare la ricezione.
+        
+        Args:
+            message: Messaggio da aggiornare con la risposta parziale
+            bot: Istanza del bot Telegram
+            text: Testo della richiesta dell'utente
+            system: Prompt di sistema
+            history: Messaggi precedenti della conversazione
+            
+        Returns:
+            str: Testo completo della risposta
+        """
+        chunks = []
+        shown = ""
+        
+        async def edit_partial():
+            nonlocal shown
+            while True:
+                await asyncio.sleep(STREAM_EDIT_INTERVAL_SECONDS)
+                
+                # Testo parziale senza Markdown: potrebbe contenere entità non chiuse
+                partial = "".join(chunks)[:MAX_MESSAGE_LENGTH]
+                if partial.strip() and partial != shown:
+                    try:
+                        await message.edit_text(partial)
+                        shown = partial
+                    except TelegramError as e:
+                        # Errori di rete o limiti di frequenza: riprova al giro successivo
+                        logger.warning(f"Aggiornamento parziale della risposta non riuscito: {str(e)}")
+        
+        editor = asyncio.create_task(edit_partial())
+        try:
+            async for delta in self.anthropic.stream_query(
+                text=text, system=system, conversation_history=history
+            ):
+                chunks.append(delta)
+        finally:
+            # Ferma gli aggiornamenti parziali (anche una modifica in corso) prima di quella finale
+            editor.cancel()
+            await asyncio.gather(editor, return_exceptions=True)
+        
+        response = "".join(chunks)
+        
+        if len(response) > MAX_MESSAGE_LENGTH:
+            # Troppo lungo per un solo messaggio: invia le parti separatamente
+            await bot.delete_message(chat_id=message.chat_id, message_id=message.message_id)
+            await self.send_large_message(message.chat_id, response, bot)
+        elif response.strip():
+            try:
+                await message.edit_text(response, parse_mode=ParseMode.MARKDOWN)
+            except BadRequest as e:
+                if "not modified" in str(e):
+                    pass
+                elif response != shown:
+                    # Markdown non valido: mostra il testo così com'è
+                    await message.edit_text(response)
+        else:
+            # Risposta vuota: sostituisci il messaggio di attesa
+            await message.edit_text(EMPTY_RESPONSE_TEXT)
+        
+        return response
+    
     async def send_large_message(self, chat_id: int, text: str, bot: Bot):
         """
         Invia un messaggio grande dividendolo in più parti se necessario.
@@ -2367,13 +2946,8 @@ class ChatGPTTelegramBot:
                 parse_mode=ParseMode.MARKDOWN
             )
         else:
-            # Dividi il messaggio in parti più piccole
-            parts = []
-            for i in range(0, len(text), MAX_MESSAGE_LENGTH):
-                parts.append(text[i:i + MAX_MESSAGE_LENGTH])
-            
-            # Invia ogni parte
-            for part in parts:
+            # Invia le parti man mano che vengono prodotte, tagliando a fine riga
+            for part in _split_message(text):
                 await bot.send_message(
                     chat_id=chat_id,
                     text=part,
@@ -2414,47 +2988,43 @@ class ChatGPTTelegramBot:
             
         else:
             # Organizza gli elementi per categoria
-            items_by_category = {}
+            items_by_category = defaultdict(list)
             for item in items:
-                category = item['category'] or "Altro"
-                if category not in items_by_category:
-                    items_by_category[category] = []
-                items_by_category[category].append(item)
+                items_by_category[item['category'] or "Altro"].append(item)
             
             # Crea il messaggio
-            text = "🛒 *Lista della Spesa*\n\n"
+            parts = ["🛒 *Lista della Spesa*\n\n"]
             
             for category, cat_items in items_by_category.items():
-                text += f"*{category}*:\n"
+                parts.append(f"*{category}*:\n")
                 
                 for item in cat_items:
                     # Formatta l'elemento
                     check = "✅ " if item['completed'] else "☐ "
                     quantity_text = f" ({item['quantity']} {item['unit']})" if item['quantity'] and item['unit'] else ""
                     
-                    text += f"{check}{item['name']}{quantity_text}\n"
+                    parts.append(f"{check}{item['name']}{quantity_text}\n")
                 
-                text += "\n"
+                parts.append("\n")
+            
+            text = "".join(parts)
             
             # Crea la tastiera
             keyboard = []
             
             # Pulsanti per gli elementi da completare
-            incomplete_items = [item for item in items if not item['completed']]
+            # (bastano i primi 5 elementi non completati per la selezione rapida)
+            incomplete_items = list(islice((item for item in items if not item['completed']), 5))
             
             if incomplete_items:
                 keyboard.append([
                     InlineKeyboardButton("✅ Segna tutti come completati", callback_data=f"shop:complete_all:{list_id}")
                 ])
                 
-                # Mostra fino a 5 elementi non completati per la selezione rapida
-                for item in incomplete_items[:5]:
-                    keyboard.append([
-                        InlineKeyboardButton(
-                            f"✅ {item['name']}",
-                            callback_data=f"complete:shopping_item:{item['id']}"
-                        )
-                    ])
+                keyboard.extend(
+                    [InlineKeyboardButton(f"✅ {item['name']}", callback_data=f"complete:shopping_item:{item['id']}")]
+                    for item in incomplete_items
+                )
             
             # Pulsanti di azione
             keyboard.append([
@@ -2544,37 +3114,9 @@ class ChatGPTTelegramBot:
         """
         user_id = update.effective_user.id
         
-        # Crea la tastiera inline per il menu
-        keyboard = [
-            [
-                InlineKeyboardButton("➕ Crea piano alimentare", callback_data="meal:create"),
-                InlineKeyboardButton("🔍 Visualizza piani", callback_data="meal:view_plans")
-            ],
-            [
-                InlineKeyboardButton("📆 Piano di oggi", callback_data="meal:today"),
-                InlineKeyboardButton("📊 Statistiche nutrizionali", callback_data="meal:stats")
-            ],
-            [
-                InlineKeyboardButton("🔙 Menu principale", callback_data="menu:back")
-            ]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        text = (
-            "🍽️ *Menu Piani Alimentari*\n\n"
-            "Crea e gestisci i tuoi piani alimentari, visualizza i pasti programmati "
-            "e monitora il tuo apporto nutrizionale."
-        )
+        reply_markup = self._keyboards["meal_plan_menu"]
         
-        if edit and update.callback_query and update.callback_query.message:
-            await update.callback_query.edit_message_text(
-                text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN
-            )
-        else:
-            await update.message.reply_text(
-                text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN
-            )
+        await self._send_menu(update, MEAL_PLAN_MENU_TEXT, reply_markup, edit)
     
     # Implementazione del menu delle liste della spesa
     async def show_shopping_list_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE, edit: bool = False):
@@ -2601,10 +3143,16 @@ class ChatGPTTelegramBot:
         # Aggiungi le liste esistenti se presenti
         if shopping_lists:
             # Mostra solo le prime 5 liste per non superare i limiti di Telegram
-            for shopping_list in shopping_lists[:5]:
+            shown_lists = shopping_lists[:5]
+            
+            # Conteggi degli articoli di tutte le liste mostrate in un'unica query
+            counts = self.data_manager.get_shopping_list_counts([l['id'] for l in shown_lists])
+            
+            for shopping_list in shown_lists:
+                total_items, completed_items = counts.get(shopping_list['id'], (0, 0))
                 keyboard.append([
                     InlineKeyboardButton(
-                        f"📋 {shopping_list['name']}",
+                        f"📋 {shopping_list['name']} ({completed_items}/{total_items})",
                         callback_data=f"shop:view_list:{shopping_list['id']}"
                     )
                 ])
@@ -2626,20 +3174,7 @@ class ChatGPTTelegramBot:
         
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        text = (
-            "🛒 *Menu Liste della Spesa*\n\n"
-            "Crea e gestisci le tue liste della spesa, aggiungi articoli "
-            "e tieni traccia degli acquisti."
-        )
-        
-        if edit and update.callback_query and update.callback_query.message:
-            await update.callback_query.edit_message_text(
-                text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN
-            )
-        else:
-            await update.message.reply_text(
-                text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN
-            )
+        await self._send_menu(update, SHOPPING_MENU_TEXT, reply_markup, edit)
     
     # Implementazione del menu del monitoraggio sanitario
     async def show_health_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE, edit: bool = False):
@@ -2653,41 +3188,9 @@ class ChatGPTTelegramBot:
         """
         user_id = update.effective_user.id
         
-        # Crea la tastiera inline per il menu
-        keyboard = [
-            [
-                InlineKeyboardButton("➕ Aggiungi condizione", callback_data="health:add_condition"),
-                InlineKeyboardButton("🍽️ Restrizioni alimentari", callback_data="health:dietary")
-            ],
-            [
-                InlineKeyboardButton("💊 Integratori", callback_data="health:supplements"),
-                InlineKeyboardButton("📋 Referti medici", callback_data="health:reports")
-            ],
-            [
-                InlineKeyboardButton("🔍 Riepilogo sanitario", callback_data="health:summary"),
-                InlineKeyboardButton("🔄 Aggiorna dati", callback_data="health:update")
-            ],
-            [
-                InlineKeyboardButton("🔙 Menu principale", callback_data="menu:back")
-            ]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        text = (
-            "❤️ *Menu Monitoraggio Sanitario*\n\n"
-            "Tieni traccia delle tue condizioni mediche, restrizioni alimentari, "
-            "integratori e referti per ricevere consigli personalizzati."
-        )
+        reply_markup = self._keyboards["health_menu"]
         
-        if edit and update.callback_query and update.callback_query.message:
-            await update.callback_query.edit_message_text(
-                text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN
-            )
-        else:
-            await update.message.reply_text(
-                text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN
-            )
+        await self._send_menu(update, HEALTH_MENU_TEXT, reply_markup, edit)
     
     # Gestisce i callback dei piani alimentari
     async def handle_meal_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE, action: str):
@@ -2708,9 +3211,8 @@ class ChatGPTTelegramBot:
             user_data.current_context = WAITING_FOR_MEAL_PLAN_NAME
             
             await update.callback_query.edit_message_text(
-                "➕ *Crea Piano Alimentare*\n\n"
-                "Inserisci un nome per il piano alimentare:",
-                parse_mode=ParseMode.MARKDOWN
+                "➕ Crea Piano Alimentare\n\n"
+                "Inserisci un nome per il piano alimentare:"
             )
             
         elif action == "view_plans":
@@ -2719,14 +3221,7 @@ class ChatGPTTelegramBot:
             
             if not meal_plans:
                 # Nessun piano trovato
-                keyboard = [
-                    [
-                        InlineKeyboardButton("➕ Crea piano", callback_data="meal:create"),
-                        InlineKeyboardButton("🔙 Menu piani", callback_data="menu:meal_plans")
-                    ]
-                ]
-                
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = self._keyboards["meal_plans_empty"]
                 
                 await update.callback_query.edit_message_text(
                     "🍽️ *Piani Alimentari*\n\n"
@@ -2737,31 +3232,19 @@ class ChatGPTTelegramBot:
                 
             else:
                 # Mostra la lista dei piani
-                text = "🍽️ *I Tuoi Piani Alimentari*\n\n"
+                parts = ["🍽️ *I Tuoi Piani Alimentari*\n\n"]
                 
                 for plan in meal_plans:
                     # Formatta le date
-                    start_date = datetime.datetime.strptime(plan['start_date'], DATE_FORMAT).strftime(DISPLAY_DATE_FORMAT)
-                    end_date = datetime.datetime.strptime(plan['end_date'], DATE_FORMAT).strftime(DISPLAY_DATE_FORMAT)
+                    start_date = _format_date(plan['start_date'])
+                    end_date = _format_date(plan['end_date'])
                     
-                    text += f"📋 *{plan['name']}*\n"
-                    text += f"📅 Dal {start_date} al {end_date}\n\n"
-                
-                # Crea la tastiera con i piani
-                keyboard = []
-                
-                for plan in meal_plans[:5]:  # Mostra solo i primi 5 piani
-                    keyboard.append([
-                        InlineKeyboardButton(plan['name'], callback_data=f"meal:view_plan:{plan['id']}")
-                    ])
+                    parts.append(f"📋 *{plan['name']}*\n")
+                    parts.append(f"📅 Dal {start_date} al {end_date}\n\n")
                 
-                # Aggiungi pulsanti di navigazione
-                keyboard.append([
-                    InlineKeyboardButton("➕ Crea piano", callback_data="meal:create"),
-                    InlineKeyboardButton("🔙 Menu piani", callback_data="menu:meal_plans")
-                ])
+                text = "".join(parts)
                 
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = self._meal_plans_keyboard(meal_plans)
                 
                 await update.callback_query.edit_message_text(
                     text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN
@@ -2769,19 +3252,13 @@ class ChatGPTTelegramBot:
                 
         elif action == "today":
             # Visualizza i pasti pianificati per oggi
-            today = datetime.date.today().strftime(DATE_FORMAT)
+            today_date = datetime.date.today()
+            today = today_date.strftime(DATE_FORMAT)
             meals = self.data_manager.get_meals_for_date(user_id, today)
             
             if not meals:
                 # Nessun pasto pianificato
-                keyboard = [
-                    [
-                        InlineKeyboardButton("➕ Aggiungi pasto", callback_data="meal:add_today"),
-                        InlineKeyboardButton("🔙 Menu piani", callback_data="menu:meal_plans")
-                    ]
-                ]
-                
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = self._keyboards["meal_today_empty"]
                 
                 await update.callback_query.edit_message_text(
                     "🍽️ *Pasti di Oggi*\n\n"
@@ -2792,52 +3269,41 @@ class ChatGPTTelegramBot:
                 
             else:
                 # Mostra i pasti di oggi
-                today_display = datetime.date.today().strftime(DISPLAY_DATE_FORMAT)
+                today_display = today_date.strftime(DISPLAY_DATE_FORMAT)
                 
-                text = f"🍽️ *Pasti di Oggi ({today_display})*\n\n"
+                parts = [f"🍽️ *Pasti di Oggi ({today_display})*\n\n"]
                 
-                # Organizza i pasti per tipo
-                meal_types = {
-                    "colazione": "🌅 *Colazione*",
-                    "pranzo": "☀️ *Pranzo*",
-                    "cena": "🌙 *Cena*",
-                    "spuntino": "🍎 *Spuntino*"
-                }
+                # Organizza i pasti per tipo con un solo passaggio sulla lista
+                meals_by_type = {}
+                for meal in meals:
+                    meals_by_type.setdefault(meal['meal_type'].lower(), []).append(meal)
                 
-                for meal_type, title in meal_types.items():
-                    type_meals = [m for m in meals if m['meal_type'].lower() == meal_type]
+                for meal_type, title in _MEAL_TYPE_TITLES.items():
+                    type_meals = meals_by_type.get(meal_type)
                     
                     if type_meals:
-                        text += f"{title}\n"
+                        parts.append(f"{title}\n")
                         
                         for meal in type_meals:
-                            text += f"- {meal['description']}\n"
+                            parts.append(f"- {meal['description']}\n")
                             
                             # Aggiungi informazioni nutrizionali se presenti
                             if meal['nutrition_info']:
                                 try:
                                     nutrition = json.loads(meal['nutrition_info'])
-                                    text += f"  📊 {nutrition.get('calories', '?')} kcal, "
-                                    text += f"🥩 {nutrition.get('protein', '?')}g, "
-                                    text += f"🍞 {nutrition.get('carbs', '?')}g, "
-                                    text += f"🧈 {nutrition.get('fat', '?')}g\n"
+                                    parts.append(f"  📊 {nutrition.get('calories', '?')} kcal, ")
+                                    parts.append(f"🥩 {nutrition.get('protein', '?')}g, ")
+                                    parts.append(f"🍞 {nutrition.get('carbs', '?')}g, ")
+                                    parts.append(f"🧈 {nutrition.get('fat', '?')}g\n")
                                 except json.JSONDecodeError:
                                     pass
                         
-                        text += "\n"
+                        parts.append("\n")
                 
-                # Crea la tastiera
-                keyboard = [
-                    [
-                        InlineKeyboardButton("➕ Aggiungi pasto", callback_data="meal:add_today"),
-                        InlineKeyboardButton("📆 Cambia data", callback_data="meal:select_date")
-                    ],
-                    [
-                        InlineKeyboardButton("🔙 Menu piani", callback_data="menu:meal_plans")
-                    ]
-                ]
+                text = "".join(parts)
                 
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                # Crea la tastiera
+                reply_markup = self._keyboards["meal_today"]
                 
                 await update.callback_query.edit_message_text(
                     text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN
@@ -2862,9 +3328,8 @@ class ChatGPTTelegramBot:
             user_data.current_context = WAITING_FOR_SHOPPING_LIST_NAME
             
             await update.callback_query.edit_message_text(
-                "➕ *Crea Lista della Spesa*\n\n"
-                "Inserisci un nome per la lista della spesa:",
-                parse_mode=ParseMode.MARKDOWN
+                "➕ Crea Lista della Spesa\n\n"
+                "Inserisci un nome per la lista della spesa:"
             )
             
         elif action == "view_all":
@@ -2873,14 +3338,7 @@ class ChatGPTTelegramBot:
             
             if not shopping_lists:
                 # Nessuna lista trovata
-                keyboard = [
-                    [
-                        InlineKeyboardButton("➕ Crea lista", callback_data="shop:create"),
-                        InlineKeyboardButton("🔙 Menu liste", callback_data="menu:shopping")
-                    ]
-                ]
-                
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = self._keyboards["shopping_empty"]
                 
                 await update.callback_query.edit_message_text(
                     "🛒 *Liste della Spesa*\n\n"
@@ -2891,16 +3349,23 @@ class ChatGPTTelegramBot:
                 
             else:
                 # Mostra la lista delle liste della spesa
-                text = "🛒 *Le Tue Liste della Spesa*\n\n"
+                parts = ["🛒 *Le Tue Liste della Spesa*\n\n"]
+                
+                # Conteggi degli articoli di tutte le liste in un'unica query
+                counts = self.data_manager.get_shopping_list_counts([l['id'] for l in shopping_lists])
                 
                 for shopping_list in shopping_lists:
-                    created_at = datetime.datetime.strptime(
-                        shopping_list['created_at'].split('.')[0],  # Rimuovi i millisecondi
-                        "%Y-%m-%d %H:%M:%S"
-                    ).strftime("%d/%m/%Y")
+                    # Solo la parte di data del timestamp (YYYY-MM-DD HH:MM:SS)
+                    created_at = _format_date(shopping_list['created_at'])
                     
-                    text += f"📋 *{shopping_list['name']}*\n"
-                    text += f"📅 Creata il {created_at}\n\n"
+                    total_items, completed_items = counts.get(shopping_list['id'], (0, 0))
+                    completion_percentage = 100 * completed_items // total_items if total_items else 0
+                    
+                    parts.append(f"📋 *{shopping_list['name']}*\n")
+                    parts.append(f"📅 Creata il {created_at}\n")
+                    parts.append(f"✅ {completed_items}/{total_items} articoli ({completion_percentage}%)\n\n")
+                
+                text = "".join(parts)
                 
                 # Crea la tastiera con le liste
                 keyboard = []
@@ -2930,14 +3395,7 @@ class ChatGPTTelegramBot:
         elif action == "generate":
             # Genera una lista della spesa dall'inventario
             # Chiedi conferma prima di generare
-            keyboard = [
-                [
-                    InlineKeyboardButton("✅ Sì, genera", callback_data="shop:generate_confirm"),
-                    InlineKeyboardButton("❌ No, annulla", callback_data="menu:shopping")
-                ]
-            ]
-            
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = self._keyboards["shopping_generate_confirm"]
             
             await update.callback_query.edit_message_text(
                 "🔄 *Genera Lista della Spesa*\n\n"
@@ -2955,14 +3413,7 @@ class ChatGPTTelegramBot:
                 await self.show_shopping_list_items(update, context, list_id)
             else:
                 # Errore nella generazione
-                keyboard = [
-                    [
-                        InlineKeyboardButton("↩️ Riprova", callback_data="shop:generate"),
-                        InlineKeyboardButton("🔙 Menu liste", callback_data="menu:shopping")
-                    ]
-                ]
-                
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = self._keyboards["shopping_generate_retry"]
                 
                 await update.callback_query.edit_message_text(
                     "❌ Si è verificato un errore durante la generazione della lista della spesa. Riprova più tardi.",
@@ -2976,22 +3427,16 @@ class ChatGPTTelegramBot:
             user_data.current_context = WAITING_FOR_SHOPPING_ITEM_NAME
             
             await update.callback_query.edit_message_text(
-                "➕ *Aggiungi Articolo*\n\n"
-                "Inserisci il nome dell'articolo:",
-                parse_mode=ParseMode.MARKDOWN
+                "➕ Aggiungi Articolo\n\n"
+                "Inserisci il nome dell'articolo:"
             )
             
         elif action.startswith("complete_all:"):
             # Marca tutti gli elementi della lista come completati
             list_id = int(action[12:])
             
-            # Ottieni tutti gli elementi non completati
-            items = self.data_manager.get_shopping_list_items(list_id, include_completed=False)
-            
-            success = True
-            for item in items:
-                if not self.data_manager.mark_shopping_item_as_completed(item['id'], completed=True):
-                    success = False
+            # Aggiorna tutti gli elementi non completati con un'unica query
+            success = self.data_manager.mark_all_shopping_items_as_completed(list_id, completed=True)
             
             if success:
                 # Aggiorna la vista della lista
@@ -2999,9 +3444,7 @@ class ChatGPTTelegramBot:
             else:
                 await update.callback_query.edit_message_text(
                     "❌ Si è verificato un errore durante l'aggiornamento degli elementi. Riprova più tardi.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Menu liste", callback_data="menu:shopping")
-                    ]])
+                    reply_markup=self._keyboards["back_to_shopping_lists"]
                 )
     
     # Gestisce i callback del monitoraggio sanitario
@@ -3023,19 +3466,18 @@ class ChatGPTTelegramBot:
             user_data.current_context = WAITING_FOR_HEALTH_CONDITION_NAME
             
             await update.callback_query.edit_message_text(
-                "➕ *Aggiungi Condizione Medica*\n\n"
-                "Inserisci il nome della condizione:",
-                parse_mode=ParseMode.MARKDOWN
+                "➕ Aggiungi Condizione Medica\n\n"
+                "Inserisci il nome della condizione:"
             )
             
         elif action == "dietary":
             # Mostra le restrizioni alimentari
             restrictions = self.data_manager.get_dietary_restrictions(user_id)
             
-            text = "🍽️ *Restrizioni Alimentari*\n\n"
+            parts = ["🍽️ *Restrizioni Alimentari*\n\n"]
             
             if not restrictions:
-                text += "Non hai ancora registrato restrizioni alimentari."
+                parts.append("Non hai ancora registrato restrizioni alimentari.")
             else:
                 for restriction in restrictions:
                     severity = ""
@@ -3047,26 +3489,21 @@ class ChatGPTTelegramBot:
                         else:
                             severity = "ℹ️ Bassa gravità"
                     
-                    text += f"*{restriction['name']}*\n"
-                    text += f"🍲 Alimento: {restriction['food_type']}\n"
+                    parts.append(f"*{restriction['name']}*\n")
+                    parts.append(f"🍲 Alimento: {restriction['food_type']}\n")
                     
                     if restriction['reason']:
-                        text += f"📝 Motivo: {restriction['reason']}\n"
+                        parts.append(f"📝 Motivo: {restriction['reason']}\n")
                     
                     if severity:
-                        text += f"{severity}\n"
+                        parts.append(f"{severity}\n")
                     
-                    text += "\n"
+                    parts.append("\n")
             
-            # Crea la tastiera
-            keyboard = [
-                [
-                    InlineKeyboardButton("➕ Aggiungi restrizione", callback_data="health:add_restriction"),
-                    InlineKeyboardButton("🔙 Menu salute", callback_data="menu:health")
-                ]
-            ]
+            text = "".join(parts)
             
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            # Crea la tastiera
+            reply_markup = self._keyboards["health_restrictions"]
             
             await update.callback_query.edit_message_text(
                 text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN
@@ -3076,38 +3513,33 @@ class ChatGPTTelegramBot:
             # Mostra gli integratori
             supplements = self.data_manager.get_supplements(user_id)
             
-            text = "💊 *Integratori*\n\n"
+            parts = ["💊 *Integratori*\n\n"]
             
             if not supplements:
-                text += "Non hai ancora registrato integratori."
+                parts.append("Non hai ancora registrato integratori.")
             else:
                 for supplement in supplements:
-                    text += f"*{supplement['name']}*\n"
-                    text += f"💊 Dosaggio: {supplement['dosage']}\n"
-                    text += f"⏱️ Frequenza: {supplement['frequency']}\n"
+                    parts.append(f"*{supplement['name']}*\n")
+                    parts.append(f"💊 Dosaggio: {supplement['dosage']}\n")
+                    parts.append(f"⏱️ Frequenza: {supplement['frequency']}\n")
                     
                     if supplement['purpose']:
-                        text += f"📝 Scopo: {supplement['purpose']}\n"
+                        parts.append(f"📝 Scopo: {supplement['purpose']}\n")
                     
                     if supplement['start_date']:
-                        start_date = datetime.datetime.strptime(supplement['start_date'], DATE_FORMAT).strftime(DISPLAY_DATE_FORMAT)
-                        text += f"📅 Inizio: {start_date}\n"
+                        start_date = _format_date(supplement['start_date'])
+                        parts.append(f"📅 Inizio: {start_date}\n")
                     
                     if supplement['end_date']:
-                        end_date = datetime.datetime.strptime(supplement['end_date'], DATE_FORMAT).strftime(DISPLAY_DATE_FORMAT)
-                        text += f"📅 Fine: {end_date}\n"
+                        end_date = _format_date(supplement['end_date'])
+                        parts.append(f"📅 Fine: {end_date}\n")
                     
-                    text += "\n"
+                    parts.append("\n")
             
-            # Crea la tastiera
-            keyboard = [
-                [
-                    InlineKeyboardButton("➕ Aggiungi integratore", callback_data="health:add_supplement"),
-                    InlineKeyboardButton("🔙 Menu salute", callback_data="menu:health")
-                ]
-            ]
+            text = "".join(parts)
             
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            # Crea la tastiera
+            reply_markup = self._keyboards["health_supplements"]
             
             await update.callback_query.edit_message_text(
                 text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN
@@ -3117,29 +3549,24 @@ class ChatGPTTelegramBot:
             # Mostra i referti medici
             reports = self.data_manager.get_health_reports(user_id)
             
-            text = "📋 *Referti Medici*\n\n"
+            parts = ["📋 *Referti Medici*\n\n"]
             
             if not reports:
-                text += "Non hai ancora registrato referti medici."
+                parts.append("Non hai ancora registrato referti medici.")
             else:
                 # Ordina per data, più recenti prima
                 reports.sort(key=lambda x: x['date'], reverse=True)
                 
                 for report in reports:
-                    date = datetime.datetime.strptime(report['date'], DATE_FORMAT).strftime(DISPLAY_DATE_FORMAT)
+                    date = _format_date(report['date'])
                     
-                    text += f"*{report['report_type']}* ({date})\n"
-                    text += f"📝 {report['summary']}\n\n"
+                    parts.append(f"*{report['report_type']}* ({date})\n")
+                    parts.append(f"📝 {report['summary']}\n\n")
             
-            # Crea la tastiera
-            keyboard = [
-                [
-                    InlineKeyboardButton("➕ Aggiungi referto", callback_data="health:add_report"),
-                    InlineKeyboardButton("🔙 Menu salute", callback_data="menu:health")
-                ]
-            ]
+            text = "".join(parts)
             
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            # Crea la tastiera
+            reply_markup = self._keyboards["health_reports"]
             
             await update.callback_query.edit_message_text(
                 text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN
@@ -3147,48 +3574,45 @@ class ChatGPTTelegramBot:
             
         elif action == "summary":
             # Mostra un riepilogo sanitario
-            conditions = self.data_manager.get_health_conditions(user_id)
-            restrictions = self.data_manager.get_dietary_restrictions(user_id)
-            supplements = self.data_manager.get_supplements(user_id)
+            health_profile = await asyncio.to_thread(self.data_manager.get_health_profile, user_id)
+            conditions = health_profile["conditions"]
+            restrictions = health_profile["restrictions"]
+            supplements = health_profile["supplements"]
             
-            text = "❤️ *Riepilogo Sanitario*\n\n"
+            parts = ["❤️ *Riepilogo Sanitario*\n\n"]
             
             # Condizioni mediche
-            text += "*Condizioni Mediche:*\n"
+            parts.append("*Condizioni Mediche:*\n")
             if not conditions:
-                text += "Nessuna condizione registrata.\n"
+                parts.append("Nessuna condizione registrata.\n")
             else:
                 for condition in conditions:
-                    text += f"- {condition['name']}"
+                    parts.append(f"- {condition['name']}")
                     if condition['severity']:
-                        text += f" ({condition['severity']})"
-                    text += "\n"
+                        parts.append(f" ({condition['severity']})")
+                    parts.append("\n")
             
-            text += "\n*Restrizioni Alimentari:*\n"
+            parts.append("\n*Restrizioni Alimentari:*\n")
             if not restrictions:
-                text += "Nessuna restrizione registrata.\n"
+                parts.append("Nessuna restrizione registrata.\n")
             else:
                 for restriction in restrictions:
-                    text += f"- {restriction['name']} ({restriction['food_type']})\n"
+                    parts.append(f"- {restriction['name']} ({restriction['food_type']})\n")
             
-            text += "\n*Integratori Attivi:*\n"
-            active_supplements = [s for s in supplements if not s['end_date'] or datetime.datetime.strptime(s['end_date'], DATE_FORMAT).date() >= datetime.date.today()]
+            parts.append("\n*Integratori Attivi:*\n")
+            today = datetime.date.today()
+            active_supplements = [s for s in supplements if not s['end_date'] or _parse_date(s['end_date']) >= today]
             
             if not active_supplements:
-                text += "Nessun integratore attivo.\n"
+                parts.append("Nessun integratore attivo.\n")
             else:
                 for supplement in active_supplements:
-                    text += f"- {supplement['name']} ({supplement['dosage']}, {supplement['frequency']})\n"
+                    parts.append(f"- {supplement['name']} ({supplement['dosage']}, {supplement['frequency']})\n")
             
-            # Crea la tastiera
-            keyboard = [
-                [
-                    InlineKeyboardButton("📋 Dettagli completi", callback_data="health:detail"),
-                    InlineKeyboardButton("🔙 Menu salute", callback_data="menu:health")
-                ]
-            ]
+            text = "".join(parts)
             
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            # Crea la tastiera
+            reply_markup = self._keyboards["health_summary"]
             
             await update.callback_query.edit_message_text(
                 text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN
@@ -3314,17 +3738,13 @@ class ChatGPTTelegramBot:
                 # Aggiorna il messaggio
                 await update.callback_query.edit_message_text(
                     "✅ Dati esportati con successo. Controlla i messaggi per il file.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Torna alle impostazioni", callback_data="menu:settings")
-                    ]])
+                    reply_markup=self._keyboards["back_to_settings"]
                 )
                 
             else:
                 await update.callback_query.edit_message_text(
                     "❌ Si è verificato un errore durante l'esportazione dei dati. Riprova più tardi.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Torna alle impostazioni", callback_data="menu:settings")
-                    ]])
+                    reply_markup=self._keyboards["back_to_settings"]
                 )
                 
         elif action == "import_data":
@@ -3334,14 +3754,18 @@ class ChatGPTTelegramBot:
                 "Per importare i tuoi dati, invia un file JSON generato precedentemente con l'esportazione.\n\n"
                 "⚠️ *Attenzione*: L'importazione sovrascriverà i dati esistenti. "
                 "Assicurati di esportare i dati attuali prima di procedere se necessario.",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Torna alle impostazioni", callback_data="menu:settings")
-                ]]),
+                reply_markup=self._keyboards["back_to_settings"],
                 parse_mode=ParseMode.MARKDOWN
             )
 
 if __name__ == "__main__":
     """Test di base del modulo."""
+    # Configurazione logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
     import os
     from dotenv import load_dotenv
     from anthropic_helper import AnthropicHelper